@@ -0,0 +1 @@
+default_app_config = 'hubs_devices_sensors.apps.HubsDevicesSensorsConfig'
@@ -3,9 +3,10 @@ Admin.py
 Regestring entities for CRUD via Django admin panel
 """
 from django.contrib import admin
-from .models import Sensor, Device, Hub, SensorCollectedData
+from .models import Sensor, Device, Hub, SensorCollectedData, SensorCollectedDataRollup
 
 admin.site.register(Sensor)
 admin.site.register(SensorCollectedData)
+admin.site.register(SensorCollectedDataRollup)
 admin.site.register(Device)
 admin.site.register(Hub)
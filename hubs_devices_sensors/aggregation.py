@@ -0,0 +1,135 @@
+"""
+aggregation.py
+Time-bucketed aggregation of SensorCollectedData readings.
+Buckets are aligned to multiples of their width since the Unix epoch, like date_trunc(),
+so the same bucket has the same bounds in every query.
+Classes:
+    BucketAggregator
+Functions:
+    parse_bucket_width
+"""
+import re
+from datetime import datetime, timedelta
+import numpy as np
+from django.utils import timezone
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+# Microseconds of the units of bucket width
+BUCKET_UNITS = {
+    's': 10 ** 6,
+    'm': 60 * 10 ** 6,
+    'h': 60 * 60 * 10 ** 6,
+    'd': 24 * 60 * 60 * 10 ** 6,
+}
+BUCKET_WIDTH_RE = re.compile(r'^(\d+)([smhd]?)$')
+
+
+def parse_bucket_width(value):
+    """
+    Returns microseconds of bucket width given as seconds or as number with unit,
+    e.g. '90', '30s', '15m', '1h', '1d'. Raises ValueError of any other value
+    """
+    match = BUCKET_WIDTH_RE.match(value or '')
+    if match is None:
+        raise ValueError('Invalid bucket width {!r}'.format(value))
+    width = int(match.group(1)) * BUCKET_UNITS[match.group(2) or 's']
+    if not width:
+        raise ValueError('Bucket width must be positive')
+    return width
+
+
+class BucketAggregator:
+
+    """
+    Class BucketAggregator - computes count, min, max, total and last value
+    of readings of every sensor in every bucket with vectorized numpy reductions.
+    Readings are added in chunks ordered by (sensor, date_time_collected), every chunk is reduced
+    to its buckets at once, so memory use depends on the number of buckets, not of readings
+    @param width - bucket width in microseconds
+
+    @method add(rows) - aggregates chunk of (sensor, date_time_collected, sensor_data_value) rows
+    @method add_partials(rows) - aggregates chunk of already aggregated (sensor, bucket start,
+    count, min, max, total, last value, last date_time_collected) rows of narrower buckets,
+    e.g. hourly buckets from minute ones
+    @method iter_buckets() - yields tuples (sensor, bucket start epoch microseconds,
+    count, min, max, total, last value, last date_time_collected epoch microseconds)
+    ordered by sensor and bucket start
+    """
+
+    def __init__(self, width):
+        self.width = width
+        self._partials = []
+
+    @staticmethod
+    def _to_micros(date_times):
+        return np.array(
+            [(date_time - EPOCH) // MICROSECOND for date_time in date_times],
+            dtype=np.int64
+        )
+
+    @staticmethod
+    def _reduce(sensors, buckets, counts, minimums, maximums, totals, lasts, last_times):
+        """
+        Merges adjacent entries of the same sensor and bucket,
+        the last entry of a bucket is its latest one
+        """
+        if not len(sensors):
+            return sensors, buckets, counts, minimums, maximums, totals, lasts, last_times
+        changed = (sensors[1:] != sensors[:-1]) | (buckets[1:] != buckets[:-1])
+        starts = np.concatenate(([0], np.flatnonzero(changed) + 1))
+        ends = np.append(starts[1:], len(sensors))
+        return (
+            sensors[starts],
+            buckets[starts],
+            np.add.reduceat(counts, starts),
+            np.minimum.reduceat(minimums, starts),
+            np.maximum.reduceat(maximums, starts),
+            np.add.reduceat(totals, starts),
+            lasts[ends - 1],
+            last_times[ends - 1]
+        )
+
+    def _add(self, sensors, times, counts, minimums, maximums, totals, lasts, last_times):
+        self._partials.append(self._reduce(
+            np.array(sensors),
+            times // self.width * self.width,
+            counts,
+            minimums,
+            maximums,
+            totals,
+            lasts,
+            last_times
+        ))
+
+    def add(self, rows):
+        if not rows:
+            return
+        sensors, date_times, values = zip(*rows)
+        times = self._to_micros(date_times)
+        values = np.array(values, dtype=np.float64)
+        self._add(sensors, times, np.ones(len(values), dtype=np.int64), values, values, values, values, times)
+
+    def add_partials(self, rows):
+        if not rows:
+            return
+        sensors, starts, counts, minimums, maximums, totals, lasts, last_times = zip(*rows)
+        self._add(
+            sensors,
+            self._to_micros(starts),
+            np.array(counts, dtype=np.int64),
+            np.array(minimums, dtype=np.float64),
+            np.array(maximums, dtype=np.float64),
+            np.array(totals, dtype=np.float64),
+            np.array(lasts, dtype=np.float64),
+            self._to_micros(last_times)
+        )
+
+    def iter_buckets(self):
+        if not self._partials:
+            return
+        # Only the last bucket of a chunk could continue in the next chunk
+        merged = self._reduce(*(np.concatenate(columns) for columns in zip(*self._partials)))
+        yield from zip(*(column.tolist() for column in merged))
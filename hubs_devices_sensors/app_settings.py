@@ -0,0 +1,98 @@
+"""
+app_settings.py
+Options of the hubs_devices_sensors app.
+Every option can be overridden by the HUBS_DEVICES_SENSORS dict in project settings, e.g.
+    HUBS_DEVICES_SENSORS = {
+        'BULK_INGESTION': False,
+    }
+"""
+from django.conf import settings
+
+
+DEFAULTS = {
+    # Write collect-data batches with a single bulk insert instead of one save() per reading
+    'BULK_INGESTION': True,
+    # Max rows per INSERT statement issued by the bulk ingestion path
+    'BULK_INGESTION_BATCH_SIZE': 1000,
+    # Buffer validated readings in process and write them later in large bulk inserts
+    'WRITE_BEHIND': False,
+    # Pending readings that trigger a write-behind flush
+    'WRITE_BEHIND_FLUSH_SIZE': 5000,
+    # Milliseconds the oldest pending reading waits at most before a write-behind flush
+    'WRITE_BEHIND_FLUSH_INTERVAL': 1000,
+    # Max pending readings, collect-data responds 503 when it would be exceeded
+    'WRITE_BEHIND_MAX_PENDING': 100000,
+    # Flushes that fail to write a reading before it is dropped and logged
+    'WRITE_BEHIND_MAX_ATTEMPTS': 3,
+    # Append validated readings to the durable local spool and load them into the database later
+    'SPOOL': False,
+    # Directory of the spool segments (None - spool directory in BASE_DIR)
+    'SPOOL_DIR': None,
+    # Bytes after which a new spool segment is started
+    'SPOOL_SEGMENT_SIZE': 16 * 1024 * 1024,
+    # Run the spool drainer thread in every process that appends to the spool
+    'SPOOL_DRAIN': True,
+    # Milliseconds between the spool drainer runs
+    'SPOOL_DRAIN_INTERVAL': 1000,
+    # Only enqueue raw collect-data batches, manage.py ingest_workers parses, validates and writes them
+    'INGEST_QUEUE': False,
+    # SQLite database file of the ingest queue (None - ingest_queue.sqlite3 in BASE_DIR)
+    'INGEST_QUEUE_PATH': None,
+    # Milliseconds an idle ingest worker waits before it polls the queue again
+    'INGEST_QUEUE_POLL_INTERVAL': 200,
+    # Seconds after which a batch claimed by a worker is returned to the queue
+    'INGEST_QUEUE_CLAIM_TIMEOUT': 300,
+    # Claims of a batch failing with unexpected errors before it is marked as failed
+    'INGEST_QUEUE_MAX_ATTEMPTS': 5,
+    # Virtual nodes of every ingest worker on the consistent hash ring of hubs
+    'INGEST_RING_REPLICAS': 64,
+    # Add load hints headers to collect-data responses and throttle hubs that ignore them
+    'BACKPRESSURE': True,
+    # Milliseconds of ingest latency EWMA regarded as full load
+    'BACKPRESSURE_TARGET_LATENCY': 250,
+    # Pending write-behind readings regarded as full load
+    'BACKPRESSURE_TARGET_PENDING': 10000,
+    # Ingest queue batches regarded as full load
+    'BACKPRESSURE_TARGET_QUEUED': 100,
+    # Recommended readings per request while not overloaded, grows with the load
+    'BACKPRESSURE_BATCH_SIZE': 500,
+    # Max recommended readings per request
+    'BACKPRESSURE_MAX_BATCH_SIZE': 10000,
+    # Milliseconds of the delay between requests per unit of overload
+    'BACKPRESSURE_DELAY': 1000,
+    # Max milliseconds of the delay between requests
+    'BACKPRESSURE_MAX_DELAY': 60000,
+    # Requests a hub could send at once before it is throttled to one per delay
+    'BACKPRESSURE_BURST': 2,
+    # Readings per page of the collected-data list endpoints
+    'COLLECTED_DATA_PAGE_SIZE': 1000,
+    # Max readings per page that could be requested by ?page_size
+    'COLLECTED_DATA_MAX_PAGE_SIZE': 10000,
+    # Readings fetched from the database and streamed at once by ?format=csv|ndjson export
+    'EXPORT_CHUNK_SIZE': 2000,
+    # Maintain minute, hour and day rollups of the written readings
+    'ROLLUPS': True,
+    # Max buckets per sensor of the aggregate endpoints
+    'AGGREGATE_MAX_BUCKETS': 10000,
+    # Readings fetched from the database and aggregated at once by the aggregate endpoints
+    'AGGREGATE_CHUNK_SIZE': 10000,
+    # Readings of the NDJSON stream validated and written at once
+    'NDJSON_BATCH_SIZE': 1000,
+    # Bytes of the NDJSON request body read at once
+    'NDJSON_CHUNK_SIZE': 64 * 1024,
+    # Max length of one NDJSON line in bytes
+    'NDJSON_MAX_LINE_LENGTH': 64 * 1024,
+    # Max size in bytes of gzip or deflate encoded request body after decompression
+    'MAX_DECOMPRESSED_BODY_SIZE': 64 * 1024 * 1024,
+    # Max number of sensors kept in the process-local sensor metadata cache
+    'SENSOR_CACHE_SIZE': 10000,
+    # Seconds after which a cached sensor metadata entry is fetched again (None - never)
+    'SENSOR_CACHE_TTL': 300,
+}
+
+
+def get(name):
+    """
+    Returns the value of the option from project settings or its default value
+    """
+    return getattr(settings, 'HUBS_DEVICES_SENSORS', {}).get(name, DEFAULTS[name])
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class HubsDevicesSensorsConfig(AppConfig):
     name = 'hubs_devices_sensors'
+
+    def ready(self):
+        import hubs_devices_sensors.signals  # noqa: F401
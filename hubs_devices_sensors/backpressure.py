@@ -0,0 +1,158 @@
+"""
+backpressure.py
+Load-aware hints of the collect-data endpoints.
+Every collect-data response carries headers
+    X-Recommended-Batch-Size - readings the hub should send in one request,
+    X-Min-Post-Delay - milliseconds the hub should wait before its next request.
+They are computed from EWMA of recent ingest latency and from depth of the write-behind buffer
+and of the ingest queue. While the server is not overloaded the delay is 0.
+A hub that posts more often than the delay allows is throttled by a per-hub token bucket,
+the hub is identified by X-Hub-Serial-Number header or by the client address.
+Classes:
+    LoadHints,
+    LoadMonitor,
+    HubBackpressureThrottle,
+    BackpressureMixin
+"""
+import threading
+import time
+from collections import namedtuple
+from django.core.cache import cache as default_cache
+from rest_framework.throttling import BaseThrottle
+import hubs_devices_sensors.app_settings as app_settings
+from .ingest_queue import ingest_queue
+from .sharding import get_routing_key
+from .sinks import write_behind_buffer
+
+
+# Hints of LoadMonitor:
+#   load - ratio of the current load to the target one, above 1 when overloaded,
+#   batch_size - recommended readings in one request,
+#   min_delay - milliseconds to wait before the next request
+LoadHints = namedtuple('LoadHints', ('load', 'batch_size', 'min_delay'))
+
+
+class LoadMonitor:
+
+    """
+    Class LoadMonitor - process-local monitor of the ingestion load
+
+    @method record(seconds) - adds latency of a served collect-data request
+    @method get_load() - returns the highest of ratios of latency EWMA, pending write-behind
+    readings and queued batches to their BACKPRESSURE_TARGET_* options
+    @method get_hints() - returns LoadHints of the current load
+    @method reset() - forgets recorded latency
+    """
+
+    # Weight of the latest latency in the EWMA
+    alpha = 0.2
+    # Seconds the ingest queue depth is cached for, it takes a query of the queue database
+    queue_depth_ttl = 1
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latency = 0.0
+        self._queue_depth = 0
+        self._queue_depth_expires = 0
+
+    def record(self, seconds):
+        with self._lock:
+            self._latency += self.alpha * (seconds - self._latency)
+
+    def reset(self):
+        with self._lock:
+            self._latency = 0.0
+            self._queue_depth_expires = 0
+
+    def get_queue_depth(self):
+        if not app_settings.get('INGEST_QUEUE'):
+            return 0
+        now = time.monotonic()
+        if now >= self._queue_depth_expires:
+            self._queue_depth = len(ingest_queue)
+            self._queue_depth_expires = now + self.queue_depth_ttl
+        return self._queue_depth
+
+    def get_load(self):
+        return max(
+            self._latency * 1000 / app_settings.get('BACKPRESSURE_TARGET_LATENCY'),
+            len(write_behind_buffer) / app_settings.get('BACKPRESSURE_TARGET_PENDING'),
+            self.get_queue_depth() / app_settings.get('BACKPRESSURE_TARGET_QUEUED')
+        )
+
+    def get_hints(self):
+        load = self.get_load()
+        batch_size = min(
+            int(app_settings.get('BACKPRESSURE_BATCH_SIZE') * max(load, 1)),
+            app_settings.get('BACKPRESSURE_MAX_BATCH_SIZE')
+        )
+        min_delay = min(
+            int(app_settings.get('BACKPRESSURE_DELAY') * max(load - 1, 0)),
+            app_settings.get('BACKPRESSURE_MAX_DELAY')
+        )
+        return LoadHints(load=load, batch_size=batch_size, min_delay=min_delay)
+
+
+load_monitor = LoadMonitor()
+
+
+class HubBackpressureThrottle(BaseThrottle):
+
+    """
+    Class HubBackpressureThrottle - token bucket of every hub refilled with one token
+    per X-Min-Post-Delay, holds up to BACKPRESSURE_BURST tokens.
+    Allows every request while the delay is 0. Buckets are kept in the default cache,
+    like buckets of Django REST framework rate throttles
+    """
+
+    cache = default_cache
+    cache_format = 'hubs_devices_sensors:backpressure:{}'
+
+    wait_seconds = None
+
+    def allow_request(self, request, view):
+        if not app_settings.get('BACKPRESSURE'):
+            return True
+        delay = load_monitor.get_hints().min_delay / 1000
+        if not delay:
+            return True
+
+        burst = app_settings.get('BACKPRESSURE_BURST')
+        key = self.cache_format.format(get_routing_key(request) or self.get_ident(request))
+        now = time.time()
+        tokens, updated = self.cache.get(key, (burst, now))
+        tokens = min(tokens + (now - updated) / delay, burst)
+        if tokens < 1:
+            self.wait_seconds = (1 - tokens) * delay
+            return False
+        self.cache.set(key, (tokens - 1, now), delay * burst)
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class BackpressureMixin:
+
+    """
+    Class BackpressureMixin - mixin of the collect-data views that records their latency
+    to LoadMonitor, throttles hubs by HubBackpressureThrottle and adds load hints headers
+    """
+
+    throttle_classes = (HubBackpressureThrottle, )
+
+    def initial(self, request, *args, **kwargs):
+        self.started = time.monotonic()
+        super(BackpressureMixin, self).initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super(BackpressureMixin, self).finalize_response(request, response, *args, **kwargs)
+        if not app_settings.get('BACKPRESSURE'):
+            return response
+        if getattr(self, 'started', None) is not None and response.status_code < 400:
+            load_monitor.record(time.monotonic() - self.started)
+
+        hints = load_monitor.get_hints()
+        response['X-Recommended-Batch-Size'] = hints.batch_size
+        response['X-Min-Post-Delay'] = hints.min_delay
+        return response
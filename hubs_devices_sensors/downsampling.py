@@ -0,0 +1,48 @@
+"""
+downsampling.py
+Visual downsampling of SensorCollectedData series for charts.
+Largest-Triangle-Three-Buckets keeps the points that shape the chart, spikes included,
+unlike bucket averages that flatten them.
+Functions:
+    lttb
+"""
+import numpy as np
+
+
+def lttb(x, y, points):
+    """
+    Returns sorted indices of the points of (x, y) series, ordered by x, chosen by
+    Largest-Triangle-Three-Buckets, at most points of them. The first and the last points
+    are always kept, every of points - 2 buckets between them gives the point that makes
+    the largest triangle with the point chosen in the previous bucket and the average
+    of the next bucket. Averages and triangle areas are computed with numpy, only the chain
+    of the chosen points is walked bucket by bucket
+    """
+    count = len(x)
+    if count <= points or points < 3:
+        return np.arange(count)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    # Bounds of the buckets between the first and the last points, the last point
+    # is the "next bucket" of the last bucket
+    bounds = (np.arange(points - 1) * ((count - 2) / (points - 2))).astype(np.int64) + 1
+    bounds[-1] = count - 1
+    sizes = np.diff(np.append(bounds, count))
+    next_x = np.add.reduceat(x, bounds) / sizes
+    next_y = np.add.reduceat(y, bounds) / sizes
+
+    indices = np.empty(points, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = count - 1
+    chosen = 0
+    for bucket in range(points - 2):
+        start, end = bounds[bucket], bounds[bucket + 1]
+        x_a, y_a = x[chosen], y[chosen]
+        areas = np.abs(
+            (x_a - next_x[bucket + 1]) * (y[start:end] - y_a)
+            - (x_a - x[start:end]) * (next_y[bucket + 1] - y_a)
+        )
+        chosen = start + int(np.argmax(areas))
+        indices[bucket + 1] = chosen
+    return indices
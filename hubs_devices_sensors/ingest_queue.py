@@ -0,0 +1,199 @@
+"""
+ingest_queue.py
+Local SQLite-backed queue of raw collect-data batches.
+With INGEST_QUEUE option the collect-data endpoint only appends the request body to the queue,
+the worker processes of manage.py ingest_workers parse, validate and write the batches.
+Batches are routed by hub serial number (see sharding.py): a worker claims batches
+whose routing key hash is in its key hash ranges and batches without routing key.
+A batch is claimed by one worker and removed once it is written, batches claimed by
+a worker that stopped are released by the worker pool or after INGEST_QUEUE_CLAIM_TIMEOUT seconds.
+Batches rejected by a worker are kept as failed with the error, so their status could be queried.
+Classes:
+    QueuedBatch,
+    BatchStatus,
+    IngestQueue
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from django.conf import settings
+import hubs_devices_sensors.app_settings as app_settings
+from .sharding import key_hash
+
+
+# Raw collect-data batch of the queue:
+#   id - position in the queue,
+#   content_type - Content-Type of the request,
+#   query_string - query string of the request,
+#   body - request body, already decompressed,
+#   attempts - how many times the batch was claimed, including the current claim
+QueuedBatch = namedtuple('QueuedBatch', ('id', 'content_type', 'query_string', 'body', 'attempts'))
+
+# Status of a batch of the queue:
+#   status - one of BATCH_STATUSES,
+#   error - why the batch was rejected, None unless it failed
+BatchStatus = namedtuple('BatchStatus', ('status', 'error'))
+
+BATCH_QUEUED = 'queued'
+BATCH_PROCESSING = 'processing'
+BATCH_FAILED = 'failed'
+BATCH_DONE = 'done'
+BATCH_STATUSES = (BATCH_QUEUED, BATCH_PROCESSING, BATCH_FAILED, BATCH_DONE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    content_type TEXT NOT NULL,
+    query_string TEXT NOT NULL,
+    body BLOB NOT NULL,
+    routing_key TEXT,
+    key_hash INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_by INTEGER,
+    claimed_at REAL,
+    failed_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS batches_claimed_by ON batches (claimed_by, id);
+CREATE TEMP TABLE IF NOT EXISTS owned_ranges (range_first INTEGER NOT NULL, range_last INTEGER NOT NULL);
+"""
+
+
+class IngestQueue:
+
+    """
+    Class IngestQueue - queue of raw collect-data batches in SQLite database file.
+    Every thread and every forked process uses its own connection
+
+    @method put(content_type, query_string, body, routing_key) - appends batch, returns its id
+    @method claim(worker, limit, ranges) - claims up to limit oldest free batches for the worker,
+    only the ones without routing key or with routing key hash in [start, end) ranges if given
+    @method ack(batch_id) - removes written batch
+    @method fail(batch_id, error) - keeps rejected batch as failed, it is never claimed again
+    @method get_status(batch_id) - returns BatchStatus of the batch, None if there was no such batch
+    @method release(batch_id) - returns claimed batch to the queue
+    @method release_worker(worker) - returns all batches claimed by the worker to the queue
+    @method release_stale(timeout) - returns batches claimed more than timeout seconds ago
+    """
+
+    def __init__(self, path=None):
+        self._path = path
+        self._local = threading.local()
+
+    @property
+    def path(self):
+        return self._path or app_settings.get('INGEST_QUEUE_PATH') \
+            or os.path.join(settings.BASE_DIR, 'ingest_queue.sqlite3')
+
+    def _connection(self):
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid() or local.path != self.path:
+            local.connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            local.connection.execute('PRAGMA journal_mode=WAL')
+            local.connection.executescript(SCHEMA)
+            local.pid = os.getpid()
+            local.path = self.path
+        return local.connection
+
+    def __len__(self):
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM batches WHERE failed_at IS NULL'
+        ).fetchone()[0]
+
+    def put(self, content_type, query_string, body, routing_key=None):
+        cursor = self._connection().execute(
+            'INSERT INTO batches (content_type, query_string, body, routing_key, key_hash) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (
+                content_type,
+                query_string,
+                body,
+                routing_key,
+                key_hash(routing_key) if routing_key is not None else None
+            )
+        )
+        return cursor.lastrowid
+
+    def claim(self, worker, limit=1, ranges=None):
+        connection = self._connection()
+        query = 'SELECT id, content_type, query_string, body, attempts + 1 FROM batches ' \
+                'WHERE claimed_by IS NULL AND failed_at IS NULL'
+        if ranges is not None:
+            query += ' AND (key_hash IS NULL OR EXISTS (SELECT 1 FROM owned_ranges ' \
+                     'WHERE key_hash BETWEEN range_first AND range_last))'
+        # Immediate transaction takes the write lock before reading,
+        # so two workers never claim the same batch
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            if ranges is not None:
+                connection.execute('DELETE FROM owned_ranges')
+                # Ends are exclusive, the end of the last range does not fit into SQLite INTEGER
+                connection.executemany(
+                    'INSERT INTO owned_ranges VALUES (?, ?)',
+                    [(start, end - 1) for start, end in ranges]
+                )
+            rows = connection.execute(query + ' ORDER BY id LIMIT ?', (limit, )).fetchall()
+            connection.executemany(
+                'UPDATE batches SET claimed_by = ?, claimed_at = ?, attempts = attempts + 1 '
+                'WHERE id = ?',
+                [(worker, time.time(), row[0]) for row in rows]
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return [QueuedBatch(*row) for row in rows]
+
+    def ack(self, batch_id):
+        self._connection().execute('DELETE FROM batches WHERE id = ?', (batch_id, ))
+
+    def fail(self, batch_id, error):
+        self._connection().execute(
+            'UPDATE batches SET claimed_by = NULL, claimed_at = NULL, failed_at = ?, error = ? '
+            'WHERE id = ?',
+            (time.time(), error, batch_id)
+        )
+
+    def get_status(self, batch_id):
+        connection = self._connection()
+        row = connection.execute(
+            'SELECT claimed_by, failed_at, error FROM batches WHERE id = ?',
+            (batch_id, )
+        ).fetchone()
+        if row is not None:
+            claimed_by, failed_at, error = row
+            if failed_at is not None:
+                return BatchStatus(BATCH_FAILED, error)
+            return BatchStatus(BATCH_QUEUED if claimed_by is None else BATCH_PROCESSING, None)
+
+        # AUTOINCREMENT never reuses ids, so a missing id up to the last one was written
+        last_id = connection.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'batches'"
+        ).fetchone()
+        if last_id is not None and 0 < batch_id <= last_id[0]:
+            return BatchStatus(BATCH_DONE, None)
+        return None
+
+    def release(self, batch_id):
+        self._connection().execute(
+            'UPDATE batches SET claimed_by = NULL, claimed_at = NULL WHERE id = ?',
+            (batch_id, )
+        )
+
+    def release_worker(self, worker):
+        self._connection().execute(
+            'UPDATE batches SET claimed_by = NULL, claimed_at = NULL WHERE claimed_by = ?',
+            (worker, )
+        )
+
+    def release_stale(self, timeout):
+        self._connection().execute(
+            'UPDATE batches SET claimed_by = NULL, claimed_at = NULL '
+            'WHERE claimed_by IS NOT NULL AND claimed_at < ?',
+            (time.time() - timeout, )
+        )
+
+
+ingest_queue = IngestQueue()
@@ -0,0 +1,450 @@
+"""
+ingestion.py
+Batch helpers of the sensors collect-data ingestion path.
+Classes:
+    IngestResult,
+    ReadingColumns
+Functions:
+    reading_key,
+    find_existing_keys,
+    bulk_insert,
+    assign_primary_keys,
+    write_readings,
+    epoch_millis_to_datetimes,
+    datetime_to_epoch_millis,
+    parse_hub_datetime,
+    items_to_columns,
+    prepare_columns,
+    is_series_batch,
+    expand_series
+"""
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+from functools import reduce
+from operator import attrgetter, or_
+import numpy as np
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ParseError
+import hubs_devices_sensors.app_settings as app_settings
+import hubs_devices_sensors.rollups as rollups
+import hubs_devices_sensors.sensor_validation as sensor_validation
+from .models import SensorCollectedData
+from .sensor_cache import sensor_metadata_cache
+
+
+# How to handle readings whose (sensor, date_time_collected) key is already stored:
+#   error - reject the batch (default),
+#   skip - keep the stored reading and drop the new one,
+#   overwrite - replace the stored reading by the new one
+ON_CONFLICT_ERROR = 'error'
+ON_CONFLICT_SKIP = 'skip'
+ON_CONFLICT_OVERWRITE = 'overwrite'
+ON_CONFLICT_CHOICES = (ON_CONFLICT_ERROR, ON_CONFLICT_SKIP, ON_CONFLICT_OVERWRITE)
+
+# Representation of date_time_collected in requests and responses:
+#   iso - ISO 8601 strings (default),
+#   epoch - integer epoch milliseconds
+TIMESTAMPS_ISO = 'iso'
+TIMESTAMPS_EPOCH = 'epoch'
+TIMESTAMPS_CHOICES = (TIMESTAMPS_ISO, TIMESTAMPS_EPOCH)
+
+# Retries of skip and overwrite writes whose readings were stored concurrently
+CONFLICT_RETRIES = 3
+
+IngestResult = namedtuple('IngestResult', ('inserted', 'duplicates'))
+
+# Batch of readings as columns, produced by non row-per-object payload parsers:
+#   sensor_serial_numbers - list of distinct sensor serial numbers of the batch,
+#   sensor_indices - array of indices in sensor_serial_numbers, one per reading,
+#   timestamps - int64 array of epoch milliseconds, one per reading,
+#   values - float64 array of sensor values, one per reading
+ReadingColumns = namedtuple('ReadingColumns', (
+    'sensor_serial_numbers',
+    'sensor_indices',
+    'timestamps',
+    'values'
+))
+
+# Epoch milliseconds of datetime.min and datetime.max
+MIN_EPOCH_MILLIS = -62135596800000
+MAX_EPOCH_MILLIS = 253402300799999
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MILLISECOND = timedelta(milliseconds=1)
+
+
+def reading_key(sensor_serial_number, date_time_collected):
+    """
+    Returns the unique key (sensor, date_time_collected) of a SensorCollectedData reading
+    """
+    return sensor_serial_number, date_time_collected
+
+
+def _keys_filter(keys):
+    """
+    Returns Q object that matches exactly the readings with given keys
+    """
+    timestamps_by_sensor = {}
+    for sensor_serial_number, date_time_collected in keys:
+        timestamps_by_sensor.setdefault(sensor_serial_number, []).append(date_time_collected)
+    return reduce(or_, (
+        Q(sensor_id=sensor_serial_number, date_time_collected__in=timestamps)
+        for sensor_serial_number, timestamps in timestamps_by_sensor.items()
+    ))
+
+
+def find_existing_keys(keys):
+    """
+    Returns set of reading keys that are already stored. Makes one query for the whole batch
+    """
+    keys = set(keys)
+    if not keys:
+        return set()
+
+    stored = SensorCollectedData.objects.filter(
+        _keys_filter(keys)
+    ).values_list('sensor_id', 'date_time_collected')
+    return keys.intersection(reading_key(*row) for row in stored)
+
+
+def bulk_insert(readings):
+    """
+    Inserts not saved SensorCollectedData readings with bulk INSERT statements.
+    Readings are inserted in (sensor, date_time_collected) order, so consecutive inserts
+    append to the same part of the unique index instead of scattering over it
+    """
+    return SensorCollectedData.objects.bulk_create(
+        sorted(readings, key=attrgetter('sensor_id', 'date_time_collected')),
+        batch_size=app_settings.get('BULK_INGESTION_BATCH_SIZE')
+    )
+
+
+def assign_primary_keys(readings):
+    """
+    Sets primary keys of bulk inserted readings, Django sets them only on PostgreSQL.
+    The missing ones are read back by (sensor, date_time_collected) key with one query
+    """
+    missing = [reading for reading in readings if reading.pk is None]
+    if not missing:
+        return
+    keys = {reading_key(reading.sensor_id, reading.date_time_collected) for reading in missing}
+    primary_keys = {
+        reading_key(sensor_serial_number, date_time_collected): pk
+        for pk, sensor_serial_number, date_time_collected in SensorCollectedData.objects.filter(
+            _keys_filter(keys)
+        ).values_list('pk', 'sensor_id', 'date_time_collected')
+    }
+    for reading in missing:
+        reading.pk = primary_keys.get(reading_key(reading.sensor_id, reading.date_time_collected))
+
+
+def write_readings(readings, on_conflict=ON_CONFLICT_ERROR):
+    """
+    Writes not saved SensorCollectedData readings resolving conflicts on
+    (sensor, date_time_collected) key by on_conflict mode.
+    Conflicts are found with one query, overwritten readings are removed with one DELETE
+    right before the bulk insert. Rollups of the readings are updated in the same transaction.
+    Readings stored by a concurrent writer after the conflicts were found make the insert fail,
+    then its savepoint is rolled back, conflicts are found again and the insert is retried
+    up to CONFLICT_RETRIES times.
+    Returns IngestResult with counts of inserted readings and duplicated ones
+    """
+    if on_conflict == ON_CONFLICT_ERROR:
+        with transaction.atomic():
+            bulk_insert(readings)
+            rollups.update_rollups(readings)
+        return IngestResult(inserted=len(readings), duplicates=0)
+
+    unique_readings = OrderedDict()
+    for reading in readings:
+        key = reading_key(reading.sensor_id, reading.date_time_collected)
+        if on_conflict == ON_CONFLICT_OVERWRITE or key not in unique_readings:
+            unique_readings[key] = reading
+
+    attempt = 0
+    while True:
+        existing_keys = find_existing_keys(unique_readings)
+        try:
+            _write_unique_readings(unique_readings, existing_keys, on_conflict)
+            break
+        except IntegrityError:
+            attempt += 1
+            if attempt > CONFLICT_RETRIES:
+                raise
+
+    inserted = len(unique_readings) - len(existing_keys)
+    return IngestResult(inserted=inserted, duplicates=len(readings) - inserted)
+
+
+def _write_unique_readings(unique_readings, existing_keys, on_conflict):
+    """
+    Writes readings by their unique keys in a savepoint, existing_keys are skipped or overwritten
+    """
+    if on_conflict == ON_CONFLICT_SKIP:
+        new_readings = [
+            reading for key, reading in unique_readings.items() if key not in existing_keys
+        ]
+        with transaction.atomic():
+            bulk_insert(new_readings)
+            rollups.update_rollups(new_readings)
+    else:
+        new_readings = list(unique_readings.values())
+        with transaction.atomic():
+            if existing_keys:
+                SensorCollectedData.objects.filter(_keys_filter(existing_keys)).delete()
+            bulk_insert(new_readings)
+            rollups.update_rollups(new_readings, existing_keys)
+
+
+def epoch_millis_to_datetimes(timestamps):
+    """
+    Returns list of aware UTC datetimes of int64 array of epoch milliseconds
+    """
+    return [
+        date_time_collected.replace(tzinfo=timezone.utc)
+        for date_time_collected in np.asarray(timestamps, dtype='datetime64[ms]').tolist()
+    ]
+
+
+def datetime_to_epoch_millis(date_time):
+    """
+    Returns integer epoch milliseconds of aware datetime
+    """
+    return (date_time - EPOCH) // MILLISECOND
+
+
+def parse_hub_datetime(value):
+    """
+    Returns aware UTC datetime of 'YYYY-MM-DDTHH:MM:SSZ' or 'YYYY-MM-DDTHH:MM:SS.ffffffZ' string,
+    the shapes hubs send, or None for any other shape.
+    datetime.fromisoformat() of these shapes is several times faster than
+    the regular expression of django.utils.dateparse.parse_datetime().
+    The UTC offset is passed to fromisoformat() too, it is faster than datetime.replace()
+    """
+    length = len(value)
+    if (length == 20 or length == 27 and value[19] == '.') and value[10] == 'T' and value[-1] == 'Z':
+        try:
+            return datetime.fromisoformat(value[:-1] + '+00:00')
+        except ValueError:
+            return None
+    return None
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def items_to_columns(data):
+    """
+    Converts list of readings {sensor, date_time_collected, sensor_data_value}
+    with integer epoch milliseconds date_time_collected into ReadingColumns
+    without per-reading serializers.
+    Returns tuple (columns, rejected) where rejected is a dict of error codes of the malformed
+    readings by index, they are kept in the columns with placeholder values
+    to be passed to prepare_columns()
+    """
+    default_value = SensorCollectedData._meta.get_field('sensor_data_value').default
+    serial_numbers = OrderedDict()
+    sensor_indices = np.zeros(len(data), dtype=np.intp)
+    timestamps = np.zeros(len(data), dtype=np.int64)
+    values = np.zeros(len(data), dtype=np.float64)
+    rejected = {}
+    for index, item in enumerate(data):
+        if not isinstance(item, dict):
+            rejected[index] = 'invalid'
+            continue
+        sensor = item.get('sensor')
+        date_time_collected = item.get('date_time_collected')
+        sensor_data_value = item.get('sensor_data_value', default_value)
+        if sensor is None:
+            rejected[index] = 'sensor:required'
+        elif not isinstance(sensor, (str, int)):
+            rejected[index] = 'sensor:invalid'
+        elif date_time_collected is None:
+            rejected[index] = 'date_time_collected:required'
+        elif not isinstance(date_time_collected, int) or isinstance(date_time_collected, bool) \
+                or not MIN_EPOCH_MILLIS <= date_time_collected <= MAX_EPOCH_MILLIS:
+            rejected[index] = 'date_time_collected:invalid'
+        elif not _is_number(sensor_data_value):
+            rejected[index] = 'sensor_data_value:invalid'
+        else:
+            sensor_indices[index] = serial_numbers.setdefault(str(sensor), len(serial_numbers))
+            timestamps[index] = date_time_collected
+            values[index] = sensor_data_value
+
+    if rejected and not serial_numbers:
+        # Placeholder sensor of the malformed readings
+        serial_numbers[''] = 0
+    columns = ReadingColumns(
+        sensor_serial_numbers=list(serial_numbers),
+        sensor_indices=sensor_indices,
+        timestamps=timestamps,
+        values=values
+    )
+    return columns, rejected
+
+
+def prepare_columns(columns, on_conflict=ON_CONFLICT_ERROR, rejected=None):
+    """
+    Validates ReadingColumns batch without per-reading serializers.
+    Sensors are resolved by the sensor metadata cache, values are validated
+    at once by sensor_validation.validate_values().
+    rejected is an optional dict of error codes by index of readings already known to be invalid.
+    Returns tuple (readings, rejected rows) where readings is a list of not saved
+    SensorCollectedData of the valid readings and rejected rows is a list of
+    [index, error code] pairs of the invalid ones
+    """
+    sensor_serial_numbers = list(columns.sensor_serial_numbers)
+    sensor_indices = np.asarray(columns.sensor_indices, dtype=np.intp)
+    timestamps = np.asarray(columns.timestamps, dtype=np.int64)
+    values = np.asarray(columns.values, dtype=np.float64)
+
+    metadata = sensor_metadata_cache.get_many(set(sensor_serial_numbers))
+    known_sensors = np.array(
+        [serial_number in metadata for serial_number in sensor_serial_numbers], dtype=bool
+    )
+    data_types = np.array(
+        [
+            metadata[serial_number].data_type if serial_number in metadata else ''
+            for serial_number in sensor_serial_numbers
+        ],
+        dtype=object
+    )
+
+    rejected = dict(rejected or {})
+    for index in np.flatnonzero(~known_sensors[sensor_indices]):
+        rejected.setdefault(int(index), 'sensor:does_not_exist')
+    invalid_timestamps = (timestamps < MIN_EPOCH_MILLIS) | (timestamps > MAX_EPOCH_MILLIS)
+    for index in np.flatnonzero(invalid_timestamps):
+        rejected.setdefault(int(index), 'date_time_collected:invalid')
+    error_indices, error_codes = sensor_validation.validate_values(
+        data_types[sensor_indices],
+        values
+    )
+    for index, error_code in zip(error_indices, error_codes):
+        rejected.setdefault(int(index), error_code)
+
+    accepted_mask = np.ones(values.size, dtype=bool)
+    accepted_mask[list(rejected)] = False
+    accepted = np.flatnonzero(accepted_mask)
+    readings = [
+        SensorCollectedData(
+            sensor_id=sensor_serial_numbers[sensor_index],
+            date_time_collected=date_time_collected,
+            sensor_data_value=sensor_data_value
+        )
+        for sensor_index, date_time_collected, sensor_data_value in zip(
+            sensor_indices[accepted].tolist(),
+            epoch_millis_to_datetimes(timestamps[accepted]),
+            values[accepted].tolist()
+        )
+    ]
+
+    if on_conflict == ON_CONFLICT_ERROR:
+        keys = [
+            reading_key(reading.sensor_id, reading.date_time_collected) for reading in readings
+        ]
+        duplicates = find_existing_keys(keys)
+        unique_readings = []
+        for index, key, reading in zip(accepted.tolist(), keys, readings):
+            if key in duplicates:
+                rejected[index] = 'unique'
+            else:
+                unique_readings.append(reading)
+            duplicates.add(key)
+        readings = unique_readings
+
+    return readings, [[index, rejected[index]] for index in sorted(rejected)]
+
+
+def is_series_batch(data):
+    """
+    Returns True when parsed JSON payload is a columnar batch, list of series
+    {sensor, t0, dt, values} instead of list of readings
+    """
+    return isinstance(data, list) and bool(data) and all(
+        isinstance(item, dict) and 'values' in item for item in data
+    )
+
+
+def _series_start(t0):
+    """
+    Returns epoch milliseconds of series t0, either epoch milliseconds or ISO 8601 string
+    """
+    if isinstance(t0, int) and not isinstance(t0, bool):
+        return t0
+    date_time = None
+    if isinstance(t0, str):
+        date_time = parse_hub_datetime(t0) or parse_datetime(t0)
+    if date_time is None:
+        raise ValueError('t0 must be epoch milliseconds or ISO 8601 datetime')
+    if timezone.is_naive(date_time):
+        date_time = timezone.make_aware(date_time, timezone.utc)
+    return datetime_to_epoch_millis(date_time)
+
+
+def expand_series(data):
+    """
+    Expands columnar batch into ReadingColumns. Every series is
+        {
+            'sensor': sensor serial number,
+            't0': time of the first value, epoch milliseconds or ISO 8601 string,
+            'dt': integer milliseconds between consecutive values, either a list of
+            len(values) - 1 deltas or one number. When omitted sensors_data_fetch_time
+            of the sensor Device is used,
+            'values': list of sensor values
+        }
+    Readings are indexed in order of series, then in order of values
+    """
+    serial_numbers = OrderedDict()
+    for item in data:
+        serial_numbers.setdefault(str(item.get('sensor')), len(serial_numbers))
+    metadata = sensor_metadata_cache.get_many(serial_numbers)
+
+    sensor_indices = []
+    timestamps = []
+    values = []
+    for index, item in enumerate(data):
+        serial_number = str(item.get('sensor'))
+        try:
+            series_values = np.asarray(item['values'], dtype=np.float64)
+            if series_values.ndim != 1:
+                raise ValueError('values must be a list of numbers')
+
+            dt = item.get('dt')
+            if dt is None:
+                # Readings of unknown sensor are rejected by prepare_columns() anyway
+                sensor_metadata = metadata.get(serial_number)
+                fetch_interval = sensor_metadata.fetch_interval if sensor_metadata else None
+                dt = int(fetch_interval.total_seconds() * 1000) if fetch_interval else 0
+            deltas = np.asarray(dt)
+            # Fractional deltas would be truncated and collapse readings into one timestamp
+            if deltas.dtype.kind not in 'iu' or (deltas < 0).any():
+                raise ValueError('dt must be non-negative integer milliseconds')
+            deltas = deltas.astype(np.int64)
+            if deltas.ndim == 0:
+                deltas = np.full(max(series_values.size - 1, 0), deltas, dtype=np.int64)
+            elif deltas.shape != (max(series_values.size - 1, 0), ):
+                raise ValueError('dt must contain len(values) - 1 deltas')
+
+            offsets = np.zeros(series_values.size, dtype=np.int64)
+            np.cumsum(deltas, out=offsets[1:])
+            series_timestamps = _series_start(item.get('t0')) + offsets
+        except (TypeError, ValueError, OverflowError) as exc:
+            raise ParseError('Series {}: {}'.format(index, exc))
+
+        sensor_indices.append(
+            np.full(series_values.size, serial_numbers[serial_number], dtype=np.intp)
+        )
+        timestamps.append(series_timestamps)
+        values.append(series_values)
+
+    return ReadingColumns(
+        sensor_serial_numbers=list(serial_numbers),
+        sensor_indices=np.concatenate(sensor_indices),
+        timestamps=np.concatenate(timestamps),
+        values=np.concatenate(values)
+    )
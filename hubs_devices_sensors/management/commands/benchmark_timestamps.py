@@ -0,0 +1,55 @@
+"""
+benchmark_timestamps.py
+Management command that compares parsing of a batch of hub timestamps
+by DateTimeField and by HubDateTimeField
+e.g. python manage.py benchmark_timestamps --readings 10000
+Classes:
+    Command
+"""
+import timeit
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+from rest_framework.fields import DateTimeField
+from hubs_devices_sensors.serializers import HubDateTimeField
+
+
+class Command(BaseCommand):
+
+    """
+    Class Command - times to_internal_value() of both fields for every timestamp of the batch,
+    best of --repeat runs, and checks that both fields return equal datetimes
+    """
+
+    help = 'Compares parsing of hub timestamps by DateTimeField and HubDateTimeField'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readings', type=int, default=10000, help='Timestamps in the batch')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs of every field')
+
+    def handle(self, *args, **options):
+        start = datetime(2019, 2, 7, 8, 10, 22)
+        timestamps = [
+            (start + timedelta(milliseconds=1500 * index)).strftime(
+                '%Y-%m-%dT%H:%M:%S.%fZ' if index % 2 else '%Y-%m-%dT%H:%M:%SZ'
+            )
+            for index in range(options['readings'])
+        ]
+
+        results = {}
+        for field in (DateTimeField(), HubDateTimeField()):
+            name = type(field).__name__
+            parsed = [field.to_internal_value(timestamp) for timestamp in timestamps]
+            seconds = min(timeit.repeat(
+                lambda: [field.to_internal_value(timestamp) for timestamp in timestamps],
+                number=1,
+                repeat=options['repeat']
+            ))
+            results[name] = (parsed, seconds)
+            self.stdout.write('{}: {:.1f} ms per {} timestamps'.format(
+                name, seconds * 1000, len(timestamps)
+            ))
+
+        (default_parsed, default_seconds), (hub_parsed, hub_seconds) = results.values()
+        if default_parsed != hub_parsed:
+            self.stderr.write('Parsed datetimes differ')
+        self.stdout.write('Speedup: {:.1f}x'.format(default_seconds / hub_seconds))
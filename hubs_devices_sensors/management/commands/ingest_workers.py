@@ -0,0 +1,197 @@
+"""
+ingest_workers.py
+Management command that runs the pool of ingest worker processes
+e.g. python manage.py ingest_workers --workers 4
+Classes:
+    BatchOutcome,
+    Command
+Functions:
+    process_batch,
+    get_ring,
+    warm_cache,
+    run_worker
+"""
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from collections import namedtuple
+from io import BytesIO
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.http import QueryDict
+from rest_framework.exceptions import APIException
+from rest_framework.utils.mediatypes import media_type_matches
+import hubs_devices_sensors.app_settings as app_settings
+import hubs_devices_sensors.ingestion as ingestion
+from hubs_devices_sensors.ingest_queue import ingest_queue
+from hubs_devices_sensors.models import Hub
+from hubs_devices_sensors.sensor_cache import sensor_metadata_cache
+from hubs_devices_sensors.sharding import ConsistentHashRing
+from hubs_devices_sensors.views import SensorCollectedDataListCreateAPIView
+
+
+logger = logging.getLogger(__name__)
+
+# Outcome of a processed batch:
+#   done - False when the batch should be retried later,
+#   error - why the batch was rejected, None when it was written
+BatchOutcome = namedtuple('BatchOutcome', ('done', 'error'))
+
+
+def _rejected(batch, detail):
+    logger.warning('Batch %s is rejected: %s', batch.id, detail)
+    return BatchOutcome(done=True, error=json.dumps(detail, default=str))
+
+
+def process_batch(batch):
+    """
+    Parses, validates and writes one queued batch like the collect-data endpoint does.
+    Batch that keeps failing with unexpected errors is rejected after INGEST_QUEUE_MAX_ATTEMPTS claims.
+    Returns BatchOutcome of the batch
+    """
+    view = SensorCollectedDataListCreateAPIView()
+    parsers = [
+        parser for parser in view.get_parsers()
+        if media_type_matches(parser.media_type, batch.content_type)
+    ]
+    if not parsers:
+        return _rejected(batch, 'Unsupported Content-Type "{}"'.format(batch.content_type))
+
+    query_params = QueryDict(batch.query_string, mutable=True)
+    if batch.attempts > 1 and query_params.get('on_conflict', ingestion.ON_CONFLICT_ERROR) \
+            == ingestion.ON_CONFLICT_ERROR:
+        # Readings of the batch could be written by the interrupted attempt already
+        query_params['on_conflict'] = ingestion.ON_CONFLICT_SKIP
+
+    try:
+        data = parsers[0].parse(BytesIO(batch.body), batch.content_type, {'view': view})
+        response = view.ingest(data, query_params)
+    except APIException as exc:
+        if exc.status_code >= 500:
+            logger.warning('Batch %s is postponed: %s', batch.id, exc.detail)
+            return BatchOutcome(done=False, error=None)
+        return _rejected(batch, exc.detail)
+    except Exception as exc:
+        logger.exception('Batch %s failed', batch.id)
+        if batch.attempts >= app_settings.get('INGEST_QUEUE_MAX_ATTEMPTS'):
+            # Claimed again it would fail the same way and block the next batches of its hubs
+            return _rejected(batch, 'Failed {} attempts: {!r}'.format(batch.attempts, exc))
+        return BatchOutcome(done=False, error=None)
+
+    if response.status_code >= 400:
+        return _rejected(batch, response.data)
+    return BatchOutcome(done=True, error=None)
+
+
+def get_ring(workers):
+    """
+    Returns hash ring of the pool of workers, node of a worker is its index
+    """
+    return ConsistentHashRing(range(workers), app_settings.get('INGEST_RING_REPLICAS'))
+
+
+def warm_cache(ring, index):
+    """
+    Loads metadata of all sensors of the hubs owned by the worker into the sensor metadata cache
+    """
+    hub_serial_numbers = [
+        hub_serial_number
+        for hub_serial_number in Hub.objects.values_list('hub_serial_number', flat=True)
+        if ring.node_for(hub_serial_number) == index
+    ]
+    return sensor_metadata_cache.warm_hubs(hub_serial_numbers)
+
+
+def run_worker(index, workers):
+    """
+    Processes queued batches of the hubs owned by the worker with given index
+    and batches without hub until the worker process gets SIGTERM
+    """
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    # Ctrl+C is handled by the pool process that stops its workers
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    worker = os.getpid()
+    poll_interval = app_settings.get('INGEST_QUEUE_POLL_INTERVAL') / 1000
+    cache_ttl = app_settings.get('SENSOR_CACHE_TTL')
+    ring = get_ring(workers)
+    ranges = ring.ranges(index)
+    warmed_at = None
+    while not stopping:
+        if warmed_at is None or cache_ttl is not None and time.monotonic() - warmed_at > cache_ttl:
+            warm_cache(ring, index)
+            warmed_at = time.monotonic()
+
+        batches = ingest_queue.claim(worker, ranges=ranges)
+        if not batches:
+            ingest_queue.release_stale(app_settings.get('INGEST_QUEUE_CLAIM_TIMEOUT'))
+            time.sleep(poll_interval)
+            continue
+        for batch in batches:
+            outcome = process_batch(batch)
+            if not outcome.done:
+                ingest_queue.release(batch.id)
+                connection.close()
+                time.sleep(poll_interval)
+            elif outcome.error is None:
+                ingest_queue.ack(batch.id)
+            else:
+                ingest_queue.fail(batch.id, outcome.error)
+
+
+class Command(BaseCommand):
+
+    """
+    Class Command - starts worker processes that consume the ingest queue,
+    restarts the ones that exit and returns their claimed batches to the queue.
+    Hubs are partitioned between the workers by consistent hashing, worker with the same index
+    owns the same hubs after restart and changing number of workers moves few hubs.
+    Stops the workers on SIGTERM or Ctrl+C, every worker finishes its current batch first
+    """
+
+    help = 'Runs worker processes that ingest batches of the collect-data ingest queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Number of worker processes, number of CPUs by default'
+        )
+
+    def handle(self, *args, **options):
+        stopping = []
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+
+        # Forked workers must not share database connections of this process
+        connections.close_all()
+        count = options['workers']
+        workers = [self.start_worker(index, count) for index in range(count)]
+        self.stdout.write('Started {} ingest workers'.format(len(workers)))
+        try:
+            while not stopping:
+                time.sleep(1)
+                for index, worker in enumerate(workers):
+                    if not worker.is_alive():
+                        logger.warning('Ingest worker %s exited with %s', worker.pid, worker.exitcode)
+                        ingest_queue.release_worker(worker.pid)
+                        workers[index] = self.start_worker(index, count)
+        except KeyboardInterrupt:
+            pass
+
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.join()
+            ingest_queue.release_worker(worker.pid)
+        self.stdout.write('Stopped ingest workers')
+
+    @staticmethod
+    def start_worker(index, workers):
+        worker = multiprocessing.Process(target=run_worker, args=(index, workers))
+        worker.start()
+        return worker
@@ -0,0 +1,32 @@
+"""
+rebuild_rollups.py
+Management command that recomputes minute, hour and day rollups of SensorCollectedData
+e.g. python manage.py rebuild_rollups --sensor sensor1serial
+Classes:
+    Command
+"""
+from django.core.management.base import BaseCommand
+from hubs_devices_sensors.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+
+    """
+    Class Command - removes rollups of the sensors and computes them again from the readings,
+    e.g. to backfill rollups of the readings written before they were maintained
+    or after readings were deleted or edited
+    """
+
+    help = 'Recomputes minute, hour and day rollups of the collected data'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sensor',
+            action='append',
+            dest='sensors',
+            help='Serial number of the sensor, could be repeated. All sensors by default'
+        )
+
+    def handle(self, *args, **options):
+        created = rebuild_rollups(options['sensors'])
+        self.stdout.write('Rebuilt {} rollups'.format(created))
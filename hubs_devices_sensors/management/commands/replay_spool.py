@@ -0,0 +1,34 @@
+"""
+replay_spool.py
+Management command that loads the collect-data spool into SensorCollectedData
+e.g. python manage.py replay_spool --directory /var/spool/hubs
+Classes:
+    Command
+"""
+from django.core.management.base import BaseCommand
+from hubs_devices_sensors.spool import spool
+
+
+class Command(BaseCommand):
+
+    """
+    Class Command - loads sealed segments and segments abandoned by stopped processes
+    of the spool directory (SPOOL_DIR option by default) and removes them.
+    Active segments of running processes are left to their drainers
+    """
+
+    help = 'Loads spooled collect-data readings into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--directory',
+            help='Spool directory, SPOOL_DIR option by default'
+        )
+
+    def handle(self, *args, **options):
+        segments, result = spool.drain(options['directory'])
+        self.stdout.write(
+            'Replayed {} segments: {} readings inserted, {} duplicates'.format(
+                segments, result.inserted, result.duplicates
+            )
+        )
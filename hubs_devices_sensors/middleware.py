@@ -0,0 +1,135 @@
+"""
+middleware.py
+Classes:
+    RequestBodyTooLarge,
+    DecompressingStream,
+    RequestBodyDecompressionMiddleware
+"""
+import zlib
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+import hubs_devices_sensors.app_settings as app_settings
+
+
+# zlib wbits of the supported Content-Encoding values
+CONTENT_ENCODINGS = {
+    'gzip': 16 + zlib.MAX_WBITS,
+    'x-gzip': 16 + zlib.MAX_WBITS,
+    'deflate': zlib.MAX_WBITS,
+}
+
+
+class RequestBodyTooLarge(APIException):
+
+    """
+    Class RequestBodyTooLarge - raised when decompressed request body
+    exceeds MAX_DECOMPRESSED_BODY_SIZE
+    """
+
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Decompressed request body is too large.'
+    default_code = 'request_body_too_large'
+
+
+class DecompressingStream:
+
+    """
+    Class DecompressingStream - file-like wrapper that decompresses the wrapped stream
+    on the fly. Compressed data is read and decompressed by chunk_size bytes,
+    so a small body that inflates to a huge one is never held in memory:
+    RequestBodyTooLarge is raised as soon as max_size decompressed bytes are exceeded,
+    ParseError is raised when the wrapped stream ends before the compressed stream does
+    """
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, stream, wbits, max_size):
+        self._stream = stream
+        self._decompressor = zlib.decompressobj(wbits)
+        self._max_size = max_size
+        self._size = 0
+        self._buffer = bytearray()
+        self._eof = False
+
+    def _fill(self):
+        compressed = self._decompressor.unconsumed_tail
+        if not compressed:
+            compressed = self._stream.read(self.chunk_size)
+        try:
+            if compressed:
+                data = self._decompressor.decompress(compressed, self.chunk_size)
+            else:
+                data = self._decompressor.flush()
+                self._eof = True
+        except zlib.error:
+            raise ParseError('Request body could not be decompressed')
+        if self._eof and not self._decompressor.eof:
+            # Body ended before the end of the compressed stream
+            raise ParseError('Truncated compressed body')
+
+        self._size += len(data)
+        if self._size > self._max_size:
+            raise RequestBodyTooLarge()
+        self._buffer += data
+
+    def _take(self, size):
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def read(self, size=-1):
+        while not self._eof and (size is None or size < 0 or len(self._buffer) < size):
+            self._fill()
+        if size is None or size < 0:
+            size = len(self._buffer)
+        return self._take(size)
+
+    def readline(self, size=-1):
+        while not self._eof and b'\n' not in self._buffer \
+                and (size is None or size < 0 or len(self._buffer) < size):
+            self._fill()
+        end = self._buffer.find(b'\n') + 1 or len(self._buffer)
+        if size is not None and size >= 0:
+            end = min(end, size)
+        return self._take(end)
+
+
+class RequestBodyDecompressionMiddleware:
+
+    """
+    Class RequestBodyDecompressionMiddleware - decodes gzip and deflate
+    Content-Encoding of request bodies for views with accepts_compressed_body = True.
+    Decompression is streamed, so the view parsers read the decoded body as usual.
+    Responds 415 to unsupported Content-Encoding of these views
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        content_encoding = request.META.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if content_encoding in ('', 'identity'):
+            return None
+
+        # Django REST framework views keep their class in view_func.cls
+        view_class = getattr(view_func, 'cls', None)
+        if not getattr(view_class, 'accepts_compressed_body', False):
+            return None
+
+        if content_encoding not in CONTENT_ENCODINGS:
+            return JsonResponse(
+                {'detail': 'Unsupported Content-Encoding "{}".'.format(content_encoding)},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+
+        request._stream = DecompressingStream(
+            request._stream,
+            CONTENT_ENCODINGS[content_encoding],
+            app_settings.get('MAX_DECOMPRESSED_BODY_SIZE')
+        )
+        del request.META['HTTP_CONTENT_ENCODING']
+        return None
@@ -0,0 +1,22 @@
+# Generated by Django 2.1.5 on 2026-10-17 20:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hubs_devices_sensors', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sensorcollecteddata',
+            name='date_time_collected',
+            field=models.DateTimeField(verbose_name='Date & Time Collected'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='sensorcollecteddata',
+            unique_together={('sensor', 'date_time_collected')},
+        ),
+    ]
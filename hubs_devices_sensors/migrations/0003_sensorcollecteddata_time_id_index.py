@@ -0,0 +1,17 @@
+# Generated by Django 2.1.5 on 2026-10-17 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hubs_devices_sensors', '0002_sensorcollecteddata_unique_together'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sensorcollecteddata',
+            index=models.Index(fields=['date_time_collected', 'id'], name='collected_data_time_id_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 2.1.5 on 2026-10-17 21:13
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hubs_devices_sensors', '0003_sensorcollecteddata_time_id_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SensorCollectedDataRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resolution', models.CharField(choices=[('1m', 'Minute'), ('1h', 'Hour'), ('1d', 'Day')], max_length=2, verbose_name='Resolution')),
+                ('bucket', models.DateTimeField(verbose_name='Bucket Start')),
+                ('count', models.PositiveIntegerField(verbose_name='Readings Count')),
+                ('minimum', models.FloatField(verbose_name='Min Value')),
+                ('maximum', models.FloatField(verbose_name='Max Value')),
+                ('total', models.FloatField(verbose_name='Sum of Values')),
+                ('last_value', models.FloatField(verbose_name='Last Value')),
+                ('last_date_time_collected', models.DateTimeField(verbose_name='Last Date & Time Collected')),
+                ('sensor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sensor_collected_data_rollups', to='hubs_devices_sensors.Sensor', to_field='sensor_serial_number', verbose_name='Sensor')),
+            ],
+            options={
+                'verbose_name': 'Sensor Collected Data Rollup',
+                'verbose_name_plural': 'Sensor Collected Data Rollups',
+                'db_table': 'sensor_collected_data_rollups',
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='sensorcollecteddatarollup',
+            unique_together={('sensor', 'resolution', 'bucket')},
+        ),
+    ]
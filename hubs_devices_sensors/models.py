@@ -1,12 +1,13 @@
 """
 models.py
-Clases: Hub, Device, Sensor, SensorCollectedData
+Clases: Hub, Device, Sensor, SensorCollectedData, SensorCollectedDataRollup
 """
 from datetime import timedelta
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 import hubs_devices_sensors.sensor_consts as sensor_consts
+import hubs_devices_sensors.sensor_validation as sensor_validation
 
 
 class SensorCollectedData(models.Model):
@@ -17,13 +18,15 @@ class SensorCollectedData(models.Model):
     @param sensor -  models.ForeignKey('hubs_devices_sensors.Sensor') stores the foreign key
     to sensor which data is collected
     @param sensor_data_value - models.FloatField stores sensor value at current time
+    Pair (sensor, date_time_collected) is unique. Its index also serves time range
+    queries of the sensor collected data. Index (date_time_collected, id) serves
+    keyset pagination of lists of many sensors
 
     @method clean() - performs validation of the sensor_data_value
     @method save() - saves object after parforming clean() method
     """
 
     date_time_collected = models.DateTimeField(
-        unique=True,
         verbose_name='Date & Time Collected'
     )
 
@@ -45,31 +48,22 @@ class SensorCollectedData(models.Model):
         db_table = 'sensor_collected_data'
         verbose_name = 'Sensor Collected Data'
         verbose_name_plural = 'Sensor Collected Data'
+        unique_together = (
+            'sensor',
+            'date_time_collected'
+        )
+        indexes = [
+            models.Index(fields=['date_time_collected', 'id'], name='collected_data_time_id_idx'),
+        ]
 
     def clean(self, *args, **kwargs):
-        if self.sensor.sensor_data_type == sensor_consts.PH_SENSOR:
-            if self.sensor_data_value:
-                if self.sensor_data_value > sensor_consts.PH_SENSOR_MAX_VALUE and self.sensor_data_value:
-                    raise ValidationError('pH Value cannot be more than 14')
-                elif self.sensor_data_value < sensor_consts.PH_SENSOR_MIN_VALIE:
-                    raise ValidationError('pH Value cannot be less than 0')
-
-        elif self.sensor.sensor_data_type == sensor_consts.CO2_SENSOR and self.sensor_data_value:
-            if self.sensor_data_value:
-                if self.sensor_data_value > sensor_consts.CO2_SENSOR_MAX_VALUE:
-                    raise ValidationError('CO2 Value cannot be more than 100')
-                elif self.sensor_data_value < sensor_consts.CO2_SENSOR_MIN_VALUE:
-                    raise ValidationError('CO2 Value cannot be less than 0')
-
-        elif self.sensor.sensor_data_type == sensor_consts.TEMPERATURE_SENSOR and self.sensor_data_value:
-            if self.sensor_data_value:
-                if self.sensor_data_value > sensor_consts.TEMPERATURE_SENSOR_MAX_VALUE:
-                    raise ValidationError('Temperature Value cannot be more than 127')
-                elif self.sensor_data_value < sensor_consts.TEMPERATURE_SENSOR_MIN_VALUE:
-                    raise ValidationError('Temperature Value cannot be less than -40')
-
-        else:
-            raise ValidationError('No sensor data type was given')
+        data_type = self.sensor.sensor_data_type
+        error_code = sensor_validation.validate_value(data_type, self.sensor_data_value)
+        if error_code is not None:
+            raise ValidationError(
+                sensor_validation.error_message(data_type, error_code),
+                code=error_code
+            )
         super(SensorCollectedData, self).clean(*args, **kwargs)
 
     def save(self, *args, **kwargs):
@@ -77,6 +71,85 @@ class SensorCollectedData(models.Model):
         super(SensorCollectedData, self).save(*args, **kwargs)
 
 
+class SensorCollectedDataRollup(models.Model):
+
+    """
+    Class SensorCollectedDataRollup - stores aggregates of the collected data of a sensor
+    in one time bucket of one resolution, maintained by rollups.py
+    @param sensor - models.ForeignKey('hubs_devices_sensors.Sensor') stores the foreign key
+    to sensor which data is aggregated
+    @param resolution - models.CharField stores bucket width ('1m', '1h' or '1d')
+    @param bucket - models.DateTimeField stores start of the bucket,
+    aligned to multiples of the bucket width since the Unix epoch
+    @param count - models.PositiveIntegerField stores number of readings of the bucket
+    @param minimum, maximum, total - models.FloatField store min, max and sum of the readings values
+    @param last_value - models.FloatField stores value of the latest reading of the bucket
+    @param last_date_time_collected - models.DateTimeField stores time of the latest reading
+    Triple (sensor, resolution, bucket) is unique, its index serves time range queries
+    """
+
+    RESOLUTION_MINUTE = '1m'
+    RESOLUTION_HOUR = '1h'
+    RESOLUTION_DAY = '1d'
+    RESOLUTIONS = (
+        (RESOLUTION_MINUTE, 'Minute'),
+        (RESOLUTION_HOUR, 'Hour'),
+        (RESOLUTION_DAY, 'Day'),
+    )
+
+    sensor = models.ForeignKey(
+        'hubs_devices_sensors.Sensor',
+        on_delete=models.CASCADE,
+        related_name='sensor_collected_data_rollups',
+        to_field='sensor_serial_number',
+        verbose_name='Sensor'
+    )
+
+    resolution = models.CharField(
+        max_length=2,
+        choices=RESOLUTIONS,
+        verbose_name='Resolution'
+    )
+
+    bucket = models.DateTimeField(
+        verbose_name='Bucket Start'
+    )
+
+    count = models.PositiveIntegerField(
+        verbose_name='Readings Count'
+    )
+
+    minimum = models.FloatField(
+        verbose_name='Min Value'
+    )
+
+    maximum = models.FloatField(
+        verbose_name='Max Value'
+    )
+
+    total = models.FloatField(
+        verbose_name='Sum of Values'
+    )
+
+    last_value = models.FloatField(
+        verbose_name='Last Value'
+    )
+
+    last_date_time_collected = models.DateTimeField(
+        verbose_name='Last Date & Time Collected'
+    )
+
+    class Meta:
+        db_table = 'sensor_collected_data_rollups'
+        verbose_name = 'Sensor Collected Data Rollup'
+        verbose_name_plural = 'Sensor Collected Data Rollups'
+        unique_together = (
+            'sensor',
+            'resolution',
+            'bucket'
+        )
+
+
 class Sensor(models.Model):
 
     """
@@ -0,0 +1,130 @@
+"""
+pagination.py
+Classes:
+    ReadingsKeysetPagination
+"""
+import base64
+from collections import OrderedDict
+from datetime import timedelta
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+import hubs_devices_sensors.app_settings as app_settings
+import hubs_devices_sensors.ingestion as ingestion
+
+
+MICROSECOND = timedelta(microseconds=1)
+
+
+class ReadingsKeysetPagination(BasePagination):
+
+    """
+    Class ReadingsKeysetPagination - keyset pagination of SensorCollectedData lists
+    ordered by (date_time_collected, id).
+    A page is selected by the key of the first or last reading of the adjacent page,
+    not by an offset, so every page costs as much as the first one.
+    Cursor is an opaque token of the key and the direction.
+    e.g ?page_size=500 - readings per page, COLLECTED_DATA_PAGE_SIZE by default,
+    at most COLLECTED_DATA_MAX_PAGE_SIZE.
+    Response contains 'next' and 'previous' page links and 'results' list.
+    View could define get_position(item) that returns (date_time_collected, id) of the
+    listed item, e.g. of values_list rows, model objects are supported by default
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+    ordering = ('date_time_collected', 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        reverse, position = self.decode_cursor(request)
+
+        if reverse:
+            queryset = queryset.order_by(*('-' + field for field in self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            date_time_collected, pk = position
+            if reverse:
+                queryset = queryset.filter(
+                    Q(date_time_collected__lt=date_time_collected)
+                    | Q(date_time_collected=date_time_collected, id__lt=pk)
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(date_time_collected__gt=date_time_collected)
+                    | Q(date_time_collected=date_time_collected, id__gt=pk)
+                )
+
+        # One more reading tells whether there is a page after this one
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        del results[self.page_size:]
+        if reverse:
+            results.reverse()
+
+        get_position = getattr(view, 'get_position', self.get_position)
+        self.first_position = get_position(results[0]) if results else position
+        self.last_position = get_position(results[-1]) if results else position
+        self.has_next = position is not None if reverse else has_more
+        self.has_previous = has_more if reverse else position is not None
+        return results
+
+    @staticmethod
+    def get_position(item):
+        return item.date_time_collected, item.pk
+
+    def get_page_size(self, request):
+        page_size = app_settings.get('COLLECTED_DATA_PAGE_SIZE')
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+            if requested > 0:
+                page_size = requested
+        except (KeyError, ValueError):
+            pass
+        return min(page_size, app_settings.get('COLLECTED_DATA_MAX_PAGE_SIZE'))
+
+    def decode_cursor(self, request):
+        """
+        Returns tuple (reverse, position) of the requested cursor, (False, None) for the first page
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return False, None
+        try:
+            reverse, micros, pk = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii').split(':')
+            date_time_collected = ingestion.EPOCH + int(micros) * MICROSECOND
+            return reverse == 'r', (date_time_collected, int(pk))
+        except (TypeError, ValueError, OverflowError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, reverse, position):
+        date_time_collected, pk = position
+        micros = (date_time_collected - ingestion.EPOCH) // MICROSECOND
+        token = '{}:{}:{}'.format('r' if reverse else 'f', micros, pk)
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            base64.urlsafe_b64encode(token.encode('ascii')).decode('ascii')
+        )
+
+    def get_next_link(self):
+        if not self.has_next or self.last_position is None:
+            return None
+        return self.encode_cursor(False, self.last_position)
+
+    def get_previous_link(self):
+        if not self.has_previous or self.first_position is None:
+            return None
+        return self.encode_cursor(True, self.first_position)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
@@ -0,0 +1,140 @@
+"""
+parsers.py
+Request body parsers of the sensors collect-data ingestion endpoints
+Classes:
+    NDJSONParser,
+    SensorReadingsBinaryParser
+"""
+import json
+import struct
+import numpy as np
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+import hubs_devices_sensors.app_settings as app_settings
+from .ingestion import ReadingColumns
+
+
+# Yielded by NDJSONParser in place of a line that is not valid JSON
+INVALID_LINE = object()
+
+
+class NDJSONParser(BaseParser):
+
+    """
+    Class NDJSONParser - parser of newline-delimited JSON (one reading per line).
+    Returns lazy iterator of parsed lines instead of a list, so the request body
+    is read in NDJSON_CHUNK_SIZE chunks while the view consumes readings
+    and memory use does not depend on the body size.
+    Line that is not valid JSON is yielded as INVALID_LINE
+    """
+
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if stream is None:
+            return iter(())
+        return self.iter_lines(
+            stream,
+            app_settings.get('NDJSON_CHUNK_SIZE'),
+            app_settings.get('NDJSON_MAX_LINE_LENGTH')
+        )
+
+    @classmethod
+    def iter_lines(cls, stream, chunk_size, max_line_length):
+        tail = b''
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            lines = (tail + chunk).split(b'\n')
+            tail = lines.pop()
+            if len(tail) > max_line_length:
+                raise ParseError('NDJSON line is longer than {} bytes'.format(max_line_length))
+            for line in lines:
+                if line.strip():
+                    yield cls.parse_line(line)
+        if tail.strip():
+            yield cls.parse_line(tail)
+
+    @staticmethod
+    def parse_line(line):
+        try:
+            return json.loads(line.decode('utf-8'))
+        except ValueError:
+            return INVALID_LINE
+
+
+class SensorReadingsBinaryParser(BaseParser):
+
+    """
+    Class SensorReadingsBinaryParser - parser of the packed binary readings payload.
+    Returns ingestion.ReadingColumns.
+    Layout, all numbers are little-endian:
+        header - magic b'HDSR', version (uint8), sensors count (uint16), records count (uint32)
+        sensor table - sensor serial numbers, SERIAL_NUMBER_LENGTH bytes each,
+        ASCII padded with NUL bytes
+        records - sensor table index (uint16), epoch milliseconds (int64),
+        sensor value (float32), 14 bytes each
+
+    @method pack() - returns payload of the readings, used by hubs and tests
+    """
+
+    media_type = 'application/vnd.hubs-readings'
+
+    MAGIC = b'HDSR'
+    VERSION = 1
+    HEADER = struct.Struct('<4sBHI')
+    SERIAL_NUMBER_LENGTH = 16
+    RECORD = np.dtype([('sensor', '<u2'), ('time', '<i8'), ('value', '<f4')])
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        payload = stream.read() if stream is not None else b''
+        if len(payload) < self.HEADER.size:
+            raise ParseError('Readings payload is too short')
+
+        magic, version, sensors_count, records_count = self.HEADER.unpack_from(payload)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ParseError('Unsupported readings payload')
+
+        records_offset = self.HEADER.size + sensors_count * self.SERIAL_NUMBER_LENGTH
+        if len(payload) != records_offset + records_count * self.RECORD.itemsize:
+            raise ParseError('Readings payload size does not match its header')
+
+        try:
+            sensor_serial_numbers = [
+                payload[offset:offset + self.SERIAL_NUMBER_LENGTH].rstrip(b'\0').decode('ascii')
+                for offset in range(self.HEADER.size, records_offset, self.SERIAL_NUMBER_LENGTH)
+            ]
+        except UnicodeDecodeError:
+            raise ParseError('Sensor serial numbers must be ASCII')
+
+        records = np.frombuffer(
+            payload,
+            dtype=self.RECORD,
+            count=records_count,
+            offset=records_offset
+        )
+        if records_count and records['sensor'].max() >= sensors_count:
+            raise ParseError('Record refers to a missing sensor')
+
+        return ReadingColumns(
+            sensor_serial_numbers=sensor_serial_numbers,
+            sensor_indices=records['sensor'].astype(np.intp),
+            timestamps=records['time'].astype(np.int64),
+            values=records['value'].astype(np.float64)
+        )
+
+    @classmethod
+    def pack(cls, sensor_serial_numbers, sensor_indices, timestamps, values):
+        records = np.empty(len(sensor_indices), dtype=cls.RECORD)
+        records['sensor'] = sensor_indices
+        records['time'] = timestamps
+        records['value'] = values
+        return b''.join([
+            cls.HEADER.pack(cls.MAGIC, cls.VERSION, len(sensor_serial_numbers), len(records)),
+            b''.join(
+                serial_number.encode('ascii').ljust(cls.SERIAL_NUMBER_LENGTH, b'\0')
+                for serial_number in sensor_serial_numbers
+            ),
+            records.tobytes()
+        ])
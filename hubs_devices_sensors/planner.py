@@ -0,0 +1,47 @@
+"""
+planner.py
+Resolution planner of the time range aggregate endpoints.
+Picks the finest data tier - raw readings, minute, hour or day rollups - whose points
+of the range fit into the max_points budget of the client, so that a chart of a year
+costs about as much as a chart of an hour.
+Points of a tier are first bounded by the number of its buckets in the range, which takes
+no query, and counted with a LIMIT max_points + 1 query only when the bound is over the budget,
+so every counting query reads at most max_points + 1 rows.
+Functions:
+    plan_resolution
+"""
+import hubs_devices_sensors.app_settings as app_settings
+from .rollups import TIERS, bucket_start
+
+
+# Resolution of raw readings, other resolutions are the ones of SensorCollectedDataRollup
+RESOLUTION_RAW = 'raw'
+
+
+def _fits(queryset, max_points):
+    return queryset[:max_points + 1].count() <= max_points
+
+
+def plan_resolution(readings, rollups, sensors_count, start_datetime, end_datetime, max_points):
+    """
+    Returns the finest resolution whose points of the range fit into max_points,
+    the coarsest one when none fits.
+    readings - SensorCollectedData queryset of the range,
+    rollups - SensorCollectedDataRollup queryset of the same sensors, any range.
+    Without ROLLUPS option rollup tiers are planned by the number of their buckets only
+    """
+    if _fits(readings, max_points):
+        return RESOLUTION_RAW
+
+    use_rollups = app_settings.get('ROLLUPS')
+    for resolution, width in TIERS.items():
+        first_bucket = bucket_start(start_datetime, width)
+        buckets_count = sensors_count * ((end_datetime - first_bucket) // width + 1)
+        if buckets_count <= max_points:
+            return resolution
+        if use_rollups and _fits(
+                rollups.filter(resolution=resolution, bucket__range=(first_bucket, end_datetime)),
+                max_points
+        ):
+            return resolution
+    return resolution
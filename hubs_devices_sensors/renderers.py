@@ -0,0 +1,91 @@
+"""
+renderers.py
+Response renderers of the collected-data export (?format=csv, ?format=ndjson)
+Classes:
+    ReadingsExportRenderer,
+    ReadingsCSVRenderer,
+    ReadingsNDJSONRenderer
+"""
+import csv
+from io import StringIO
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class ReadingsExportRenderer(BaseRenderer):
+
+    """
+    Class ReadingsExportRenderer - base of renderers of flat representations, e.g. readings,
+    as lines of text. Lists are exported by streaming, so render() serves only
+    lists that are not streamed. Errors and other data that is not a list of items
+    are rendered as JSON
+
+    @method iter_chunks(items, chunk_size) - yields encoded lines of every chunk_size items
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        response = (renderer_context or {}).get('response')
+        if not isinstance(data, list) or response is not None and response.status_code >= 400:
+            json_renderer = JSONRenderer()
+            if response is not None:
+                response['Content-Type'] = json_renderer.media_type
+            return json_renderer.render(data, accepted_media_type, renderer_context)
+        return b''.join(self.iter_chunks(data, len(data) or 1))
+
+    def iter_chunks(self, items, chunk_size):
+        raise NotImplementedError('.iter_chunks() must be overridden.')
+
+
+class ReadingsCSVRenderer(ReadingsExportRenderer):
+
+    """
+    Class ReadingsCSVRenderer - renders items as CSV, header row is made of keys of the first item
+    """
+
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def iter_chunks(self, items, chunk_size):
+        buffer = StringIO()
+        writer = None
+        count = 0
+        for item in items:
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(item), extrasaction='ignore')
+                writer.writeheader()
+            writer.writerow(item)
+            count += 1
+            if count == chunk_size:
+                yield buffer.getvalue().encode(self.charset)
+                buffer.seek(0)
+                buffer.truncate()
+                count = 0
+        if buffer.tell():
+            yield buffer.getvalue().encode(self.charset)
+
+
+class ReadingsNDJSONRenderer(ReadingsExportRenderer):
+
+    """
+    Class ReadingsNDJSONRenderer - renders items as newline-delimited JSON, one item per line
+    """
+
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+    def iter_chunks(self, items, chunk_size):
+        encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        lines = []
+        for item in items:
+            lines.append(encoder.encode(item))
+            if len(lines) == chunk_size:
+                lines.append('')
+                yield '\n'.join(lines).encode(self.charset)
+                lines = []
+        if lines:
+            lines.append('')
+            yield '\n'.join(lines).encode(self.charset)
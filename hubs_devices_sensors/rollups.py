@@ -0,0 +1,276 @@
+"""
+rollups.py
+Incrementally maintained rollups of SensorCollectedData: count, min, max, sum and last value
+of every sensor in minute, hour and day buckets (SensorCollectedDataRollup).
+Written readings are merged into the stored buckets resolution by resolution:
+the touched buckets are read with SELECT ... FOR UPDATE, merged with the readings in numpy
+and written back with one DELETE and bulk INSERT, so readings that arrive late update
+their old buckets and concurrent writers do not lose each other's updates.
+Buckets of overwritten readings can not be merged into, they are recomputed:
+minute buckets from the readings, hour buckets from minute ones and day buckets from hour ones.
+Readings deleted or edited outside of the ingestion are not tracked,
+manage.py rebuild_rollups recomputes the rollups from scratch.
+Functions:
+    bucket_start,
+    update_rollups,
+    recompute_buckets,
+    rebuild_rollups
+"""
+from collections import OrderedDict
+from datetime import timedelta
+from functools import reduce
+from itertools import islice
+from operator import itemgetter, or_
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+import hubs_devices_sensors.aggregation as aggregation
+import hubs_devices_sensors.app_settings as app_settings
+from .models import SensorCollectedData, SensorCollectedDataRollup
+
+
+# Bucket width of every resolution, from the narrowest one
+TIERS = OrderedDict(
+    (resolution, timedelta(microseconds=aggregation.parse_bucket_width(resolution)))
+    for resolution, _ in SensorCollectedDataRollup.RESOLUTIONS
+)
+
+# Retries of merges whose buckets were created concurrently
+MERGE_RETRIES = 3
+
+ROLLUP_FIELDS = (
+    'sensor_id',
+    'bucket',
+    'count',
+    'minimum',
+    'maximum',
+    'total',
+    'last_value',
+    'last_date_time_collected'
+)
+
+
+def bucket_start(date_time, width):
+    """
+    Returns start of the bucket of given width that contains the aware datetime
+    """
+    return date_time - (date_time - aggregation.EPOCH) % width
+
+
+def _aware(date_time):
+    """
+    Returns naive datetime as aware one of the default time zone, as DateTimeField stores it
+    """
+    if timezone.is_naive(date_time):
+        return timezone.make_aware(date_time, timezone.get_default_timezone())
+    return date_time
+
+
+def _to_datetime(micros):
+    return aggregation.EPOCH + timedelta(microseconds=micros)
+
+
+def _iter_rollups(resolution, aggregator):
+    """
+    Yields not saved SensorCollectedDataRollup of every bucket of the aggregator
+    """
+    for sensor, bucket, count, minimum, maximum, total, last_value, last_time in aggregator.iter_buckets():
+        yield SensorCollectedDataRollup(
+            sensor_id=sensor,
+            resolution=resolution,
+            bucket=_to_datetime(bucket),
+            count=count,
+            minimum=minimum,
+            maximum=maximum,
+            total=total,
+            last_value=last_value,
+            last_date_time_collected=_to_datetime(last_time)
+        )
+
+
+def _bulk_create(rollups):
+    batch_size = app_settings.get('BULK_INGESTION_BATCH_SIZE')
+    rollups = iter(rollups)
+    created = 0
+    while True:
+        batch = list(islice(rollups, batch_size))
+        if not batch:
+            return created
+        SensorCollectedDataRollup.objects.bulk_create(batch)
+        created += len(batch)
+
+
+def _buckets_filter(buckets):
+    """
+    Returns Q object that matches exactly the rollups of given (sensor, bucket start) pairs
+    """
+    starts_by_sensor = {}
+    for sensor_serial_number, start in buckets:
+        starts_by_sensor.setdefault(sensor_serial_number, []).append(start)
+    return reduce(or_, (
+        Q(sensor_id=sensor_serial_number, bucket__in=starts)
+        for sensor_serial_number, starts in starts_by_sensor.items()
+    ))
+
+
+def _ranges_filter(buckets, field, width):
+    """
+    Returns Q object that matches rows of the sensors whose field is in given buckets
+    """
+    return reduce(or_, (
+        Q(**{'sensor_id': sensor_serial_number, field + '__gte': start, field + '__lt': start + width})
+        for sensor_serial_number, start in buckets
+    ))
+
+
+def _merge_rollups(resolution, rows):
+    """
+    Merges (sensor, date_time_collected, sensor_data_value) rows into the rollups of the resolution.
+    Stored rollups of the touched buckets are read and locked with one query, merged
+    with the rows and written back with one DELETE and bulk INSERT. Buckets created
+    by a concurrent writer meanwhile fail the INSERT, then the merge is retried
+    """
+    if not rows:
+        return
+    width = TIERS[resolution] // aggregation.MICROSECOND
+    aggregator = aggregation.BucketAggregator(width)
+    aggregator.add(rows)
+    partials = [
+        (sensor, _to_datetime(bucket), count, minimum, maximum, total, last_value, _to_datetime(last_time))
+        for sensor, bucket, count, minimum, maximum, total, last_value, last_time in aggregator.iter_buckets()
+    ]
+    buckets = _buckets_filter((partial[0], partial[1]) for partial in partials)
+
+    attempt = 0
+    while True:
+        try:
+            with transaction.atomic():
+                stored = list(SensorCollectedDataRollup.objects.select_for_update().filter(
+                    buckets,
+                    resolution=resolution
+                ).values_list(*ROLLUP_FIELDS))
+                merged = aggregation.BucketAggregator(width)
+                # Stable sort keeps the new partial after the stored one of the same last time,
+                # so the new last value wins as it does for readings of the same bucket
+                merged.add_partials(sorted(stored + partials, key=itemgetter(0, 1, 7)))
+                if stored:
+                    SensorCollectedDataRollup.objects.filter(buckets, resolution=resolution).delete()
+                _bulk_create(_iter_rollups(resolution, merged))
+            return
+        except IntegrityError:
+            attempt += 1
+            if attempt > MERGE_RETRIES:
+                raise
+
+
+def _recompute_rollups(resolution, buckets):
+    """
+    Replaces rollups of the resolution of given (sensor, bucket start) pairs by ones computed
+    from the readings or from the rollups of the previous resolution
+    """
+    if not buckets:
+        return
+    resolutions = list(TIERS)
+    width = TIERS[resolution]
+    aggregator = aggregation.BucketAggregator(width // aggregation.MICROSECOND)
+    if resolution == resolutions[0]:
+        aggregator.add(list(SensorCollectedData.objects.filter(
+            _ranges_filter(buckets, 'date_time_collected', width)
+        ).order_by('sensor_id', 'date_time_collected').values_list(
+            'sensor_id', 'date_time_collected', 'sensor_data_value'
+        )))
+    else:
+        aggregator.add_partials(list(SensorCollectedDataRollup.objects.filter(
+            _ranges_filter(buckets, 'bucket', width),
+            resolution=resolutions[resolutions.index(resolution) - 1]
+        ).order_by('sensor_id', 'bucket').values_list(*ROLLUP_FIELDS)))
+
+    with transaction.atomic():
+        SensorCollectedDataRollup.objects.filter(_buckets_filter(buckets), resolution=resolution).delete()
+        _bulk_create(_iter_rollups(resolution, aggregator))
+
+
+def update_rollups(readings, replaced_keys=()):
+    """
+    Updates rollups of every resolution by written SensorCollectedData readings.
+    replaced_keys are (sensor, date_time_collected) keys of the readings that were overwritten,
+    their buckets are recomputed instead of merged into
+    """
+    if not app_settings.get('ROLLUPS'):
+        return
+    rows = sorted(
+        (reading.sensor_id, _aware(reading.date_time_collected), reading.sensor_data_value)
+        for reading in readings
+    )
+    for resolution, width in TIERS.items():
+        stale = {
+            (sensor_serial_number, bucket_start(date_time_collected, width))
+            for sensor_serial_number, date_time_collected in replaced_keys
+        }
+        if stale:
+            rows = [row for row in rows if (row[0], bucket_start(row[1], width)) not in stale]
+        _merge_rollups(resolution, rows)
+        # Recomputed hour and day buckets are built from already updated narrower ones
+        _recompute_rollups(resolution, stale)
+
+
+def recompute_buckets(keys):
+    """
+    Recomputes rollups of every resolution of the buckets that contain
+    (sensor, date_time_collected) keys
+    """
+    if not app_settings.get('ROLLUPS'):
+        return
+    keys = {(sensor_serial_number, _aware(date_time_collected)) for sensor_serial_number, date_time_collected in keys}
+    for resolution, width in TIERS.items():
+        _recompute_rollups(resolution, {
+            (sensor_serial_number, bucket_start(date_time_collected, width))
+            for sensor_serial_number, date_time_collected in keys
+        })
+
+
+def rebuild_rollups(sensor_serial_numbers=None):
+    """
+    Removes and recomputes all rollups of given sensors, of all sensors by default.
+    Readings are read in AGGREGATE_CHUNK_SIZE chunks sensor by sensor.
+    Returns number of created rollups
+    """
+    if sensor_serial_numbers is None:
+        sensor_serial_numbers = list(SensorCollectedData.objects.order_by(
+            'sensor_id'
+        ).values_list('sensor_id', flat=True).distinct())
+        # Rollups of the sensors whose readings are all deleted
+        SensorCollectedDataRollup.objects.exclude(sensor_id__in=sensor_serial_numbers).delete()
+    chunk_size = app_settings.get('AGGREGATE_CHUNK_SIZE')
+    created = 0
+    for sensor_serial_number in list(sensor_serial_numbers):
+        previous = None
+        for resolution, width in TIERS.items():
+            aggregator = aggregation.BucketAggregator(width // aggregation.MICROSECOND)
+            if previous is None:
+                rows = SensorCollectedData.objects.filter(
+                    sensor_id=sensor_serial_number
+                ).order_by('date_time_collected').values_list(
+                    'sensor_id', 'date_time_collected', 'sensor_data_value'
+                ).iterator(chunk_size=chunk_size)
+                add = aggregator.add
+            else:
+                rows = SensorCollectedDataRollup.objects.filter(
+                    sensor_id=sensor_serial_number,
+                    resolution=previous
+                ).order_by('bucket').values_list(*ROLLUP_FIELDS).iterator(chunk_size=chunk_size)
+                add = aggregator.add_partials
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                add(chunk)
+
+            with transaction.atomic():
+                SensorCollectedDataRollup.objects.filter(
+                    sensor_id=sensor_serial_number,
+                    resolution=resolution
+                ).delete()
+                created += _bulk_create(_iter_rollups(resolution, aggregator))
+            previous = resolution
+    return created
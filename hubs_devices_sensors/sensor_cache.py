@@ -0,0 +1,136 @@
+"""
+sensor_cache.py
+Process-local cache of Sensor metadata by sensor serial number used by the ingestion path.
+Entries are invalidated by Sensor, Device and Hub signals (see signals.py) and expire
+after SENSOR_CACHE_TTL seconds, which bounds staleness for changes made by other processes
+or by QuerySet.update() that sends no signals.
+Classes:
+    SensorMetadata,
+    SensorMetadataCache
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+import hubs_devices_sensors.app_settings as app_settings
+from .models import Sensor
+
+
+class SensorMetadata(namedtuple('SensorMetadata', (
+        'pk',
+        'serial_number',
+        'data_type',
+        'device',
+        'hub',
+        'owner',
+        'fetch_interval',
+))):
+
+    """
+    Class SensorMetadata - immutable metadata of one Sensor
+    @param pk - Sensor primary key
+    @param serial_number - Sensor serial number
+    @param data_type - Sensor data type (one of sensor_consts sensor types)
+    @param device - serial number of the related Device
+    @param hub - serial number of the related Hub
+    @param owner - primary key of the Hub owner
+    @param fetch_interval - sensors_data_fetch_time of the related Device
+
+    @method to_sensor() - returns not fetched Sensor entity that could be assigned
+    to SensorCollectedData.sensor without a query
+    """
+
+    __slots__ = ()
+
+    FIELDS = (
+        'pk',
+        'sensor_serial_number',
+        'sensor_data_type',
+        'sensor_device_id',
+        'sensor_device__device_hub_id',
+        'sensor_device__device_hub__owner_id',
+        'sensor_device__sensors_data_fetch_time',
+    )
+
+    def to_sensor(self):
+        return Sensor(
+            pk=self.pk,
+            sensor_serial_number=self.serial_number,
+            sensor_data_type=self.data_type,
+            sensor_device_id=self.device
+        )
+
+
+class SensorMetadataCache:
+
+    """
+    Class SensorMetadataCache - bounded LRU cache of SensorMetadata by sensor serial number
+
+    @method get_many(serial_numbers) - returns dict of SensorMetadata by serial number.
+    Fetches all missing entries with one query
+    @method warm_hubs(hub_serial_numbers) - fetches entries of all sensors of the hubs with one query
+    @method invalidate_sensor(pk) - drops the entry of the Sensor with given primary key
+    @method clear() - drops all entries
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_many(self, serial_numbers):
+        found = {}
+        missing = []
+        now = time.monotonic()
+        with self._lock:
+            for serial_number in serial_numbers:
+                entry = self._entries.get(serial_number)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(serial_number)
+                    found[serial_number] = entry[0]
+                else:
+                    missing.append(serial_number)
+
+        if missing:
+            fetched = [
+                SensorMetadata(*row) for row in Sensor.objects.filter(
+                    sensor_serial_number__in=missing
+                ).values_list(*SensorMetadata.FIELDS)
+            ]
+            self._store(fetched, now)
+            found.update((metadata.serial_number, metadata) for metadata in fetched)
+        return found
+
+    def warm_hubs(self, hub_serial_numbers):
+        fetched = [
+            SensorMetadata(*row) for row in Sensor.objects.filter(
+                sensor_device__device_hub_id__in=list(hub_serial_numbers)
+            ).values_list(*SensorMetadata.FIELDS)
+        ]
+        self._store(fetched, time.monotonic())
+        return len(fetched)
+
+    def _store(self, fetched, now):
+        max_size = app_settings.get('SENSOR_CACHE_SIZE')
+        ttl = app_settings.get('SENSOR_CACHE_TTL')
+        expires = now + ttl if ttl is not None else float('inf')
+        with self._lock:
+            for metadata in fetched:
+                self._entries[metadata.serial_number] = (metadata, expires)
+                self._entries.move_to_end(metadata.serial_number)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_sensor(self, pk):
+        with self._lock:
+            for serial_number, (metadata, _) in list(self._entries.items()):
+                if metadata.pk == pk:
+                    del self._entries[serial_number]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+sensor_metadata_cache = SensorMetadataCache()
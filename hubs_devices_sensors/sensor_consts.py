@@ -17,3 +17,11 @@ PH_SENSOR_MIN_VALIE = 0
 CO2_SENSOR = 'CO2'
 TEMPERATURE_SENSOR = 'Temperature'
 PH_SENSOR = 'pH'
+
+
+# Registry of sensor types: sensor data type -> (title, min value, max value)
+SENSOR_VALUE_RANGES = {
+    PH_SENSOR: ('pH', PH_SENSOR_MIN_VALIE, PH_SENSOR_MAX_VALUE),
+    CO2_SENSOR: ('CO2', CO2_SENSOR_MIN_VALUE, CO2_SENSOR_MAX_VALUE),
+    TEMPERATURE_SENSOR: ('Temperature', TEMPERATURE_SENSOR_MIN_VALUE, TEMPERATURE_SENSOR_MAX_VALUE),
+}
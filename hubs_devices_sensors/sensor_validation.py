@@ -0,0 +1,89 @@
+"""
+sensor_validation.py
+Range validation of sensor values built from sensor_consts.SENSOR_VALUE_RANGES registry.
+Functions:
+    error_message,
+    validate_value,
+    validate_values
+"""
+import math
+import numpy as np
+import hubs_devices_sensors.sensor_consts as sensor_consts
+
+
+MAX_VALUE_ERROR = 'max_value'
+MIN_VALUE_ERROR = 'min_value'
+DATA_TYPE_ERROR = 'invalid_data_type'
+NOT_FINITE_ERROR = 'not_finite'
+
+# Position of the code in ERROR_CODES is the code number used by validate_values()
+ERROR_CODES = (None, MAX_VALUE_ERROR, MIN_VALUE_ERROR, DATA_TYPE_ERROR, NOT_FINITE_ERROR)
+
+DATA_TYPE_ERROR_MESSAGE = 'No sensor data type was given'
+NOT_FINITE_ERROR_MESSAGE = 'Value must be a finite number'
+
+
+def error_message(data_type, code):
+    """
+    Returns human readable message of the validation error code for the sensor data type
+    """
+    if code == DATA_TYPE_ERROR:
+        return DATA_TYPE_ERROR_MESSAGE
+    if code == NOT_FINITE_ERROR:
+        return NOT_FINITE_ERROR_MESSAGE
+
+    title, min_value, max_value = sensor_consts.SENSOR_VALUE_RANGES[data_type]
+    if code == MAX_VALUE_ERROR:
+        return '{} Value cannot be more than {}'.format(title, max_value)
+    return '{} Value cannot be less than {}'.format(title, min_value)
+
+
+def validate_value(data_type, value):
+    """
+    Validates single sensor value.
+    Returns error code or None if the value is valid
+    """
+    value_range = sensor_consts.SENSOR_VALUE_RANGES.get(data_type)
+    if value_range is None:
+        return DATA_TYPE_ERROR
+    if value is None:
+        return None
+    # NaN passes every range comparison
+    if not math.isfinite(value):
+        return NOT_FINITE_ERROR
+
+    _, min_value, max_value = value_range
+    if value > max_value:
+        return MAX_VALUE_ERROR
+    if value < min_value:
+        return MIN_VALUE_ERROR
+    return None
+
+
+def validate_values(data_types, values):
+    """
+    Validates the whole batch of sensor values at once.
+    @param data_types - sequence of sensor data types, one per value
+    @param values - sequence or array of sensor values
+    Returns tuple (error_indices, error_codes) of the invalid rows ordered by index
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if not values.size:
+        return np.empty(0, dtype=np.intp), []
+
+    # Rows are grouped by data type, then bounds of each group are broadcast back to rows
+    types, inverse = np.unique(np.asarray(data_types, dtype=object), return_inverse=True)
+    ranges = [sensor_consts.SENSOR_VALUE_RANGES.get(data_type) for data_type in types]
+    known = np.array([value_range is not None for value_range in ranges])
+    min_values = np.array([value_range[1] if value_range else 0 for value_range in ranges], dtype=np.float64)
+    max_values = np.array([value_range[2] if value_range else 0 for value_range in ranges], dtype=np.float64)
+
+    codes = np.zeros(values.size, dtype=np.int8)
+    codes[values < min_values[inverse]] = ERROR_CODES.index(MIN_VALUE_ERROR)
+    codes[values > max_values[inverse]] = ERROR_CODES.index(MAX_VALUE_ERROR)
+    # NaN passes every range comparison
+    codes[~np.isfinite(values)] = ERROR_CODES.index(NOT_FINITE_ERROR)
+    codes[~known[inverse]] = ERROR_CODES.index(DATA_TYPE_ERROR)
+
+    error_indices = np.flatnonzero(codes)
+    return error_indices, [ERROR_CODES[code] for code in codes[error_indices]]
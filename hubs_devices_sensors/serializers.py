@@ -1,20 +1,249 @@
 """
 serializers.py
 Classes:
+    SensorSerialNumberField,
+    HubDateTimeField,
+    EpochMillisDateTimeField,
+    SensorCollectedDataListSerializer,
     SensorCollectedDataModelSerializer,
+    SensorCollectedDataEpochSerializer,
+    SensorCollectedDataRowSerializer,
     SensorModelSerializer,
     DeviceModelSerializer,
     HubModelSerializer
 """
+from django.utils import timezone
+from rest_framework import ISO_8601
+from rest_framework.exceptions import ErrorDetail
+from rest_framework.settings import api_settings
 from rest_framework.serializers import (
+    DateTimeField,
+    ListSerializer,
     ModelSerializer,
     HyperlinkedModelSerializer,
     HyperlinkedIdentityField,
+    SlugRelatedField,
     ValidationError
 )
 from index_app.serializers import UserBaseSerializer
 from .models import Sensor, Device, Hub, SensorCollectedData
-import hubs_devices_sensors.sensor_consts as CONSTS
+import hubs_devices_sensors.app_settings as app_settings
+import hubs_devices_sensors.sensor_validation as sensor_validation
+import hubs_devices_sensors.ingestion as ingestion
+import hubs_devices_sensors.sinks as sinks
+from .sensor_cache import sensor_metadata_cache
+
+
+DEFAULT_SENSOR_DATA_VALUE = SensorCollectedData._meta.get_field('sensor_data_value').default
+
+UNIQUE_READING_MESSAGE = 'The fields sensor, date_time_collected must make a unique set.'
+
+
+def get_error_code(detail):
+    """
+    Returns compact code of the first error of the reading errors dict,
+    e.g. 'max_value' for non field errors or 'sensor:does_not_exist' for field errors
+    """
+    field_name, field_errors = next(iter(detail.items()))
+    code = field_errors[0].code
+    if field_name == api_settings.NON_FIELD_ERRORS_KEY:
+        return code
+    return field_name + ':' + code
+
+
+class SensorSerialNumberField(SlugRelatedField):
+
+    """
+    Class SensorSerialNumberField - related field that resolves Sensor by its serial number.
+    Takes Sensor entities already resolved for the whole batch by
+    SensorCollectedDataListSerializer, so there is no query per reading.
+    Falls back to a query per value when it is used outside of a batch
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('slug_field', 'sensor_serial_number')
+        kwargs.setdefault('queryset', Sensor.objects.all())
+        super(SensorSerialNumberField, self).__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        resolved_sensors = getattr(self.root, 'resolved_sensors', None)
+        if resolved_sensors is None:
+            return super(SensorSerialNumberField, self).to_internal_value(data)
+
+        if not isinstance(data, (str, int)):
+            self.fail('invalid')
+        try:
+            return resolved_sensors[str(data)]
+        except KeyError:
+            self.fail('does_not_exist', slug_name=self.slug_field, value=str(data))
+
+
+class HubDateTimeField(DateTimeField):
+
+    """
+    Class HubDateTimeField - datetime field that parses 'YYYY-MM-DDTHH:MM:SS[.ffffff]Z' strings
+    sent by hubs with ingestion.parse_hub_datetime().
+    Other values are parsed by DateTimeField as usual
+    """
+
+    def to_internal_value(self, value):
+        input_formats = getattr(self, 'input_formats', api_settings.DATETIME_INPUT_FORMATS)
+        if isinstance(value, str) and ISO_8601 in input_formats:
+            parsed = ingestion.parse_hub_datetime(value)
+            if parsed is not None:
+                field_timezone = getattr(self, 'timezone', None) or self.default_timezone()
+                if field_timezone is timezone.utc:
+                    # Parsed datetime is in UTC already
+                    return parsed
+                return self.enforce_timezone(parsed)
+        return super(HubDateTimeField, self).to_internal_value(value)
+
+
+class EpochMillisDateTimeField(DateTimeField):
+
+    """
+    Class EpochMillisDateTimeField - datetime field represented by integer epoch milliseconds
+    """
+
+    default_error_messages = {
+        'invalid': 'Datetime must be integer epoch milliseconds.',
+    }
+
+    def to_internal_value(self, value):
+        if not isinstance(value, int) or isinstance(value, bool) \
+                or not ingestion.MIN_EPOCH_MILLIS <= value <= ingestion.MAX_EPOCH_MILLIS:
+            self.fail('invalid')
+        return ingestion.epoch_millis_to_datetimes([value])[0]
+
+    def to_representation(self, value):
+        if value is None:
+            return None
+        return ingestion.datetime_to_epoch_millis(value)
+
+
+class SensorCollectedDataListSerializer(ListSerializer):
+
+    """
+    Class SensorCollectedDataListSerializer - serializer for batches (many=True)
+    of SensorCollectedData entities
+    @param resolved_sensors - dict of Sensor entities of the current batch by serial number.
+    Shared by validation and saving of every reading of the batch
+    @param ingest_result - ingestion.IngestResult of the saved batch
+    or sinks.QueuedResult of the batch accepted for a later write
+    @param rejected_rows - list of [index, error code] pairs of the readings rejected
+    in partial accept mode
+    Context:
+        'on_conflict' - one of ingestion.ON_CONFLICT_CHOICES, 'error' by default.
+        With 'skip' and 'overwrite' already stored readings are not validation errors
+        'partial_accept' - when True invalid readings are rejected one by one
+        instead of the whole batch
+
+    @method to_internal_value() - resolves all distinct sensors of the batch before every
+    reading is validated. Sensors are taken from the process-local sensor metadata cache,
+    the missing ones are fetched with one query.
+    Then values of all readings are range-validated at once by sensor_validation.validate_values()
+    and uniqueness of (sensor, date_time_collected) is checked with one query
+    @method create() - passes the whole validated batch to sinks.submit_readings()
+    that writes it with a single bulk insert or buffers it. Every reading is already validated by the list serializer,
+    so SensorCollectedData.save() with its full_clean() is not called per reading.
+    Falls back to per-row creation when BULK_INGESTION, WRITE_BEHIND and SPOOL options are disabled
+    """
+
+    resolved_sensors = None
+    ingest_result = None
+    rejected_rows = ()
+
+    def to_internal_value(self, data):
+        if not isinstance(data, list) or not data:
+            return super(SensorCollectedDataListSerializer, self).to_internal_value(data)
+
+        self.resolved_sensors = self.resolve_sensors(data)
+        validated_data = []
+        errors = []
+        for item in data:
+            try:
+                validated_data.append(self.child.run_validation(item))
+                errors.append({})
+            except ValidationError as exc:
+                validated_data.append(None)
+                errors.append(exc.detail)
+
+        self.validate_values(validated_data, errors)
+        if self.context.get('on_conflict', ingestion.ON_CONFLICT_ERROR) == ingestion.ON_CONFLICT_ERROR:
+            self.validate_unique(validated_data, errors)
+
+        if self.context.get('partial_accept'):
+            self.rejected_rows = [
+                [index, get_error_code(detail)] for index, detail in enumerate(errors) if detail
+            ]
+            return [attrs for attrs, detail in zip(validated_data, errors) if not detail]
+        if any(errors):
+            raise ValidationError(errors)
+        return validated_data
+
+    @staticmethod
+    def validate_values(validated_data, errors):
+        """
+        Range-validates values of all readings that passed field validation.
+        Adds an error of every invalid reading to errors list at its index
+        """
+        rows = [index for index, attrs in enumerate(validated_data) if attrs is not None]
+        data_types = [validated_data[index]['sensor'].sensor_data_type for index in rows]
+        error_indices, error_codes = sensor_validation.validate_values(
+            data_types,
+            [validated_data[index].get('sensor_data_value', DEFAULT_SENSOR_DATA_VALUE) for index in rows]
+        )
+        for position, error_code in zip(error_indices, error_codes):
+            message = sensor_validation.error_message(data_types[position], error_code)
+            errors[rows[position]] = {
+                api_settings.NON_FIELD_ERRORS_KEY: [ErrorDetail(message, code=error_code)]
+            }
+
+    @staticmethod
+    def resolve_sensors(data):
+        """
+        Returns dict of Sensor entities referenced by the batch items by serial number
+        """
+        serial_numbers = {
+            str(item['sensor']) for item in data
+            if isinstance(item, dict) and isinstance(item.get('sensor'), (str, int))
+        }
+        return {
+            serial_number: metadata.to_sensor()
+            for serial_number, metadata in sensor_metadata_cache.get_many(serial_numbers).items()
+        }
+
+    @staticmethod
+    def validate_unique(validated_data, errors):
+        """
+        Checks that every valid reading is unique in the batch and is not stored yet.
+        Adds an error of every duplicated reading to errors list at its index
+        """
+        keys = [
+            ingestion.reading_key(attrs['sensor'].sensor_serial_number, attrs['date_time_collected'])
+            if attrs is not None and not errors[index] else None
+            for index, attrs in enumerate(validated_data)
+        ]
+        duplicates = ingestion.find_existing_keys(key for key in keys if key is not None)
+        message = ErrorDetail(UNIQUE_READING_MESSAGE, code='unique')
+        for index, key in enumerate(keys):
+            if key is None:
+                continue
+            if key in duplicates:
+                errors[index] = {api_settings.NON_FIELD_ERRORS_KEY: [message]}
+            duplicates.add(key)
+
+    def create(self, validated_data):
+        on_conflict = self.context.get('on_conflict', ingestion.ON_CONFLICT_ERROR)
+        per_row = not app_settings.get('BULK_INGESTION') and not sinks.is_queued()
+        if on_conflict == ingestion.ON_CONFLICT_ERROR and per_row:
+            instances = super(SensorCollectedDataListSerializer, self).create(validated_data)
+            self.ingest_result = ingestion.IngestResult(inserted=len(instances), duplicates=0)
+            return instances
+
+        readings = [SensorCollectedData(**attrs) for attrs in validated_data]
+        self.ingest_result = sinks.submit_readings(readings, on_conflict)
+        return readings
 
 
 class SensorCollectedDataModelSerializer(ModelSerializer):
@@ -28,34 +257,32 @@ class SensorCollectedDataModelSerializer(ModelSerializer):
         'sensor_data_value',
     """
 
+    sensor = SensorSerialNumberField(label='Sensor')
+    date_time_collected = HubDateTimeField(label='Date & Time Collected')
+
+    def get_validators(self):
+        if isinstance(self.parent, SensorCollectedDataListSerializer):
+            # Uniqueness of a batch is checked at once by the list serializer
+            return []
+        return super(SensorCollectedDataModelSerializer, self).get_validators()
+
     def validate(self, data):
-        if data['sensor'].sensor_data_type == CONSTS.PH_SENSOR:
-            if data['sensor_data_value']:
-                if data['sensor_data_value'] > CONSTS.PH_SENSOR_MAX_VALUE :
-                    raise ValidationError('pH Value cannot be more than 14')
-                elif data['sensor_data_value'] < CONSTS.PH_SENSOR_MIN_VALIE:
-                    raise ValidationError('pH Value cannot be less than 0')
-
-        elif data['sensor'].sensor_data_type == CONSTS.CO2_SENSOR:
-            if data['sensor_data_value']:
-                if data['sensor_data_value'] > CONSTS.CO2_SENSOR_MAX_VALUE:
-                    raise ValidationError('CO2 Value cannot be more than 100')
-                elif data['sensor_data_value'] < CONSTS.CO2_SENSOR_MIN_VALUE:
-                    raise ValidationError('CO2 Value cannot be less than 0')
-
-        elif data['sensor'].sensor_data_type == CONSTS.TEMPERATURE_SENSOR:
-            if data['sensor_data_value']:
-                if data['sensor_data_value'] > CONSTS.TEMPERATURE_SENSOR_MAX_VALUE:
-                    raise ValidationError('Temperature Value cannot be more than 127')
-                elif data['sensor_data_value'] < CONSTS.TEMPERATURE_SENSOR_MIN_VALUE:
-                    raise ValidationError('Temperature Value cannot be less than -40')
+        if isinstance(self.parent, SensorCollectedDataListSerializer):
+            # Values of a batch are validated at once by the list serializer
+            return data
 
-        else:
-            raise ValidationError('No sensor data type was given')
+        data_type = data['sensor'].sensor_data_type
+        error_code = sensor_validation.validate_value(data_type, data.get('sensor_data_value'))
+        if error_code is not None:
+            raise ValidationError(
+                sensor_validation.error_message(data_type, error_code),
+                code=error_code
+            )
         return data
 
     class Meta:
         model = SensorCollectedData
+        list_serializer_class = SensorCollectedDataListSerializer
         fields = (
             'id',
             'sensor',
@@ -64,6 +291,80 @@ class SensorCollectedDataModelSerializer(ModelSerializer):
         )
 
 
+class SensorCollectedDataEpochSerializer(SensorCollectedDataModelSerializer):
+
+    """
+    Class SensorCollectedDataEpochSerializer - SensorCollectedDataModelSerializer
+    with date_time_collected as integer epoch milliseconds
+    """
+
+    date_time_collected = EpochMillisDateTimeField(label='Date & Time Collected')
+
+
+class SensorCollectedDataRowSerializer:
+
+    """
+    Class SensorCollectedDataRowSerializer - read-only serializer of SensorCollectedData
+    values_list rows for list views. Gives exactly the representation of
+    SensorCollectedDataModelSerializer, or of SensorCollectedDataEpochSerializer
+    with epoch timestamps, without serializer fields, model objects
+    and the query per row of the sensor related field
+    @param timestamps - ingestion.TIMESTAMPS_ISO or ingestion.TIMESTAMPS_EPOCH
+
+    @method is_supported() - returns False when DATETIME_FORMAT is not ISO 8601,
+    SensorCollectedDataModelSerializer has to be used then
+    @method get_rows(queryset) - returns values_list queryset of the rows
+    @method iter_representation(rows) - yields representation of every row
+    @method to_representation(rows) - returns list of representations of the rows
+    """
+
+    FIELDS = ('id', 'sensor_id', 'date_time_collected', 'sensor_data_value')
+
+    def __init__(self, timestamps=ingestion.TIMESTAMPS_ISO):
+        self.timestamps = timestamps
+
+    @staticmethod
+    def is_supported():
+        output_format = api_settings.DATETIME_FORMAT
+        return output_format is not None and output_format.lower() == ISO_8601
+
+    def get_rows(self, queryset):
+        return queryset.values_list(*self.FIELDS)
+
+    @staticmethod
+    def get_iso_formatter():
+        """
+        Returns function that formats datetime like DateTimeField.to_representation()
+        """
+        field = DateTimeField()
+        field_timezone = field.default_timezone()
+
+        def to_iso(value):
+            if value.tzinfo is not field_timezone:
+                value = field.enforce_timezone(value)
+            value = value.isoformat()
+            if value.endswith('+00:00'):
+                value = value[:-6] + 'Z'
+            return value
+        return to_iso
+
+    def iter_representation(self, rows):
+        if self.timestamps == ingestion.TIMESTAMPS_EPOCH:
+            format_datetime = ingestion.datetime_to_epoch_millis
+        else:
+            format_datetime = self.get_iso_formatter()
+        for pk, sensor, date_time_collected, sensor_data_value in rows:
+            yield {
+                'id': pk,
+                'sensor': sensor,
+                'date_time_collected': format_datetime(date_time_collected),
+                'sensor_data_value': float(sensor_data_value),
+            }
+
+    def to_representation(self, rows):
+        return list(self.iter_representation(rows))
+
+
 class SensorModelSerializer(HyperlinkedModelSerializer):
 
     """
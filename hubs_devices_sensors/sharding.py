@@ -0,0 +1,77 @@
+"""
+sharding.py
+Partitioning of the ingestion work by hub.
+Every hub serial number is mapped to one ingest worker by consistent hashing,
+so batches of a hub are ingested by the same worker one after another
+and adding or removing a worker moves only about 1 / workers of the hubs.
+Classes:
+    ConsistentHashRing
+Functions:
+    key_hash,
+    get_routing_key
+"""
+import hashlib
+from bisect import bisect_left
+
+
+# Request header of the collect-data batch with the serial number of the sending hub
+HUB_SERIAL_NUMBER_HEADER = 'HTTP_X_HUB_SERIAL_NUMBER'
+
+# Key hashes are 63-bit, so they fit into signed 64-bit integer columns
+KEY_HASH_SPACE = 1 << 63
+
+
+def key_hash(key):
+    """
+    Returns stable 63-bit hash of the string key, same in every process
+    """
+    digest = hashlib.md5(key.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') >> 1
+
+
+def get_routing_key(request):
+    """
+    Returns hub serial number the collect-data request is routed by, None if not given
+    """
+    return request.META.get(HUB_SERIAL_NUMBER_HEADER, '').strip() or None
+
+
+class ConsistentHashRing:
+
+    """
+    Class ConsistentHashRing - hash ring of nodes with replicas virtual nodes per node.
+    Key belongs to the node of the first virtual node clockwise from the key hash
+
+    @method node_for(key) - returns node the key belongs to
+    @method ranges(node) - returns sorted list of [start, end) key hash ranges of the node
+    """
+
+    def __init__(self, nodes, replicas=64):
+        points = sorted(
+            (key_hash('{}#{}'.format(node, replica)), node)
+            for node in nodes for replica in range(replicas)
+        )
+        self._hashes = [point_hash for point_hash, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key):
+        index = bisect_left(self._hashes, key_hash(key))
+        return self._nodes[index % len(self._nodes)]
+
+    def ranges(self, node):
+        ranges = []
+        start = 0
+        for point_hash, point_node in zip(self._hashes, self._nodes):
+            if point_node == node:
+                if ranges and ranges[-1][1] == start:
+                    ranges[-1][1] = point_hash + 1
+                else:
+                    ranges.append([start, point_hash + 1])
+            start = point_hash + 1
+        if self._nodes and self._nodes[0] == node:
+            # The first virtual node also owns hashes past the last one
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = KEY_HASH_SPACE
+            else:
+                ranges.append([start, KEY_HASH_SPACE])
+        return [tuple(hash_range) for hash_range in ranges]
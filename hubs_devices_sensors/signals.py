@@ -0,0 +1,54 @@
+"""
+signals.py
+Invalidates the sensor metadata cache when Sensor, Device or Hub entities change
+and updates rollups of SensorCollectedData saved or deleted one by one
+"""
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+import hubs_devices_sensors.app_settings as app_settings
+import hubs_devices_sensors.rollups as rollups
+from .models import Sensor, Device, Hub, SensorCollectedData
+from .sensor_cache import sensor_metadata_cache
+
+
+@receiver(post_save, sender=Sensor)
+@receiver(post_delete, sender=Sensor)
+def invalidate_sensor_metadata(sender, instance, **kwargs):
+    # Sensor serial number could be changed, so the entry is looked up by primary key
+    sensor_metadata_cache.invalidate_sensor(instance.pk)
+
+
+@receiver(post_save, sender=Device)
+@receiver(post_delete, sender=Device)
+@receiver(post_save, sender=Hub)
+@receiver(post_delete, sender=Hub)
+def clear_sensor_metadata(sender, instance, **kwargs):
+    # Devices and Hubs rarely change, so the whole cache is dropped
+    sensor_metadata_cache.clear()
+
+
+@receiver(pre_save, sender=SensorCollectedData)
+def remember_reading_key(sender, instance, **kwargs):
+    # Updated reading could be moved to other sensor or time, its old buckets are recomputed too
+    instance._saved_key = None
+    if instance.pk is not None and not instance._state.adding and app_settings.get('ROLLUPS'):
+        instance._saved_key = SensorCollectedData.objects.filter(pk=instance.pk).values_list(
+            'sensor_id', 'date_time_collected'
+        ).first()
+
+
+@receiver(post_save, sender=SensorCollectedData)
+def update_reading_rollups(sender, instance, created, **kwargs):
+    # Readings written in bulk by ingestion.write_readings() update rollups there
+    if created:
+        rollups.update_rollups([instance])
+        return
+    keys = [(instance.sensor_id, instance.date_time_collected)]
+    if getattr(instance, '_saved_key', None) is not None:
+        keys.append(instance._saved_key)
+    rollups.recompute_buckets(keys)
+
+
+@receiver(post_delete, sender=SensorCollectedData)
+def remove_reading_rollups(sender, instance, **kwargs):
+    rollups.recompute_buckets([(instance.sensor_id, instance.date_time_collected)])
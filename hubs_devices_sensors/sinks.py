@@ -0,0 +1,230 @@
+"""
+sinks.py
+Destinations of validated collect-data readings.
+Readings are either written right away by ingestion.write_readings(),
+with WRITE_BEHIND option appended to the in-process write-behind buffer
+that writes them later in large bulk inserts or, with SPOOL option,
+appended to the durable local spool (see spool.py).
+Classes:
+    QueuedResult,
+    BufferFull,
+    WriteBehindBuffer
+Functions:
+    is_queued,
+    empty_result,
+    submit_readings
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from django.db import DataError, IntegrityError, connection
+from rest_framework import status
+from rest_framework.exceptions import APIException
+import hubs_devices_sensors.app_settings as app_settings
+import hubs_devices_sensors.ingestion as ingestion
+from .spool import spool
+
+
+logger = logging.getLogger(__name__)
+
+# Result of readings accepted for a later write, counterpart of ingestion.IngestResult
+QueuedResult = namedtuple('QueuedResult', ('accepted', ))
+
+
+class BufferFull(APIException):
+
+    """
+    Class BufferFull - raised when readings could not be accepted
+    because too many readings are waiting for a write
+    """
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Too many readings are waiting to be written, retry later.'
+    default_code = 'buffer_full'
+
+
+class WriteBehindBuffer:
+
+    """
+    Class WriteBehindBuffer - in-process buffer of validated readings.
+    A background thread flushes the buffer when WRITE_BEHIND_FLUSH_SIZE readings are pending
+    or the oldest pending reading waits WRITE_BEHIND_FLUSH_INTERVAL milliseconds.
+    Pending readings are flushed on interpreter exit, so a worker shut down gracefully
+    does not lose them.
+    Readings submitted with on_conflict='error' were checked against stored ones on submit,
+    they are flushed with on_conflict='skip', so a reading stored meanwhile
+    could not fail the whole flush.
+    Readings of a write that fails with a data error are split in halves and written again,
+    so one bad reading does not hold back the others. A reading that still fails alone
+    is kept for WRITE_BEHIND_MAX_ATTEMPTS flushes, then it is dropped and logged.
+    Readings of a write that fails otherwise, e.g. while the database is unavailable,
+    are all kept for the next flush.
+
+    @method append(readings, on_conflict) - adds readings to the buffer.
+    Raises BufferFull when WRITE_BEHIND_MAX_PENDING readings would be exceeded
+    @method flush() - writes all pending readings. Returns False if writing failed,
+    in that case the readings are kept for the next flush
+    """
+
+    def __init__(self):
+        self._pending = OrderedDict()
+        self._size = 0
+        self._oldest = None
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        # Failed flushes of the readings that failed alone by (on_conflict, sensor, date_time_collected)
+        self._attempts = {}
+
+    def __len__(self):
+        return self._size
+
+    def append(self, readings, on_conflict):
+        with self._condition:
+            if self._size + len(readings) > app_settings.get('WRITE_BEHIND_MAX_PENDING'):
+                raise BufferFull()
+            if on_conflict == ingestion.ON_CONFLICT_ERROR:
+                on_conflict = ingestion.ON_CONFLICT_SKIP
+            self._pending.setdefault(on_conflict, []).extend(readings)
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self._size += len(readings)
+            self._start()
+            # Flushing thread recomputes when the next flush is due
+            self._condition.notify()
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def _wait_timeout(self):
+        """
+        Returns seconds to wait before the next flush is due, 0 if it is due already
+        """
+        if not self._size:
+            return None
+        if self._size >= app_settings.get('WRITE_BEHIND_FLUSH_SIZE'):
+            return 0
+        flush_interval = app_settings.get('WRITE_BEHIND_FLUSH_INTERVAL') / 1000
+        return max(self._oldest + flush_interval - time.monotonic(), 0)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                timeout = self._wait_timeout()
+                while timeout != 0:
+                    self._condition.wait(timeout)
+                    timeout = self._wait_timeout()
+            if not self.flush():
+                time.sleep(app_settings.get('WRITE_BEHIND_FLUSH_INTERVAL') / 1000)
+            connection.close()
+
+    def _write(self, readings, on_conflict):
+        """
+        Writes readings, halves of a write that fails with a data error are written one by one.
+        Returns list of the readings that failed alone
+        """
+        try:
+            ingestion.write_readings(readings, on_conflict)
+            return []
+        except (DataError, IntegrityError):
+            if len(readings) == 1:
+                return readings
+        middle = len(readings) // 2
+        return self._write(readings[:middle], on_conflict) + self._write(readings[middle:], on_conflict)
+
+    def _drop_rejected(self, on_conflict, readings, attempts):
+        """
+        Returns readings that failed alone fewer than WRITE_BEHIND_MAX_ATTEMPTS times,
+        the other ones are logged and dropped. Counts failures of the kept ones in attempts
+        """
+        max_attempts = app_settings.get('WRITE_BEHIND_MAX_ATTEMPTS')
+        kept = []
+        for reading in readings:
+            key = (on_conflict, reading.sensor_id, reading.date_time_collected)
+            attempt = self._attempts.get(key, 0) + 1
+            if attempt < max_attempts:
+                attempts[key] = attempt
+                kept.append(reading)
+            else:
+                logger.error(
+                    'Write-behind dropped reading of sensor %s collected at %s with value %r after %s attempts',
+                    reading.sensor_id,
+                    reading.date_time_collected,
+                    reading.sensor_data_value,
+                    attempt
+                )
+        return kept
+
+    def flush(self):
+        with self._flush_lock:
+            with self._condition:
+                pending = self._pending
+                self._pending = OrderedDict()
+                self._size = 0
+                self._oldest = None
+
+            failed = OrderedDict()
+            attempts = {}
+            for on_conflict, readings in pending.items():
+                try:
+                    rejected = self._write(readings, on_conflict)
+                except Exception:
+                    logger.exception('Write-behind flush of %s readings failed', len(readings))
+                    failed[on_conflict] = readings
+                    attempts.update(
+                        (key, attempt) for key, attempt in self._attempts.items() if key[0] == on_conflict
+                    )
+                    continue
+                if rejected:
+                    logger.warning('Write-behind flush failed to write %s readings', len(rejected))
+                    rejected = self._drop_rejected(on_conflict, rejected, attempts)
+                if rejected:
+                    failed[on_conflict] = rejected
+            self._attempts = attempts
+
+            if failed:
+                with self._condition:
+                    for on_conflict, readings in self._pending.items():
+                        failed.setdefault(on_conflict, []).extend(readings)
+                    self._pending = failed
+                    self._size = sum(len(readings) for readings in failed.values())
+                    self._oldest = time.monotonic()
+            return not failed
+
+
+write_behind_buffer = WriteBehindBuffer()
+atexit.register(write_behind_buffer.flush)
+
+
+def is_queued():
+    """
+    Returns True when readings are written later by the current sink
+    """
+    return bool(app_settings.get('SPOOL') or app_settings.get('WRITE_BEHIND'))
+
+
+def empty_result():
+    """
+    Returns result of no submitted readings of the current sink
+    """
+    if is_queued():
+        return QueuedResult(accepted=0)
+    return ingestion.IngestResult(inserted=0, duplicates=0)
+
+
+def submit_readings(readings, on_conflict=ingestion.ON_CONFLICT_ERROR):
+    """
+    Passes validated not saved SensorCollectedData readings to the configured sink.
+    Returns ingestion.IngestResult of written readings or QueuedResult of spooled or buffered ones
+    """
+    if app_settings.get('SPOOL'):
+        spool.append(readings, on_conflict)
+        return QueuedResult(accepted=len(readings))
+    if app_settings.get('WRITE_BEHIND'):
+        write_behind_buffer.append(readings, on_conflict)
+        return QueuedResult(accepted=len(readings))
+    return ingestion.write_readings(readings, on_conflict)
@@ -0,0 +1,283 @@
+"""
+spool.py
+Durable append-only spool of validated collect-data readings.
+With SPOOL option the readings are appended to the local spool and acknowledged
+once the spool is fsynced, then the drainer thread bulk-loads them into SensorCollectedData.
+Segments left by stopped workers are loaded by the drainer of any worker
+or by manage.py replay_spool.
+
+Spool directory holds segment files:
+    *.tmp - segment being created,
+    *.open - segment appended by a running process, locked by it,
+    *.seg - sealed segment waiting to be loaded,
+    *.failed - segment whose readings could not be written, it is set aside so the next
+    segments are loaded. Renamed back to *.seg it is loaded again.
+Segment is a sequence of frames: header (magic b'HDSF', payload size (uint32),
+payload crc32 (uint32), on_conflict mode index (uint8)) followed by payload:
+sensors count (uint16), records count (uint32), sensor serial numbers
+(UTF-8 bytes, each preceded by its length (uint16)) and records of
+sensor index (uint16), epoch microseconds (int64), sensor value (float64).
+Frames are loaded with on_conflict='skip' instead of 'error', so loading a segment
+once more after a crash is harmless.
+Classes:
+    Spool
+Functions:
+    encode_frame,
+    decode_frames,
+    fsync_directory
+"""
+import atexit
+import fcntl
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+import numpy as np
+from django.conf import settings
+from django.db import DataError, IntegrityError, connection
+from django.utils import timezone
+import hubs_devices_sensors.app_settings as app_settings
+import hubs_devices_sensors.ingestion as ingestion
+from .models import SensorCollectedData
+
+
+logger = logging.getLogger(__name__)
+
+FRAME_MAGIC = b'HDSF'
+FRAME_HEADER = struct.Struct('<4sIIB')
+PAYLOAD_HEADER = struct.Struct('<HI')
+SERIAL_NUMBER_HEADER = struct.Struct('<H')
+RECORD = np.dtype([('sensor', '<u2'), ('time', '<i8'), ('value', '<f8')])
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+CREATING_SUFFIX = '.tmp'
+OPEN_SUFFIX = '.open'
+SEALED_SUFFIX = '.seg'
+FAILED_SUFFIX = '.failed'
+
+
+def encode_frame(readings, on_conflict):
+    """
+    Returns spool frame of not saved SensorCollectedData readings
+    """
+    sensor_indices = {}
+    records = np.empty(len(readings), dtype=RECORD)
+    for position, reading in enumerate(readings):
+        records[position] = (
+            sensor_indices.setdefault(reading.sensor_id, len(sensor_indices)),
+            (reading.date_time_collected - EPOCH) // MICROSECOND,
+            reading.sensor_data_value
+        )
+
+    encoded_serial_numbers = [serial_number.encode('utf-8') for serial_number in sensor_indices]
+    payload = b''.join([
+        PAYLOAD_HEADER.pack(len(sensor_indices), len(records)),
+        b''.join(
+            SERIAL_NUMBER_HEADER.pack(len(serial_number)) + serial_number
+            for serial_number in encoded_serial_numbers
+        ),
+        records.tobytes()
+    ])
+    return FRAME_HEADER.pack(
+        FRAME_MAGIC,
+        len(payload),
+        zlib.crc32(payload),
+        ingestion.ON_CONFLICT_CHOICES.index(on_conflict)
+    ) + payload
+
+
+def decode_frames(segment):
+    """
+    Yields tuples (readings, on_conflict) of the frames of segment file object.
+    Stops at a truncated or damaged frame, the tail of a segment written by a crashed process
+    """
+    while True:
+        header = segment.read(FRAME_HEADER.size)
+        if not header:
+            return
+        if len(header) < FRAME_HEADER.size:
+            logger.warning('Truncated frame header in spool segment %s', segment.name)
+            return
+        magic, size, crc, on_conflict_index = FRAME_HEADER.unpack(header)
+        payload = segment.read(size)
+        if magic != FRAME_MAGIC or len(payload) < size or zlib.crc32(payload) != crc:
+            logger.warning('Damaged frame in spool segment %s', segment.name)
+            return
+
+        sensors_count, records_count = PAYLOAD_HEADER.unpack_from(payload)
+        offset = PAYLOAD_HEADER.size
+        serial_numbers = []
+        for _ in range(sensors_count):
+            length, = SERIAL_NUMBER_HEADER.unpack_from(payload, offset)
+            offset += SERIAL_NUMBER_HEADER.size
+            serial_numbers.append(payload[offset:offset + length].decode('utf-8'))
+            offset += length
+        records = np.frombuffer(payload, dtype=RECORD, count=records_count, offset=offset)
+        readings = [
+            SensorCollectedData(
+                sensor_id=serial_numbers[sensor_index],
+                date_time_collected=date_time_collected.replace(tzinfo=timezone.utc),
+                sensor_data_value=sensor_data_value
+            )
+            for sensor_index, date_time_collected, sensor_data_value in zip(
+                records['sensor'].tolist(),
+                records['time'].astype('datetime64[us]').tolist(),
+                records['value'].tolist()
+            )
+        ]
+        yield readings, ingestion.ON_CONFLICT_CHOICES[on_conflict_index]
+
+
+def fsync_directory(directory):
+    """
+    Fsyncs the directory, so the segment files created and renamed in it survive a crash
+    """
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class Spool:
+
+    """
+    Class Spool - segmented append-only spool of one process
+
+    @method append(readings, on_conflict) - appends readings to the active segment
+    and returns once they are fsynced. Concurrent appends share one fsync (group commit)
+    @method seal() - closes the active segment, so it could be loaded
+    @method drain(directory) - loads all sealed and abandoned segments of the directory
+    into SensorCollectedData and removes them. Segment whose readings fail with a data error
+    is logged and renamed to *.failed. Returns tuple (segments, IngestResult)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._segment = None
+        self._sequence = 0
+        self._written = 0
+        self._synced = 0
+        self._drainer = None
+
+    @staticmethod
+    def get_directory():
+        return app_settings.get('SPOOL_DIR') or os.path.join(settings.BASE_DIR, 'spool')
+
+    def append(self, readings, on_conflict):
+        frame = encode_frame(readings, on_conflict)
+        with self._lock:
+            if self._segment is None or self._segment.tell() >= app_settings.get('SPOOL_SEGMENT_SIZE'):
+                self._seal()
+                self._open()
+            self._segment.write(frame)
+            self._segment.flush()
+            self._written += 1
+            ticket = self._written
+        self._sync(ticket)
+        self._start_drainer()
+
+    def _open(self):
+        directory = self.get_directory()
+        os.makedirs(directory, exist_ok=True)
+        self._sequence += 1
+        name = '{:013d}-{}-{:06d}'.format(int(time.time() * 1000), os.getpid(), self._sequence)
+        path = os.path.join(directory, name)
+        # The segment is locked before it gets its .open name,
+        # so drainers never take it for a segment abandoned by a stopped process
+        segment = open(path + CREATING_SUFFIX, 'ab')
+        fcntl.flock(segment, fcntl.LOCK_EX)
+        os.rename(path + CREATING_SUFFIX, path + OPEN_SUFFIX)
+        fsync_directory(directory)
+        self._segment = segment
+
+    def _sync(self, ticket):
+        with self._sync_lock:
+            if self._synced >= ticket:
+                # Frame was fsynced together with frames of other appends
+                return
+            with self._lock:
+                target = self._written
+                if self._segment is not None:
+                    os.fsync(self._segment.fileno())
+            self._synced = target
+
+    def _seal(self):
+        if self._segment is None:
+            return
+        self._segment.flush()
+        os.fsync(self._segment.fileno())
+        path = self._segment.name[:-len(CREATING_SUFFIX)]
+        os.rename(path + OPEN_SUFFIX, path + SEALED_SUFFIX)
+        fsync_directory(os.path.dirname(path))
+        self._segment.close()
+        self._segment = None
+
+    def seal(self):
+        with self._lock:
+            if self._segment is not None and self._segment.tell():
+                self._seal()
+
+    def _start_drainer(self):
+        if self._drainer is None and app_settings.get('SPOOL_DRAIN'):
+            self._drainer = threading.Thread(target=self._run_drainer, name='spool-drainer', daemon=True)
+            self._drainer.start()
+
+    def _run_drainer(self):
+        while True:
+            time.sleep(app_settings.get('SPOOL_DRAIN_INTERVAL') / 1000)
+            try:
+                self.seal()
+                self.drain()
+            except Exception:
+                logger.exception('Spool drain failed')
+            connection.close()
+
+    def drain(self, directory=None):
+        directory = directory or self.get_directory()
+        segments = 0
+        inserted = 0
+        duplicates = 0
+        names = os.listdir(directory) if os.path.isdir(directory) else []
+        for name in sorted(names):
+            if not name.endswith((SEALED_SUFFIX, OPEN_SUFFIX)):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                segment = open(path, 'rb')
+            except FileNotFoundError:
+                # Loaded by another drainer meanwhile
+                continue
+            with segment:
+                try:
+                    fcntl.flock(segment, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    # Active segment of a running process or loaded by another drainer
+                    continue
+                if not os.path.exists(path):
+                    continue
+                try:
+                    for readings, on_conflict in decode_frames(segment):
+                        if on_conflict == ingestion.ON_CONFLICT_ERROR:
+                            on_conflict = ingestion.ON_CONFLICT_SKIP
+                        result = ingestion.write_readings(readings, on_conflict)
+                        inserted += result.inserted
+                        duplicates += result.duplicates
+                except (DataError, IntegrityError, ValueError, struct.error):
+                    # Loading it again would fail the same way and block the next segments
+                    logger.exception('Spool segment %s could not be loaded, it is set aside', name)
+                    os.rename(path, os.path.splitext(path)[0] + FAILED_SUFFIX)
+                    fsync_directory(directory)
+                    continue
+                os.remove(path)
+            segments += 1
+        return segments, ingestion.IngestResult(inserted=inserted, duplicates=duplicates)
+
+
+spool = Spool()
+atexit.register(spool.seal)
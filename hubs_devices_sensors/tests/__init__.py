@@ -1,3 +1,5 @@
 from hubs_devices_sensors.tests.hub_test_cases import *
 from hubs_devices_sensors.tests.device_test_cases import *
-from hubs_devices_sensors.tests.sensor_test_cases import *
\ No newline at end of file
+from hubs_devices_sensors.tests.sensor_test_cases import *
+from hubs_devices_sensors.tests.collected_data_test_cases import *
+from hubs_devices_sensors.tests.collected_data_read_test_cases import *
\ No newline at end of file
@@ -0,0 +1,462 @@
+"""
+Sensor Collected Data Read Test Cases
+Available test cases:
+    SensorCollectedDataFastReadAPITestCase,
+    SensorCollectedDataExportAPITestCase,
+    SensorCollectedDataAggregateAPITestCase,
+    SensorCollectedDataDownsampleAPITestCase
+"""
+import csv
+import datetime
+import json
+from collections import OrderedDict
+from io import StringIO
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth.models import User
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from hubs_devices_sensors.models import Device, Hub, Sensor, SensorCollectedData
+from rest_framework.renderers import JSONRenderer
+from hubs_devices_sensors.serializers import (
+    SensorCollectedDataEpochSerializer,
+    SensorCollectedDataModelSerializer
+)
+import hubs_devices_sensors.ingestion as ingestion
+
+
+class SensorCollectedDataFastReadAPITestCase(APITestCase):
+
+    """
+    Test case checks that collected data lists rendered from values_list rows
+    are the same as of the model serializers and are paginated by keyset
+    """
+
+    def setUp(self):
+        """
+        Method make core actions to proceed the test case
+        """
+        self.superuser = User.objects.create_superuser(
+            'admin',
+            'admin@example.com',
+            'AdminStrongPassword'
+        )
+
+        self.hub = Hub.objects.create(
+            hub_title='My Hub',
+            hub_serial_number='HubSerialNumber',
+            owner=self.superuser
+        )
+
+        self.device = Device.objects.create(
+            device_title='Sensor parent Device',
+            device_serial_number='XJHFJQWH6EASKAS2',
+            device_hub=self.hub
+        )
+
+        self.sensor = Sensor.objects.create(
+            sensor_title='Sensor 1',
+            sensor_device=self.device,
+            sensor_serial_number='sensor1serial',
+            sensor_data_type='pH'
+        )
+
+    def test_sensor_collected_data_fast_read(self):
+        """
+        Test that ensures that list views render exactly the bytes of the model serializers
+        """
+        self.client.login(username='admin', password='AdminStrongPassword')
+        start = datetime.datetime(2019, 2, 7, 8, 10, 22, tzinfo=timezone.utc)
+        SensorCollectedData.objects.bulk_create([
+            SensorCollectedData(
+                sensor=self.sensor,
+                date_time_collected=start + datetime.timedelta(microseconds=250000 * index),
+                sensor_data_value=index
+            )
+            for index in range(6)
+        ])
+        queryset = SensorCollectedData.objects.filter(sensor=self.sensor).order_by('date_time_collected', 'id')
+        for query, serializer_class in (
+                ('', SensorCollectedDataModelSerializer),
+                ('?timestamps=epoch', SensorCollectedDataEpochSerializer),
+        ):
+            response = self.client.get(
+                '/api/tools/sensors/{}/collected-data/{}'.format(self.sensor.pk, query)
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(
+                response.content,
+                JSONRenderer().render(OrderedDict([
+                    ('next', None),
+                    ('previous', None),
+                    ('results', serializer_class(queryset, many=True).data),
+                ]))
+            )
+
+    def test_sensor_collected_data_pagination(self):
+        """
+        Test that ensures that collected data lists are walked by next and previous cursors
+        """
+        self.client.login(username='admin', password='AdminStrongPassword')
+        start = datetime.datetime(2019, 2, 7, 8, 10, 22, tzinfo=timezone.utc)
+        SensorCollectedData.objects.bulk_create([
+            SensorCollectedData(
+                sensor=self.sensor,
+                date_time_collected=start + datetime.timedelta(microseconds=250001 * index),
+                sensor_data_value=index
+            )
+            for index in range(7)
+        ])
+        url = '/api/tools/sensors/{}/collected-data/?page_size=3'.format(self.sensor.pk)
+
+        values = []
+        pages = []
+        while url is not None:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            values.extend(item['sensor_data_value'] for item in response.data['results'])
+            pages.append(response.data)
+            url = response.data['next']
+        self.assertEqual(values, list(range(7)))
+        self.assertEqual([len(page['results']) for page in pages], [3, 3, 1])
+        self.assertIsNone(pages[0]['previous'])
+
+        response = self.client.get(pages[2]['previous'])
+        self.assertEqual(response.data['results'], pages[1]['results'])
+        response = self.client.get(response.data['previous'])
+        self.assertEqual(response.data['results'], pages[0]['results'])
+        self.assertIsNone(response.data['previous'])
+
+        with self.settings(HUBS_DEVICES_SENSORS={'COLLECTED_DATA_MAX_PAGE_SIZE': 2}):
+            response = self.client.get(
+                '/api/tools/sensors/{}/collected-data/?page_size=5'.format(self.sensor.pk)
+            )
+        self.assertEqual(len(response.data['results']), 2)
+
+        response = self.client.get(
+            '/api/tools/sensors/{}/collected-data/?cursor=invalid'.format(self.sensor.pk)
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SensorCollectedDataExportAPITestCase(APITestCase):
+
+    """
+    Test case checks that collected data lists are exported as CSV and NDJSON
+    """
+
+    def setUp(self):
+        """
+        Method make core actions to proceed the test case
+        """
+        self.superuser = User.objects.create_superuser(
+            'admin',
+            'admin@example.com',
+            'AdminStrongPassword'
+        )
+
+        self.hub = Hub.objects.create(
+            hub_title='My Hub',
+            hub_serial_number='HubSerialNumber',
+            owner=self.superuser
+        )
+
+        self.device = Device.objects.create(
+            device_title='Sensor parent Device',
+            device_serial_number='XJHFJQWH6EASKAS2',
+            device_hub=self.hub
+        )
+
+        self.sensor = Sensor.objects.create(
+            sensor_title='Sensor 1',
+            sensor_device=self.device,
+            sensor_serial_number='sensor1serial',
+            sensor_data_type='pH'
+        )
+
+    def test_sensor_collected_data_export(self):
+        """
+        Test that ensures that collected data lists are streamed whole as CSV and NDJSON
+        """
+        self.client.login(username='admin', password='AdminStrongPassword')
+        start = datetime.datetime(2019, 2, 7, 8, 10, 22, tzinfo=timezone.utc)
+        SensorCollectedData.objects.bulk_create([
+            SensorCollectedData(
+                sensor=self.sensor,
+                date_time_collected=start + datetime.timedelta(seconds=index),
+                sensor_data_value=index
+            )
+            for index in range(5)
+        ])
+        url = '/api/tools/devices/{}/sensors-collected-data/?start_datetime=2019-02-07T08:00:00Z' \
+              '&end_datetime=2019-02-07T09:00:00Z'.format(self.device.pk)
+        expected = self.client.get(url).data['results']
+        self.assertEqual(len(expected), 5)
+
+        with self.settings(HUBS_DEVICES_SENSORS={'EXPORT_CHUNK_SIZE': 2, 'COLLECTED_DATA_PAGE_SIZE': 2}):
+            response = self.client.get(url + '&format=ndjson')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.streaming)
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+            lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+            self.assertEqual([json.loads(line) for line in lines], expected)
+
+            response = self.client.get(url + '&format=csv')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.streaming)
+            rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+            self.assertEqual(rows, [
+                {key: str(value) for key, value in item.items()}
+                for item in expected
+            ])
+
+    def test_sensor_collected_data_export_errors(self):
+        """
+        Test that ensures that errors of CSV and NDJSON exports are rendered as JSON
+        """
+        self.client.login(username='admin', password='AdminStrongPassword')
+        url = '/api/tools/devices/{}/sensors-collected-data/?timestamps=bad'.format(self.device.pk)
+        for export_format in ('csv', 'ndjson'):
+            response = self.client.get(url + '&format=' + export_format)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response['Content-Type'], 'application/json')
+            self.assertEqual(
+                json.loads(response.content.decode('utf-8')),
+                {'timestamps': ['Must be one of: iso, epoch']}
+            )
+
+
+class SensorCollectedDataAggregateAPITestCase(APITestCase):
+
+    """
+    Test case checks that collected data is aggregated into time buckets
+    of readings or rollups
+    """
+
+    def setUp(self):
+        """
+        Method make core actions to proceed the test case
+        """
+        self.superuser = User.objects.create_superuser(
+            'admin',
+            'admin@example.com',
+            'AdminStrongPassword'
+        )
+
+        self.hub = Hub.objects.create(
+            hub_title='My Hub',
+            hub_serial_number='HubSerialNumber',
+            owner=self.superuser
+        )
+
+        self.device = Device.objects.create(
+            device_title='Sensor parent Device',
+            device_serial_number='XJHFJQWH6EASKAS2',
+            device_hub=self.hub
+        )
+
+        self.sensor = Sensor.objects.create(
+            sensor_title='Sensor 1',
+            sensor_device=self.device,
+            sensor_serial_number='sensor1serial',
+            sensor_data_type='pH'
+        )
+
+    def test_sensor_collected_data_aggregate(self):
+        """
+        Test that ensures that readings are aggregated into epoch aligned time buckets
+        of every sensor, also when buckets span several fetched chunks
+        """
+        self.client.login(username='admin', password='AdminStrongPassword')
+        other_sensor = Sensor.objects.create(
+            sensor_title='Sensor 2',
+            sensor_device=self.device,
+            sensor_serial_number='sensor2serial',
+            sensor_data_type='Temperature'
+        )
+        start = datetime.datetime(2019, 2, 7, 8, 10, 0, tzinfo=timezone.utc)
+        SensorCollectedData.objects.bulk_create([
+            SensorCollectedData(
+                sensor=sensor,
+                date_time_collected=start + datetime.timedelta(seconds=20 * index),
+                sensor_data_value=value
+            )
+            for sensor, values in ((self.sensor, (7, 3, 5, 1, 9, 2, 4)), (other_sensor, (6, )))
+            for index, value in enumerate(values)
+        ])
+        query = '?start_datetime=2019-02-07T08:10:00Z&end_datetime=2019-02-07T08:12:00Z&bucket=1m'
+
+        with self.settings(HUBS_DEVICES_SENSORS={'AGGREGATE_CHUNK_SIZE': 2}):
+            response = self.client.get(
+                '/api/tools/devices/{}/sensors-collected-data/aggregate/{}'.format(self.device.pk, query)
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [
+            {'sensor': 'sensor1serial', 'bucket': '2019-02-07T08:10:00Z',
+             'count': 3, 'min': 3.0, 'max': 7.0, 'mean': 5.0, 'last': 5.0},
+            {'sensor': 'sensor1serial', 'bucket': '2019-02-07T08:11:00Z',
+             'count': 3, 'min': 1.0, 'max': 9.0, 'mean': 4.0, 'last': 2.0},
+            {'sensor': 'sensor1serial', 'bucket': '2019-02-07T08:12:00Z',
+             'count': 1, 'min': 4.0, 'max': 4.0, 'mean': 4.0, 'last': 4.0},
+            {'sensor': 'sensor2serial', 'bucket': '2019-02-07T08:10:00Z',
+             'count': 1, 'min': 6.0, 'max': 6.0, 'mean': 6.0, 'last': 6.0},
+        ])
+
+        response = self.client.get(
+            '/api/tools/sensors/{}/collected-data/aggregate/'
+            '?timestamps=epoch&start_datetime=1549526880000&end_datetime=1549527180000&bucket=2m'
+            .format(other_sensor.pk)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [
+            {'sensor': 'sensor2serial', 'bucket': 1549527000000,
+             'count': 1, 'min': 6.0, 'max': 6.0, 'mean': 6.0, 'last': 6.0},
+        ])
+
+        for query in (
+                '?start_datetime=2019-02-07T08:10:00Z&bucket=1m',
+                '?start_datetime=2019-02-07T08:10:00Z&end_datetime=2019-02-07T08:12:00Z&bucket=0',
+                '?start_datetime=2019-02-07T08:10:00Z&end_datetime=2019-02-07T08:12:00Z&bucket=1w',
+                '?start_datetime=2019-01-01T00:00:00Z&end_datetime=2019-02-07T08:12:00Z&bucket=1s',
+                '?start_datetime=yesterday&end_datetime=2019-02-07T08:12:00Z&bucket=1m',
+        ):
+            response = self.client.get(
+                '/api/tools/sensors/{}/collected-data/aggregate/{}'.format(self.sensor.pk, query)
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sensor_collected_data_aggregate_max_points(self):
+        """
+        Test that ensures that the finest resolution that fits into max_points is picked
+        and rollup buckets are the same as buckets of the readings
+        """
+        self.client.login(username='admin', password='AdminStrongPassword')
+        start = datetime.datetime(2019, 2, 7, 8, 0, 0, tzinfo=timezone.utc)
+        # SQLite inserts at most 500 rows by one statement
+        with self.settings(HUBS_DEVICES_SENSORS={'BULK_INGESTION_BATCH_SIZE': 100}):
+            ingestion.write_readings([
+                SensorCollectedData(
+                    sensor_id=self.sensor.sensor_serial_number,
+                    date_time_collected=start + datetime.timedelta(seconds=20 * index),
+                    sensor_data_value=index % 14
+                )
+                for index in range(540)
+            ])
+        url = '/api/tools/sensors/{}/collected-data/aggregate/' \
+              '?start_datetime=2019-02-07T08:00:00Z&end_datetime=2019-02-07T10:59:59Z'.format(self.sensor.pk)
+
+        for max_points, resolution, count in ((1000, 'raw', 540), (200, '1m', 180), (10, '1h', 3), (2, '1d', 1)):
+            response = self.client.get(url + '&max_points={}'.format(max_points))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['X-Resolution'], resolution)
+            self.assertEqual(len(response.data), count)
+
+        expected = self.client.get(url + '&bucket=1h').data
+        self.assertEqual(self.client.get(url + '&max_points=10').data, expected)
+        with self.settings(HUBS_DEVICES_SENSORS={'ROLLUPS': False}):
+            response = self.client.get(url + '&max_points=10')
+        self.assertEqual(response['X-Resolution'], '1h')
+        self.assertEqual(response.data, expected)
+
+        for query in ('&max_points=0', '&max_points=many', '&max_points=10&bucket=1h'):
+            response = self.client.get(url + query)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SensorCollectedDataDownsampleAPITestCase(APITestCase):
+
+    """
+    Test case checks that collected data is downsampled by LTTB
+    """
+
+    def setUp(self):
+        """
+        Method make core actions to proceed the test case
+        """
+        self.superuser = User.objects.create_superuser(
+            'admin',
+            'admin@example.com',
+            'AdminStrongPassword'
+        )
+
+        self.hub = Hub.objects.create(
+            hub_title='My Hub',
+            hub_serial_number='HubSerialNumber',
+            owner=self.superuser
+        )
+
+        self.device = Device.objects.create(
+            device_title='Sensor parent Device',
+            device_serial_number='XJHFJQWH6EASKAS2',
+            device_hub=self.hub
+        )
+
+        self.sensor = Sensor.objects.create(
+            sensor_title='Sensor 1',
+            sensor_device=self.device,
+            sensor_serial_number='sensor1serial',
+            sensor_data_type='pH'
+        )
+
+    def test_sensor_collected_data_downsample(self):
+        """
+        Test that ensures that LTTB downsampling keeps the first, the last and the spike readings
+        of every sensor in the range
+        """
+        self.client.login(username='admin', password='AdminStrongPassword')
+        other_sensor = Sensor.objects.create(
+            sensor_title='Sensor 2',
+            sensor_device=self.device,
+            sensor_serial_number='sensor2serial',
+            sensor_data_type='Temperature'
+        )
+        start = datetime.datetime(2019, 2, 7, 8, 0, 0, tzinfo=timezone.utc)
+        SensorCollectedData.objects.bulk_create([
+            SensorCollectedData(
+                sensor=sensor,
+                date_time_collected=start + datetime.timedelta(seconds=10 * index),
+                sensor_data_value=13 if index == 77 else 5 + index % 2
+            )
+            for sensor in (self.sensor, other_sensor)
+            for index in range(200)
+        ])
+        query = '?start_datetime=2019-02-07T08:00:00Z&end_datetime=2019-02-07T09:00:00Z&downsample=lttb&points=10'
+
+        response = self.client.get('/api/tools/sensors/{}/collected-data/{}'.format(self.sensor.pk, query))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data['results']
+        self.assertEqual(len(results), 10)
+        self.assertEqual(results[0]['date_time_collected'], '2019-02-07T08:00:00Z')
+        self.assertEqual(results[-1]['date_time_collected'], '2019-02-07T08:33:10Z')
+        self.assertIn(
+            {'sensor': 'sensor1serial', 'date_time_collected': '2019-02-07T08:12:50Z', 'sensor_data_value': 13.0},
+            [{key: item[key] for key in ('sensor', 'date_time_collected', 'sensor_data_value')} for item in results]
+        )
+
+        response = self.client.get(
+            '/api/tools/devices/{}/sensors-collected-data/{}'.format(self.device.pk, query)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item['sensor'] for item in response.data['results']],
+            ['sensor1serial'] * 10 + ['sensor2serial'] * 10
+        )
+        stored = {
+            reading.pk: (reading.sensor_id, reading.date_time_collected, reading.sensor_data_value)
+            for reading in SensorCollectedData.objects.all()
+        }
+        for item in response.data['results']:
+            self.assertEqual(
+                stored[item['id']],
+                (item['sensor'], parse_datetime(item['date_time_collected']), item['sensor_data_value'])
+            )
+        # Readings of a sensor fetched in many chunks are downsampled the same way
+        with self.settings(HUBS_DEVICES_SENSORS={'AGGREGATE_CHUNK_SIZE': 7}):
+            chunked = self.client.get(
+                '/api/tools/devices/{}/sensors-collected-data/{}'.format(self.device.pk, query)
+            )
+        self.assertEqual(chunked.data, response.data)
+
+        for query in ('?downsample=lttb&points=2', '?downsample=average&points=10', '?downsample=lttb'):
+            response = self.client.get('/api/tools/sensors/{}/collected-data/{}'.format(self.sensor.pk, query))
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
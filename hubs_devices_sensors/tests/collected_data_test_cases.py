@@ -0,0 +1,1666 @@
+"""
+Sensor Collected Data Test Cases
+Available test cases:
+    SensorCollectDataBulkAPITestCase,
+    SensorCollectDataFormatsAPITestCase,
+    SensorCollectDataCompressionAPITestCase,
+    SensorCollectDataWriteBehindAPITestCase,
+    SensorCollectDataSpoolAPITestCase,
+    SensorCollectDataIngestQueueAPITestCase,
+    SensorCollectDataStreamAPITestCase,
+    SensorCollectDataBackpressureAPITestCase,
+    SensorMetadataCacheTestCase,
+    SensorCollectedDataRollupsTestCase,
+    SensorValuesValidationTestCase,
+    ConsistentHashRingTestCase,
+    HubDateTimeFieldTestCase
+"""
+import datetime
+import gzip
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from hubs_devices_sensors.models import Device, Hub, Sensor, SensorCollectedData, SensorCollectedDataRollup
+from rest_framework.fields import DateTimeField
+from rest_framework.serializers import ValidationError
+from hubs_devices_sensors.serializers import (
+    HubDateTimeField,
+    SensorCollectedDataModelSerializer
+)
+from hubs_devices_sensors.parsers import SensorReadingsBinaryParser
+from hubs_devices_sensors.sensor_cache import sensor_metadata_cache
+from hubs_devices_sensors.sinks import write_behind_buffer
+from hubs_devices_sensors.ingest_queue import IngestQueue
+from hubs_devices_sensors.management.commands.ingest_workers import BatchOutcome, process_batch
+from hubs_devices_sensors.backpressure import load_monitor
+from hubs_devices_sensors.sharding import KEY_HASH_SPACE, ConsistentHashRing, key_hash
+from hubs_devices_sensors.spool import spool
+import hubs_devices_sensors.ingestion as ingestion
+import hubs_devices_sensors.sensor_validation as sensor_validation
+
+
+class SensorCollectDataBulkAPITestCase(APITestCase):
+
+    """
+    Test case checks that batches of SensorCollectedData entities are written
+    by the bulk ingestion path and by the per-row fallback, duplicates are resolved
+    by on_conflict mode and invalid readings are rejected
+    """
+
+    def setUp(self):
+        """
+        Method make core actions to proceed the test case
+        """
+        self.superuser = User.objects.create_superuser(
+            'admin',
+            'admin@example.com',
+            'AdminStrongPassword'
+        )
+
+        self.hub = Hub.objects.create(
+            hub_title='My Hub',
+            hub_serial_number='HubSerialNumber',
+            owner=self.superuser
+        )
+
+        self.device = Device.objects.create(
+            device_title='Sensor parent Device',
+            device_serial_number='XJHFJQWH6EASKAS2',
+            device_hub=self.hub
+        )
+
+        self.sensor = Sensor.objects.create(
+            sensor_title='Sensor 1',
+            sensor_device=self.device,
+            sensor_serial_number='sensor1serial',
+            sensor_data_type='pH'
+        )
+        self.url = '/api/tools/sensors/collect-data/'
+        start = datetime.datetime(2019, 2, 7, 8, 10, 22)
+        self.sensor_data_to_collect = [
+            {
+                'sensor': self.sensor.sensor_serial_number,
+                'sensor_data_value': value,
+                'date_time_collected': start + datetime.timedelta(seconds=5 * index)
+            }
+            for index, value in enumerate((0.35, 1.35, 2.35))
+        ]
+
+    def test_sensor_collect_data_bulk(self):
+        """
+        Test that ensures that the whole batch is written by the bulk ingestion path
+        """
+        response = self.client.post(
+            path=self.url,
+            data=self.sensor_data_to_collect,
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(SensorCollectedData.objects.filter(sensor=self.sensor).count(), 3)
+        readings = SensorCollectedData.objects.filter(sensor=self.sensor).order_by('date_time_collected')
+        self.assertEqual([item['id'] for item in response.data], [reading.pk for reading in readings])
+        self.assertEqual(
+            [(item['sensor'], item['sensor_data_value']) for item in response.data],
+            [(self.sensor.sensor_serial_number, value) for value in (0.35, 1.35, 2.35)]
+        )
+
+    @override_settings(HUBS_DEVICES_SENSORS={'BULK_INGESTION': False})
+    def test_sensor_collect_data_per_row_fallback(self):
+        """
+        Test that ensures that the whole batch is written by the per-row fallback
+        """
+        response = self.client.post(
+            path=self.url,
+            data=self.sensor_data_to_collect,
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(SensorCollectedData.objects.filter(sensor=self.sensor).count(), 3)
+
+    def test_sensor_collect_data_same_time_other_sensor(self):
+        """
+        Test that ensures that different sensors could collect data at the same time
+        """
+        other_sensor = Sensor.objects.create(
+            sensor_title='Sensor 2',
+            sensor_device=self.device,
+            sensor_serial_number='sensor2serial',
+            sensor_data_type='CO2'
+        )
+        other_sensor_data = [
+            dict(item, sensor=other_sensor.sensor_serial_number)
+            for item in self.sensor_data_to_collect
+        ]
+
+        response = self.client.post(
+            path=self.url,
+            data=self.sensor_data_to_collect + other_sensor_data,
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(SensorCollectedData.objects.count(), 6)
+
+    def test_sensor_collect_data_duplicate(self):
+        """
+        Test that ensures that already collected data could not be collected again
+        """
+        self.client.post(path=self.url, data=self.sensor_data_to_collect, format='json')
+        response = self.client.post(
+            path=self.url,
+            data=self.sensor_data_to_collect[:1],
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(SensorCollectedData.objects.count(), 3)
+
+    def test_sensor_collect_data_skip_duplicates(self):
+        """
+        Test that ensures that already collected data is skipped with on_conflict=skip
+        """
+        self.client.post(path=self.url, data=self.sensor_data_to_collect[:2], format='json')
+        response = self.client.post(
+            path=self.url + '?on_conflict=skip',
+            data=self.sensor_data_to_collect,
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {'inserted': 1, 'duplicates': 2})
+        self.assertEqual(SensorCollectedData.objects.count(), 3)
+
+    def test_sensor_collect_data_overwrite_duplicates(self):
+        """
+        Test that ensures that already collected data is overwritten with on_conflict=overwrite
+        """
+        self.client.post(path=self.url, data=self.sensor_data_to_collect[:1], format='json')
+        overwriting_data = [dict(self.sensor_data_to_collect[0], sensor_data_value=7.5)]
+        response = self.client.post(
+            path=self.url + '?on_conflict=overwrite',
+            data=overwriting_data,
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {'inserted': 0, 'duplicates': 1})
+        self.assertEqual(
+            list(SensorCollectedData.objects.values_list('sensor_data_value', flat=True)),
+            [7.5]
+        )
+
+    def test_sensor_collect_data_concurrent_duplicates(self):
+        """
+        Test that ensures that readings stored concurrently after the conflicts were found
+        are skipped or overwritten by the retried write instead of failing the request
+        """
+        self.client.post(path=self.url, data=self.sensor_data_to_collect[:1], format='json')
+        find_existing_keys = ingestion.find_existing_keys
+
+        for on_conflict, expected_value in (('skip', 0.35), ('overwrite', 7.5)):
+            calls = []
+
+            def find_existing_keys_late(keys):
+                # The first lookup misses the stored reading as if it was written meanwhile
+                calls.append(keys)
+                return set() if len(calls) == 1 else find_existing_keys(keys)
+
+            with mock.patch.object(ingestion, 'find_existing_keys', find_existing_keys_late):
+                response = self.client.post(
+                    path=self.url + '?on_conflict=' + on_conflict,
+                    data=[dict(item, sensor_data_value=7.5) for item in self.sensor_data_to_collect[:2]],
+                    format='json'
+                )
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertEqual(len(calls), 2)
+            self.assertEqual(response.data, {'inserted': 1, 'duplicates': 1})
+            self.assertEqual(
+                list(SensorCollectedData.objects.order_by('date_time_collected').values_list(
+                    'sensor_data_value', flat=True
+                )),
+                [expected_value, 7.5]
+            )
+            SensorCollectedData.objects.exclude(
+                date_time_collected=self.sensor_data_to_collect[0]['date_time_collected']
+            ).delete()
+
+    def test_sensor_collect_data_partial_accept(self):
+        """
+        Test that ensures that valid readings are collected and invalid ones
+        are reported by index with accept=partial
+        """
+        sensor_data_to_collect = list(self.sensor_data_to_collect)
+        sensor_data_to_collect[1] = dict(sensor_data_to_collect[1], sensor_data_value=25)
+        sensor_data_to_collect.append(dict(sensor_data_to_collect[0], sensor='unknown'))
+
+        response = self.client.post(
+            path=self.url + '?accept=partial',
+            data=sensor_data_to_collect,
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['inserted'], 2)
+        self.assertEqual(
+            response.data['rejected'],
+            [[1, 'max_value'], [3, 'sensor:does_not_exist']]
+        )
+        self.assertEqual(SensorCollectedData.objects.count(), 2)
+
+    def test_sensor_collect_data_not_finite(self):
+        """
+        Test that ensures that NaN values are rejected by every payload format
+        instead of reaching the database
+        """
+        sensor_data_to_collect = [dict(self.sensor_data_to_collect[0], sensor_data_value='NaN')]
+        response = self.client.post(path=self.url, data=sensor_data_to_collect, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0]['non_field_errors'][0].code, sensor_validation.NOT_FINITE_ERROR)
+
+        series = [{
+            'sensor': self.sensor.sensor_serial_number,
+            't0': 1549527022000,
+            'dt': 5000,
+            'values': [1.5, 'NaN']
+        }]
+        response = self.client.post(path=self.url + '?accept=partial', data=series, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['rejected'], [[1, sensor_validation.NOT_FINITE_ERROR]])
+
+        payload = SensorReadingsBinaryParser.pack(
+            [self.sensor.sensor_serial_number],
+            [0],
+            [1549527032000],
+            [float('nan')]
+        )
+        response = self.client.post(
+            path=self.url,
+            data=payload,
+            content_type=SensorReadingsBinaryParser.media_type
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'rejected': [[0, sensor_validation.NOT_FINITE_ERROR]]})
+        self.assertEqual(SensorCollectedData.objects.count(), 1)
+
+    def test_sensor_collect_data_validation_queries(self):
+        """
+        Test that ensures that validation of a batch makes one query with warm sensor cache
+        """
+        sensor_metadata_cache.get_many([self.sensor.sensor_serial_number])
+        serializer = SensorCollectedDataModelSerializer(data=self.sensor_data_to_collect, many=True)
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+
+
+class SensorCollectDataFormatsAPITestCase(APITestCase):
+
+    """
+    Test case checks that SensorCollectedData entities could be created from binary,
+    series and epoch timestamps batches
+    """
+
+    def setUp(self):
+        """
+        Method make core actions to proceed the test case
+        """
+        self.superuser = User.objects.create_superuser(
+            'admin',
+            'admin@example.com',
+            'AdminStrongPassword'
+        )
+
+        self.hub = Hub.objects.create(
+            hub_title='My Hub',
+            hub_serial_number='HubSerialNumber',
+            owner=self.superuser
+        )
+
+        self.device = Device.objects.create(
+            device_title='Sensor parent Device',
+            device_serial_number='XJHFJQWH6EASKAS2',
+            device_hub=self.hub
+        )
+
+        self.sensor = Sensor.objects.create(
+            sensor_title='Sensor 1',
+            sensor_device=self.device,
+            sensor_serial_number='sensor1serial',
+            sensor_data_type='pH'
+        )
+        self.url = '/api/tools/sensors/collect-data/'
+
+    def test_sensor_collect_data_binary(self):
+        """
+        Test that ensures that packed binary readings are collected
+        and invalid ones are reported by index
+        """
+        payload = SensorReadingsBinaryParser.pack(
+            [self.sensor.sensor_serial_number, 'unknown'],
+            [0, 0, 1, 0],
+            [1549527022000, 1549527027000, 1549527027000, 1549527032000],
+            [1.5, 2.5, 3.5, 20]
+        )
+
+        response = self.client.post(
+            path=self.url + '?accept=partial',
+            data=payload,
+            content_type=SensorReadingsBinaryParser.media_type
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['inserted'], 2)
+        self.assertEqual(
+            response.data['rejected'],
+            [[2, 'sensor:does_not_exist'], [3, 'max_value']]
+        )
+        self.assertEqual(
+            list(SensorCollectedData.objects.order_by('date_time_collected').values_list(
+                'date_time_collected', 'sensor_data_value'
+            )),
+            [
+                (datetime.datetime(2019, 2, 7, 8, 10, 22, tzinfo=timezone.utc), 1.5),
+                (datetime.datetime(2019, 2, 7, 8, 10, 27, tzinfo=timezone.utc), 2.5),
+            ]
+        )
+
+    def test_sensor_collect_data_binary_bad_request(self):
+        """
+        Test that ensures that nothing is collected from binary readings
+        with invalid ones without accept=partial
+        """
+        payload = SensorReadingsBinaryParser.pack(
+            [self.sensor.sensor_serial_number],
+            [0, 0],
+            [1549527022000, 1549527027000],
+            [1.5, -2.5]
+        )
+
+        response = self.client.post(
+            path=self.url,
+            data=payload,
+            content_type=SensorReadingsBinaryParser.media_type
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data, {'rejected': [[1, 'min_value']]})
+        self.assertEqual(SensorCollectedData.objects.count(), 0)
+
+    def test_sensor_collect_data_series(self):
+        """
+        Test that ensures that columnar series are expanded and collected
+        """
+        series = [
+            {
+                'sensor': self.sensor.sensor_serial_number,
+                't0': '2019-02-07T08:10:22Z',
+                'dt': [5000, 10000],
+                'values': [1.5, 2.5, 3.5]
+            },
+            {
+                'sensor': self.sensor.sensor_serial_number,
+                't0': 1549527100000,
+                'values': [4.5, 5.5]
+            }
+        ]
+
+        response = self.client.post(path=self.url, data=series, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {'inserted': 5, 'duplicates': 0, 'rejected': []})
+        start = datetime.datetime(2019, 2, 7, 8, 10, 22, tzinfo=timezone.utc)
+        self.assertEqual(
+            list(SensorCollectedData.objects.order_by('date_time_collected').values_list(
+                'date_time_collected', flat=True
+            )),
+            [
+                start,
+                start + datetime.timedelta(seconds=5),
+                start + datetime.timedelta(seconds=15),
+                # dt of the second series defaults to Device sensors_data_fetch_time
+                start + datetime.timedelta(seconds=78),
+                start + datetime.timedelta(seconds=83),
+            ]
+        )
+
+    def test_sensor_collect_data_series_invalid_dt(self):
+        """
+        Test that ensures that series with fractional or negative dt are rejected
+        instead of being collapsed into one timestamp
+        """
+        for dt in (0.5, [5000, 0.5], [5000, -5000], True):
+            series = [{
+                'sensor': self.sensor.sensor_serial_number,
+                't0': 1549527022000,
+                'dt': dt,
+                'values': [1.5, 2.5, 3.5]
+            }]
+            response = self.client.post(path=self.url, data=series, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(SensorCollectedData.objects.count(), 0)
+
+    def test_sensor_collect_data_epoch(self):
+        """
+        Test that ensures that readings with epoch milliseconds are collected
+        and listed back as epoch milliseconds
+        """
+        self.client.login(username='admin', password='AdminStrongPassword')
+        timestamps = [1549527022000, 1549527027000, 1549527032500]
+        response = self.client.post(
+            path=self.url + '?timestamps=epoch',
+            data=[
+                {'sensor': self.sensor.sensor_serial_number, 'sensor_data_value': 1.5, 'date_time_collected': timestamp}
+                for timestamp in timestamps
+            ],
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {'inserted': 3, 'duplicates': 0, 'rejected': []})
+        self.assertEqual(
+            SensorCollectedData.objects.order_by('date_time_collected').first().date_time_collected,
+            datetime.datetime(2019, 2, 7, 8, 10, 22, tzinfo=timezone.utc)
+        )
+
+        response = self.client.get(
+            '/api/tools/sensors/{}/collected-data/?timestamps=epoch'.format(self.sensor.pk)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(item['date_time_collected'] for item in response.data['results']), timestamps)
+
+        response = self.client.get(
+            '/api/tools/devices/{}/sensors-collected-data/'
+            '?timestamps=epoch&start_datetime=1549527022000&end_datetime=1549527030000'.format(self.device.pk)
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(item['date_time_collected'] for item in response.data['results']), timestamps[:2])
+
+    def test_sensor_collect_data_epoch_partial(self):
+        """
+        Test that ensures that malformed readings with epoch milliseconds are rejected one by one
+        """
+        response = self.client.post(
+            path=self.url + '?timestamps=epoch&accept=partial',
+            data=[
+                {'sensor': self.sensor.sensor_serial_number, 'date_time_collected': 1549527022000},
+                {'sensor': self.sensor.sensor_serial_number, 'date_time_collected': '2019-02-07T08:10:22Z'},
+                {'sensor': 'unknown', 'date_time_collected': 1549527022000},
+                {'date_time_collected': 1549527022000},
+                {'sensor': self.sensor.sensor_serial_number, 'date_time_collected': 1549527022000,
+                 'sensor_data_value': 20},
+            ],
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['rejected'], [
+            [1, 'date_time_collected:invalid'],
+            [2, 'sensor:does_not_exist'],
+            [3, 'sensor:required'],
+            [4, 'max_value'],
+        ])
+        self.assertEqual(SensorCollectedData.objects.count(), 1)
+
+
+class SensorCollectDataCompressionAPITestCase(APITestCase):
+
+    """
+    Test case checks that compressed collect-data request bodies are decompressed
+    and checked before they are parsed
+    """
+
+    def setUp(self):
+        """
+        Method make core actions to proceed the test case
+        """
+        self.superuser = User.objects.create_superuser(
+            'admin',
+            'admin@example.com',
+            'AdminStrongPassword'
+        )
+
+        self.hub = Hub.objects.create(
+            hub_title='My Hub',
+            hub_serial_number='HubSerialNumber',
+            owner=self.superuser
+        )
+
+        self.device = Device.objects.create(
+            device_title='Sensor parent Device',
+            device_serial_number='XJHFJQWH6EASKAS2',
+            device_hub=self.hub
+        )
+
+        self.sensor = Sensor.objects.create(
+            sensor_title='Sensor 1',
+            sensor_device=self.device,
+            sensor_serial_number='sensor1serial',
+            sensor_data_type='pH'
+        )
+        self.url = '/api/tools/sensors/collect-data/'
+        start = datetime.datetime(2019, 2, 7, 8, 10, 22)
+        self.sensor_data_to_collect = [
+            {
+                'sensor': self.sensor.sensor_serial_number,
+                'sensor_data_value': value,
+                'date_time_collected': start + datetime.timedelta(seconds=5 * index)
+            }
+            for index, value in enumerate((0.35, 1.35, 2.35))
+        ]
+
+    def test_sensor_collect_data_gzip(self):
+        """
+        Test that ensures that gzip encoded request body is decompressed
+        """
+        response = self.client.post(
+            path=self.url,
+            data=gzip.compress(json.dumps(self.sensor_data_to_collect, default=str).encode()),
+            content_type='application/json',
+            HTTP_CONTENT_ENCODING='gzip'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(SensorCollectedData.objects.count(), 3)
+
+    def test_sensor_collect_data_gzip_truncated(self):
+        """
+        Test that ensures that truncated gzip encoded request body is rejected
+        instead of being read as a complete one
+        """
+        lines = [
+            json.dumps({
+                'sensor': self.sensor.sensor_serial_number,
+                'sensor_data_value': 1.5,
+                'date_time_collected': 1549527022000 + index * 1000
+            })
+            for index in range(50)
+        ]
+        body = gzip.compress('\n'.join(lines).encode())
+        response = self.client.post(
+            path=self.url,
+            data=gzip.compress(json.dumps(self.sensor_data_to_collect, default=str).encode())[:-10],
+            content_type='application/json',
+            HTTP_CONTENT_ENCODING='gzip'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            path=self.url + 'stream/?timestamps=epoch',
+            data=body[:len(body) // 2],
+            content_type='application/x-ndjson',
+            HTTP_CONTENT_ENCODING='gzip'
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data['detail'], 'Truncated compressed body')
+
+    @override_settings(HUBS_DEVICES_SENSORS={'MAX_DECOMPRESSED_BODY_SIZE': 1024})
+    def test_sensor_collect_data_gzip_too_large(self):
+        """
+        Test that ensures that request body inflating over the limit is rejected
+        """
+        response = self.client.post(
+            path=self.url,
+            data=gzip.compress(b' ' * 1024 * 1024 + b'[]'),
+            content_type='application/json',
+            HTTP_CONTENT_ENCODING='gzip'
+        )
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_sensor_collect_data_unsupported_encoding(self):
+        """
+        Test that ensures that unsupported Content-Encoding is rejected
+        """
+        response = self.client.post(
+            path=self.url,
+            data=b'[]',
+            content_type='application/json',
+            HTTP_CONTENT_ENCODING='br'
+        )
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+
+class SensorCollectDataWriteBehindAPITestCase(APITestCase):
+
+    """
+    Test case checks that readings buffered by the write-behind sink are acknowledged
+    and written on flush
+    """
+
+    def setUp(self):
+        """
+        Method make core actions to proceed the test case
+        """
+        self.superuser = User.objects.create_superuser(
+            'admin',
+            'admin@example.com',
+            'AdminStrongPassword'
+        )
+
+        self.hub = Hub.objects.create(
+            hub_title='My Hub',
+            hub_serial_number='HubSerialNumber',
+            owner=self.superuser
+        )
+
+        self.device = Device.objects.create(
+            device_title='Sensor parent Device',
+            device_serial_number='XJHFJQWH6EASKAS2',
+            device_hub=self.hub
+        )
+
+        self.sensor = Sensor.objects.create(
+            sensor_title='Sensor 1',
+            sensor_device=self.device,
+            sensor_serial_number='sensor1serial',
+            sensor_data_type='pH'
+        )
+        self.url = '/api/tools/sensors/collect-data/'
+        start = datetime.datetime(2019, 2, 7, 8, 10, 22)
+        self.sensor_data_to_collect = [
+            {
+                'sensor': self.sensor.sensor_serial_number,
+                'sensor_data_value': value,
+                'date_time_collected': start + datetime.timedelta(seconds=5 * index)
+            }
+            for index, value in enumerate((0.35, 1.35, 2.35))
+        ]
+
+    @override_settings(HUBS_DEVICES_SENSORS={
+        'WRITE_BEHIND': True,
+        'WRITE_BEHIND_FLUSH_INTERVAL': 3600 * 1000
+    })
+    def test_sensor_collect_data_write_behind(self):
+        """
+        Test that ensures that buffered readings are acknowledged and written on flush
+        """
+        response = self.client.post(
+            path=self.url,
+            data=self.sensor_data_to_collect,
+            format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data, {'accepted': 3})
+        self.assertEqual(SensorCollectedData.objects.count(), 0)
+
+        self.assertTrue(write_behind_buffer.flush())
+        self.assertEqual(SensorCollectedData.objects.count(), 3)
+
+    @override_settings(HUBS_DEVICES_SENSORS={
+        'WRITE_BEHIND': True,
+        'WRITE_BEHIND_FLUSH_INTERVAL': 3600 * 1000,
+        'WRITE_BEHIND_MAX_ATTEMPTS': 2
+    })
+    def test_sensor_collect_data_write_behind_bad_reading(self):
+        """
+        Test that ensures that a reading that could not be written does not hold back
+        the other ones and is dropped after WRITE_BEHIND_MAX_ATTEMPTS flushes
+        """
+        start = datetime.datetime(2019, 2, 7, 8, 10, tzinfo=timezone.utc)
+        readings = [
+            SensorCollectedData(
+                sensor=self.sensor,
+                date_time_collected=start + datetime.timedelta(seconds=index),
+                sensor_data_value=value
+            )
+            for index, value in enumerate((1.5, 2.5, None, 3.5, 4.5))
+        ]
+        write_behind_buffer.append(readings, ingestion.ON_CONFLICT_SKIP)
+
+        with self.assertLogs('hubs_devices_sensors.sinks', 'WARNING'):
+            self.assertFalse(write_behind_buffer.flush())
+        self.assertEqual(SensorCollectedData.objects.count(), 4)
+        self.assertEqual(len(write_behind_buffer), 1)
+
+        with self.assertLogs('hubs_devices_sensors.sinks', 'ERROR') as logs:
+            self.assertTrue(write_behind_buffer.flush())
+        self.assertIn('dropped reading of sensor sensor1serial', logs.output[-1])
+        self.assertEqual(len(write_behind_buffer), 0)
+        self.assertEqual(SensorCollectedData.objects.count(), 4)
+
+
+class SensorCollectDataSpoolAPITestCase(APITestCase):
+
+    """
+    Test case checks that readings appended to the durable spool are acknowledged
+    and loaded from its segments
+    """
+
+    def setUp(self):
+        """
+        Method make core actions to proceed the test case
+        """
+        self.superuser = User.objects.create_superuser(
+            'admin',
+            'admin@example.com',
+            'AdminStrongPassword'
+        )
+
+        self.hub = Hub.objects.create(
+            hub_title='My Hub',
+            hub_serial_number='HubSerialNumber',
+            owner=self.superuser
+        )
+
+        self.device = Device.objects.create(
+            device_title='Sensor parent Device',
+            device_serial_number='XJHFJQWH6EASKAS2',
+            device_hub=self.hub
+        )
+
+        self.sensor = Sensor.objects.create(
+            sensor_title='Sensor 1',
+            sensor_device=self.device,
+            sensor_serial_number='sensor1serial',
+            sensor_data_type='pH'
+        )
+        self.url = '/api/tools/sensors/collect-data/'
+        start = datetime.datetime(2019, 2, 7, 8, 10, 22)
+        self.sensor_data_to_collect = [
+            {
+                'sensor': self.sensor.sensor_serial_number,
+                'sensor_data_value': value,
+                'date_time_collected': start + datetime.timedelta(seconds=5 * index)
+            }
+            for index, value in enumerate((0.35, 1.35, 2.35))
+        ]
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_sensor_collect_data_spool(self):
+        """
+        Test that ensures that spooled readings are acknowledged
+        and loaded by replay_spool command, a replayed segment does not duplicate readings
+        """
+        with self.settings(HUBS_DEVICES_SENSORS={
+            'SPOOL': True,
+            'SPOOL_DIR': self.directory,
+            'SPOOL_DRAIN': False
+        }):
+            for _ in range(2):
+                response = self.client.post(
+                    path=self.url,
+                    data=self.sensor_data_to_collect,
+                    format='json'
+                )
+                self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+                self.assertEqual(response.data, {'accepted': 3})
+            self.assertEqual(SensorCollectedData.objects.count(), 0)
+
+            spool.seal()
+            self.assertEqual(len(os.listdir(self.directory)), 1)
+            output = StringIO()
+            call_command('replay_spool', stdout=output)
+
+        self.assertIn('1 segments: 3 readings inserted, 3 duplicates', output.getvalue())
+        self.assertEqual(SensorCollectedData.objects.count(), 3)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_sensor_collect_data_spool_truncated(self):
+        """
+        Test that ensures that frames before a truncated tail of a segment are loaded
+        """
+        with self.settings(HUBS_DEVICES_SENSORS={
+            'SPOOL': True,
+            'SPOOL_DIR': self.directory,
+            'SPOOL_DRAIN': False
+        }):
+            response = self.client.post(
+                path=self.url,
+                data=self.sensor_data_to_collect,
+                format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            spool.seal()
+            segment_path = os.path.join(self.directory, os.listdir(self.directory)[0])
+            with open(segment_path, 'ab') as segment:
+                segment.write(b'HDSF\x10')
+            call_command('replay_spool', stdout=StringIO())
+
+        self.assertEqual(SensorCollectedData.objects.count(), 3)
+
+    def test_sensor_collect_data_spool_non_ascii(self):
+        """
+        Test that ensures that readings of sensors with non-ASCII serial numbers
+        longer than 16 bytes in UTF-8 are spooled and loaded intact
+        """
+        other_sensor = Sensor.objects.create(
+            sensor_title='Sensor 2',
+            sensor_device=self.device,
+            sensor_serial_number='ДатчикДатчик',
+            sensor_data_type='Temperature'
+        )
+        with self.settings(HUBS_DEVICES_SENSORS={
+            'SPOOL': True,
+            'SPOOL_DIR': self.directory,
+            'SPOOL_DRAIN': False
+        }):
+            response = self.client.post(
+                path=self.url,
+                data=[
+                    dict(
+                        self.sensor_data_to_collect[0],
+                        sensor=other_sensor.sensor_serial_number,
+                        sensor_data_value=21.5
+                    ),
+                    self.sensor_data_to_collect[0]
+                ],
+                format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            spool.seal()
+            call_command('replay_spool', stdout=StringIO())
+
+        self.assertEqual(
+            sorted(SensorCollectedData.objects.values_list('sensor_id', 'sensor_data_value')),
+            [('sensor1serial', 0.35), ('ДатчикДатчик', 21.5)]
+        )
+
+    def test_sensor_collect_data_spool_directory_fsync(self):
+        """
+        Test that ensures that the spool directory is fsynced after a segment is created,
+        sealed and set aside
+        """
+        with self.settings(HUBS_DEVICES_SENSORS={
+            'SPOOL': True,
+            'SPOOL_DIR': self.directory,
+            'SPOOL_DRAIN': False
+        }), mock.patch('hubs_devices_sensors.spool.fsync_directory') as fsync_directory:
+            bad_reading = SensorCollectedData(
+                sensor_id=self.sensor.sensor_serial_number,
+                date_time_collected=datetime.datetime(2019, 2, 7, 8, 10, tzinfo=timezone.utc),
+                sensor_data_value=float('nan')
+            )
+            spool.append([bad_reading], ingestion.ON_CONFLICT_ERROR)
+            self.assertEqual(fsync_directory.call_args_list, [mock.call(self.directory)])
+            spool.seal()
+            self.assertEqual(fsync_directory.call_args_list, [mock.call(self.directory)] * 2)
+            with self.assertLogs('hubs_devices_sensors.spool', 'ERROR'):
+                spool.drain()
+            self.assertEqual(fsync_directory.call_args_list, [mock.call(self.directory)] * 3)
+
+    def test_sensor_collect_data_spool_failed_segment(self):
+        """
+        Test that ensures that a segment that could not be written is set aside
+        and the next segments are loaded
+        """
+        with self.settings(HUBS_DEVICES_SENSORS={
+            'SPOOL': True,
+            'SPOOL_DIR': self.directory,
+            'SPOOL_DRAIN': False
+        }):
+            bad_reading = SensorCollectedData(
+                sensor_id=self.sensor.sensor_serial_number,
+                date_time_collected=datetime.datetime(2019, 2, 7, 8, 10, tzinfo=timezone.utc),
+                sensor_data_value=float('nan')
+            )
+            spool.append([bad_reading], ingestion.ON_CONFLICT_ERROR)
+            spool.seal()
+            response = self.client.post(
+                path=self.url,
+                data=self.sensor_data_to_collect,
+                format='json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            spool.seal()
+
+            with self.assertLogs('hubs_devices_sensors.spool', 'ERROR'):
+                segments, result = spool.drain()
+
+        self.assertEqual(segments, 1)
+        self.assertEqual(result.inserted, 3)
+        self.assertEqual(SensorCollectedData.objects.count(), 3)
+        failed, = os.listdir(self.directory)
+        self.assertTrue(failed.endswith('.failed'))
+
+
+class SensorCollectDataIngestQueueAPITestCase(APITestCase):
+
+    """
+    Test case checks that raw collect-data batches queued to the ingest queue
+    are written by ingest workers
+    """
+
+    def setUp(self):
+        """
+        Method make core actions to proceed the test case
+        """
+        self.superuser = User.objects.create_superuser(
+            'admin',
+            'admin@example.com',
+            'AdminStrongPassword'
+        )
+
+        self.hub = Hub.objects.create(
+            hub_title='My Hub',
+            hub_serial_number='HubSerialNumber',
+            owner=self.superuser
+        )
+
+        self.device = Device.objects.create(
+            device_title='Sensor parent Device',
+            device_serial_number='XJHFJQWH6EASKAS2',
+            device_hub=self.hub
+        )
+
+        self.sensor = Sensor.objects.create(
+            sensor_title='Sensor 1',
+            sensor_device=self.device,
+            sensor_serial_number='sensor1serial',
+            sensor_data_type='pH'
+        )
+        self.url = '/api/tools/sensors/collect-data/'
+        start = datetime.datetime(2019, 2, 7, 8, 10, 22)
+        self.sensor_data_to_collect = [
+            {
+                'sensor': self.sensor.sensor_serial_number,
+                'sensor_data_value': value,
+                'date_time_collected': start + datetime.timedelta(seconds=5 * index)
+            }
+            for index, value in enumerate((0.35, 1.35, 2.35))
+        ]
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.queue_path = os.path.join(self.directory, 'queue.sqlite3')
+
+    def test_sensor_collect_data_ingest_queue(self):
+        """
+        Test that ensures that queued raw batch is written by an ingest worker
+        and the batch claimed again is not rejected for readings written by the first claim
+        """
+        with self.settings(HUBS_DEVICES_SENSORS={'INGEST_QUEUE': True, 'INGEST_QUEUE_PATH': self.queue_path}):
+            response = self.client.post(
+                path=self.url,
+                data=self.sensor_data_to_collect,
+                format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(SensorCollectedData.objects.count(), 0)
+
+        queue = IngestQueue(self.queue_path)
+        batch, = queue.claim(worker=1)
+        self.assertEqual(batch.id, response.data['batch'])
+        self.assertEqual(queue.claim(worker=2), [])
+        self.assertEqual(process_batch(batch), BatchOutcome(done=True, error=None))
+        self.assertEqual(SensorCollectedData.objects.count(), 3)
+
+        queue.release_worker(1)
+        batch, = queue.claim(worker=2)
+        self.assertEqual(batch.attempts, 2)
+        self.assertEqual(process_batch(batch), BatchOutcome(done=True, error=None))
+        queue.ack(batch.id)
+        self.assertEqual(len(queue), 0)
+        self.assertEqual(SensorCollectedData.objects.count(), 3)
+
+    def test_sensor_collect_data_ingest_queue_checks(self):
+        """
+        Test that ensures that the ingest queue rejects unsupported media types and malformed
+        bodies before they are acknowledged, accepts bodies over DATA_UPLOAD_MAX_MEMORY_SIZE
+        and keeps batches rejected by a worker as failed
+        """
+        with self.settings(
+            HUBS_DEVICES_SENSORS={'INGEST_QUEUE': True, 'INGEST_QUEUE_PATH': self.queue_path},
+            DATA_UPLOAD_MAX_MEMORY_SIZE=64
+        ):
+            response = self.client.post(path=self.url, data='garbage', content_type='text/plain')
+            self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+            response = self.client.post(
+                path=self.url,
+                data='{"sensor"',
+                content_type='application/json'
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            response = self.client.post(
+                path=self.url,
+                data=b'HDSR\x01',
+                content_type=SensorReadingsBinaryParser.media_type
+            )
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+            sensor_data_to_collect = list(self.sensor_data_to_collect)
+            sensor_data_to_collect[1] = dict(sensor_data_to_collect[1], sensor_data_value=25)
+            response = self.client.post(path=self.url, data=sensor_data_to_collect, format='json')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            batch_url = '{}batches/{}/'.format(self.url, response.data['batch'])
+            self.assertEqual(
+                self.client.get(batch_url).data,
+                {'batch': response.data['batch'], 'status': 'queued'}
+            )
+
+            queue = IngestQueue(self.queue_path)
+            batch, = queue.claim(worker=1)
+            with self.assertLogs('hubs_devices_sensors.management.commands.ingest_workers', 'WARNING'):
+                outcome = process_batch(batch)
+            self.assertTrue(outcome.done)
+            queue.fail(batch.id, outcome.error)
+            self.assertEqual(len(queue), 0)
+            self.assertEqual(queue.claim(worker=1), [])
+            response = self.client.get(batch_url)
+            self.assertEqual(response.data['status'], 'failed')
+            self.assertEqual(
+                response.data['error'][1]['non_field_errors'][0],
+                'pH Value cannot be more than 14'
+            )
+
+            response = self.client.post(path=self.url, data=self.sensor_data_to_collect, format='json')
+            batch_url = '{}batches/{}/'.format(self.url, response.data['batch'])
+            batch, = queue.claim(worker=1)
+            self.assertEqual(self.client.get(batch_url).data['status'], 'processing')
+            self.assertEqual(process_batch(batch), BatchOutcome(done=True, error=None))
+            queue.ack(batch.id)
+            self.assertEqual(self.client.get(batch_url).data['status'], 'done')
+            response = self.client.get('{}batches/{}/'.format(self.url, batch.id + 1))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(SensorCollectedData.objects.count(), 3)
+
+    def test_sensor_collect_data_ingest_queue_max_attempts(self):
+        """
+        Test that ensures that batch failing with an unexpected error is claimed again
+        until INGEST_QUEUE_MAX_ATTEMPTS claims and is kept as failed then
+        """
+        with self.settings(HUBS_DEVICES_SENSORS={
+            'INGEST_QUEUE': True,
+            'INGEST_QUEUE_PATH': self.queue_path,
+            'INGEST_QUEUE_MAX_ATTEMPTS': 3
+        }), mock.patch(
+            'hubs_devices_sensors.management.commands.ingest_workers.'
+            'SensorCollectedDataListCreateAPIView.ingest',
+            side_effect=RuntimeError('Boom')
+        ):
+            response = self.client.post(path=self.url, data=self.sensor_data_to_collect, format='json')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            batch_url = '{}batches/{}/'.format(self.url, response.data['batch'])
+
+            queue = IngestQueue(self.queue_path)
+            for attempts in range(1, 3):
+                batch, = queue.claim(worker=1)
+                self.assertEqual(batch.attempts, attempts)
+                with self.assertLogs('hubs_devices_sensors.management.commands.ingest_workers', 'ERROR'):
+                    self.assertEqual(process_batch(batch), BatchOutcome(done=False, error=None))
+                queue.release(batch.id)
+
+            batch, = queue.claim(worker=1)
+            with self.assertLogs('hubs_devices_sensors.management.commands.ingest_workers', 'ERROR'):
+                outcome = process_batch(batch)
+            self.assertTrue(outcome.done)
+            queue.fail(batch.id, outcome.error)
+            self.assertEqual(queue.claim(worker=1), [])
+            response = self.client.get(batch_url)
+            self.assertEqual(response.data['status'], 'failed')
+            self.assertIn('Boom', response.data['error'])
+
+    def test_sensor_collect_data_ingest_queue_routing(self):
+        """
+        Test that ensures that batch of a hub is claimed only by the worker that owns the hub
+        """
+        with self.settings(HUBS_DEVICES_SENSORS={'INGEST_QUEUE': True, 'INGEST_QUEUE_PATH': self.queue_path}):
+            response = self.client.post(
+                path=self.url,
+                data=self.sensor_data_to_collect,
+                format='json',
+                HTTP_X_HUB_SERIAL_NUMBER=self.hub.hub_serial_number
+            )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        queue = IngestQueue(self.queue_path)
+        ring = ConsistentHashRing(range(3))
+        owner = ring.node_for(self.hub.hub_serial_number)
+        for index in range(3):
+            if index != owner:
+                self.assertEqual(queue.claim(worker=index, ranges=ring.ranges(index)), [])
+        batch, = queue.claim(worker=owner, ranges=ring.ranges(owner))
+        self.assertEqual(batch.id, response.data['batch'])
+
+
+class SensorCollectDataStreamAPITestCase(APITestCase):
+
+    """
+    Test case checks that SensorCollectedData entities could be created
+    from newline-delimited JSON stream
+    """
+
+    def setUp(self):
+        """
+        Method make core actions to proceed the test case
+        """
+        self.superuser = User.objects.create_superuser(
+            'admin',
+            'admin@example.com',
+            'AdminStrongPassword'
+        )
+
+        self.hub = Hub.objects.create(
+            hub_title='My Hub',
+            hub_serial_number='HubSerialNumber',
+            owner=self.superuser
+        )
+
+        self.device = Device.objects.create(
+            device_title='Sensor parent Device',
+            device_serial_number='XJHFJQWH6EASKAS2',
+            device_hub=self.hub
+        )
+
+        self.sensor = Sensor.objects.create(
+            sensor_title='Sensor 1',
+            sensor_device=self.device,
+            sensor_serial_number='sensor1serial',
+            sensor_data_type='pH'
+        )
+        self.url = '/api/tools/sensors/collect-data/stream/'
+
+    @override_settings(HUBS_DEVICES_SENSORS={'NDJSON_BATCH_SIZE': 2, 'NDJSON_CHUNK_SIZE': 16})
+    def test_sensor_collect_data_stream(self):
+        """
+        Test that ensures that valid lines are collected batch by batch
+        and invalid lines are reported by index
+        """
+        lines = [
+            json.dumps({
+                'sensor': self.sensor.sensor_serial_number,
+                'sensor_data_value': value,
+                'date_time_collected': '2019-02-07T08:10:{:02d}Z'.format(index)
+            })
+            for index, value in enumerate((1.5, 2.5, 20, 3.5))
+        ]
+        lines.insert(2, '{not json')
+
+        response = self.client.post(
+            path=self.url,
+            data='\n'.join(lines) + '\n',
+            content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['inserted'], 3)
+        self.assertEqual(response.data['rejected'], [[2, 'parse_error'], [3, 'max_value']])
+        self.assertEqual(SensorCollectedData.objects.count(), 3)
+
+
+class SensorCollectDataBackpressureAPITestCase(APITestCase):
+
+    """
+    Test case checks load hints headers of collect-data responses
+    and throttling of hubs that ignore them
+    """
+
+    def setUp(self):
+        """
+        Method make core actions to proceed the test case
+        """
+        self.superuser = User.objects.create_superuser(
+            'admin',
+            'admin@example.com',
+            'AdminStrongPassword'
+        )
+
+        self.hub = Hub.objects.create(
+            hub_title='My Hub',
+            hub_serial_number='HubSerialNumber',
+            owner=self.superuser
+        )
+
+        self.device = Device.objects.create(
+            device_title='Sensor parent Device',
+            device_serial_number='XJHFJQWH6EASKAS2',
+            device_hub=self.hub
+        )
+
+        self.sensor = Sensor.objects.create(
+            sensor_title='Sensor 1',
+            sensor_device=self.device,
+            sensor_serial_number='sensor1serial',
+            sensor_data_type='pH'
+        )
+        self.url = '/api/tools/sensors/collect-data/'
+        load_monitor.reset()
+        cache.clear()
+        self.addCleanup(load_monitor.reset)
+
+    def post_reading(self, seconds):
+        """
+        Posts one reading collected given seconds after the start time
+        """
+        return self.client.post(
+            path=self.url,
+            data=[{
+                'sensor': self.sensor.sensor_serial_number,
+                'sensor_data_value': 1.35,
+                'date_time_collected': datetime.datetime(2019, 2, 7, 8, 10, seconds)
+            }],
+            format='json',
+            HTTP_X_HUB_SERIAL_NUMBER=self.hub.hub_serial_number
+        )
+
+    @override_settings(HUBS_DEVICES_SENSORS={'BACKPRESSURE_TARGET_LATENCY': 60 * 1000})
+    def test_collect_data_load_hints(self):
+        """
+        Test that ensures that not overloaded server recommends default batch size and no delay
+        """
+        response = self.post_reading(0)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response['X-Recommended-Batch-Size'], '500')
+        self.assertEqual(response['X-Min-Post-Delay'], '0')
+
+    @override_settings(HUBS_DEVICES_SENSORS={'BACKPRESSURE_TARGET_LATENCY': 1})
+    def test_collect_data_backpressure_throttle(self):
+        """
+        Test that ensures that overloaded server recommends larger batches and a delay
+        and throttles the hub after BACKPRESSURE_BURST requests
+        """
+        load_monitor.record(0.1)
+        for seconds in range(2):
+            response = self.post_reading(seconds)
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            self.assertGreater(int(response['X-Recommended-Batch-Size']), 500)
+            self.assertGreater(int(response['X-Min-Post-Delay']), 0)
+
+        response = self.post_reading(2)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(SensorCollectedData.objects.count(), 2)
+
+
+class SensorMetadataCacheTestCase(TestCase):
+
+    """
+    Test case checks that sensor metadata is cached and invalidated on changes
+    """
+
+    def setUp(self):
+        """
+        Method make core actions to proceed the test case
+        """
+        self.superuser = User.objects.create_superuser(
+            'admin',
+            'admin@example.com',
+            'AdminStrongPassword'
+        )
+
+        self.hub = Hub.objects.create(
+            hub_title='My Hub',
+            hub_serial_number='HubSerialNumber',
+            owner=self.superuser
+        )
+
+        self.device = Device.objects.create(
+            device_title='Sensor parent Device',
+            device_serial_number='XJHFJQWH6EASKAS2',
+            device_hub=self.hub
+        )
+
+        self.sensor = Sensor.objects.create(
+            sensor_title='Sensor 1',
+            sensor_device=self.device,
+            sensor_serial_number='sensor1serial',
+            sensor_data_type='pH'
+        )
+        sensor_metadata_cache.clear()
+
+    def test_sensor_metadata_cached(self):
+        """
+        Test that ensures that cached sensor metadata is returned without queries
+        """
+        with self.assertNumQueries(1):
+            metadata = sensor_metadata_cache.get_many(['sensor1serial'])['sensor1serial']
+        with self.assertNumQueries(0):
+            sensor_metadata_cache.get_many(['sensor1serial'])
+
+        self.assertEqual(metadata.pk, self.sensor.pk)
+        self.assertEqual(metadata.data_type, 'pH')
+        self.assertEqual(metadata.device, self.device.device_serial_number)
+        self.assertEqual(metadata.hub, self.hub.hub_serial_number)
+        self.assertEqual(metadata.owner, self.superuser.pk)
+
+    def test_sensor_metadata_invalidated_on_sensor_save(self):
+        """
+        Test that ensures that changed Sensor is fetched again
+        """
+        sensor_metadata_cache.get_many(['sensor1serial'])
+        self.sensor.sensor_data_type = 'CO2'
+        self.sensor.save()
+
+        metadata = sensor_metadata_cache.get_many(['sensor1serial'])['sensor1serial']
+        self.assertEqual(metadata.data_type, 'CO2')
+
+    def test_sensor_metadata_invalidated_on_hub_delete(self):
+        """
+        Test that ensures that metadata of deleted Hub sensors is dropped
+        """
+        sensor_metadata_cache.get_many(['sensor1serial'])
+        self.hub.delete()
+
+        self.assertEqual(sensor_metadata_cache.get_many(['sensor1serial']), {})
+
+    def get_batch_serializer(self, value):
+        """
+        Returns batch serializer of readings of the sensor and of the second sensor
+        """
+        return SensorCollectedDataModelSerializer(
+            data=[
+                {
+                    'sensor': serial_number,
+                    'sensor_data_value': value,
+                    'date_time_collected': '2019-02-07T08:10:{:02d}Z'.format(index)
+                }
+                for index, serial_number in enumerate(('sensor1serial', 'sensor2serial') * 5)
+            ],
+            many=True
+        )
+
+    def create_second_sensor(self):
+        """
+        Creates the second sensor of the batches
+        """
+        Sensor.objects.create(
+            sensor_title='Sensor 2',
+            sensor_device=self.device,
+            sensor_serial_number='sensor2serial',
+            sensor_data_type='Temperature'
+        )
+
+    def test_sensor_collect_data_batches_cached(self):
+        """
+        Test that ensures that sensors of a batch are resolved with one query
+        and repeated batches take them from the cache
+        """
+        self.create_second_sensor()
+
+        # Sensors of the batch and the uniqueness check
+        with self.assertNumQueries(2):
+            self.assertTrue(self.get_batch_serializer(1.5).is_valid())
+        for _ in range(3):
+            with self.assertNumQueries(1):
+                self.assertTrue(self.get_batch_serializer(1.5).is_valid())
+
+    def test_sensor_collect_data_batch_invalidated(self):
+        """
+        Test that ensures that batches are validated by changed sensor data type
+        and that readings of deleted sensors are rejected
+        """
+        self.create_second_sensor()
+        serializer = self.get_batch_serializer(20)
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors[0]['non_field_errors'][0].code, 'max_value')
+
+        self.sensor.sensor_data_type = 'CO2'
+        self.sensor.save()
+        self.assertTrue(self.get_batch_serializer(20).is_valid())
+
+        self.sensor.delete()
+        serializer = self.get_batch_serializer(20)
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(serializer.errors[0]['sensor'][0].code, 'does_not_exist')
+        self.assertEqual(serializer.errors[1], {})
+
+
+class SensorCollectedDataRollupsTestCase(TestCase):
+
+    """
+    Test case checks that minute, hour and day rollups are maintained while readings are written
+    """
+
+    def setUp(self):
+        """
+        Method make core actions to proceed the test case
+        """
+        self.superuser = User.objects.create_superuser(
+            'admin',
+            'admin@example.com',
+            'AdminStrongPassword'
+        )
+
+        self.hub = Hub.objects.create(
+            hub_title='My Hub',
+            hub_serial_number='HubSerialNumber',
+            owner=self.superuser
+        )
+
+        self.device = Device.objects.create(
+            device_title='Sensor parent Device',
+            device_serial_number='XJHFJQWH6EASKAS2',
+            device_hub=self.hub
+        )
+
+        self.sensor = Sensor.objects.create(
+            sensor_title='Sensor 1',
+            sensor_device=self.device,
+            sensor_serial_number='sensor1serial',
+            sensor_data_type='pH'
+        )
+        self.start = datetime.datetime(2019, 2, 7, 8, 59, 30, tzinfo=timezone.utc)
+
+    def readings(self, offsets_values):
+        return [
+            SensorCollectedData(
+                sensor_id=self.sensor.sensor_serial_number,
+                date_time_collected=self.start + datetime.timedelta(seconds=offset),
+                sensor_data_value=value
+            )
+            for offset, value in offsets_values
+        ]
+
+    @staticmethod
+    def stored_rollups():
+        return list(SensorCollectedDataRollup.objects.order_by('resolution', 'bucket').values_list(
+            'resolution', 'bucket', 'count', 'minimum', 'maximum', 'total', 'last_value'
+        ))
+
+    def rebuilt_rollups(self):
+        call_command('rebuild_rollups', stdout=StringIO())
+        return self.stored_rollups()
+
+    def test_rollups_incremental(self):
+        """
+        Test that ensures that rollups of batches, late readings, skipped duplicates and
+        overwritten readings are the same as rollups rebuilt from scratch
+        """
+        ingestion.write_readings(self.readings([(0, 7), (20, 3), (40, 5)]))
+        # Late reading of the first minute does not replace its last value
+        ingestion.write_readings(self.readings([(10, 9), (50, 1)]), ingestion.ON_CONFLICT_SKIP)
+        # Duplicate is skipped and does not change the rollups
+        ingestion.write_readings(self.readings([(25, 2), (20, 14)]), ingestion.ON_CONFLICT_SKIP)
+        ingestion.write_readings(self.readings([(40, 6), (45, 4)]), ingestion.ON_CONFLICT_OVERWRITE)
+
+        start = self.start.replace(second=0)
+        hour = start.replace(minute=0)
+        expected = [
+            ('1d', hour.replace(hour=0), 7, 1.0, 9.0, 32.0, 1.0),
+            ('1h', hour, 4, 2.0, 9.0, 21.0, 2.0),
+            ('1h', hour + datetime.timedelta(hours=1), 3, 1.0, 6.0, 11.0, 1.0),
+            ('1m', start, 4, 2.0, 9.0, 21.0, 2.0),
+            ('1m', start + datetime.timedelta(minutes=1), 3, 1.0, 6.0, 11.0, 1.0),
+        ]
+        self.assertEqual(self.stored_rollups(), expected)
+
+        SensorCollectedDataRollup.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        self.assertEqual(out.getvalue().strip(), 'Rebuilt 5 rollups')
+        self.assertEqual(self.stored_rollups(), expected)
+
+    def test_rollups_multi_sensor_queries(self):
+        """
+        Test that ensures that rollups of a batch of many sensors are merged
+        with a fixed number of queries per resolution
+        """
+        serial_numbers = [self.sensor.sensor_serial_number] + [
+            Sensor.objects.create(
+                sensor_title='Sensor {}'.format(index),
+                sensor_device=Device.objects.create(
+                    device_title='Device {}'.format(index),
+                    device_serial_number='device{}serial'.format(index),
+                    device_hub=self.hub
+                ),
+                sensor_serial_number='sensor{}serial'.format(index),
+                sensor_data_type='pH'
+            ).sensor_serial_number
+            for index in range(2, 21)
+        ]
+
+        def batch(offset):
+            return [
+                SensorCollectedData(
+                    sensor_id=serial_number,
+                    date_time_collected=self.start + datetime.timedelta(seconds=offset + index),
+                    sensor_data_value=index
+                )
+                for serial_number in serial_numbers
+                for index in range(5)
+            ]
+
+        ingestion.write_readings(batch(0))
+        # Savepoint and INSERT of the readings, savepoint, SELECT, DELETE and INSERT of every resolution
+        with self.assertNumQueries(18):
+            ingestion.write_readings(batch(10))
+
+        total = SensorCollectedDataRollup.objects.filter(resolution='1d').values_list('count', 'total')
+        self.assertEqual(list(total), [(10, 20.0)] * 20)
+
+    def test_rollups_move_and_delete(self):
+        """
+        Test that ensures that buckets a reading is moved out of and buckets of a deleted reading
+        are recomputed, rollups are the same as rollups rebuilt from scratch
+        """
+        ingestion.write_readings(self.readings([(0, 7), (20, 3), (70, 5)]))
+        start = self.start.replace(second=0)
+
+        reading = SensorCollectedData.objects.get(date_time_collected=self.start + datetime.timedelta(seconds=20))
+        reading.date_time_collected = self.start + datetime.timedelta(seconds=80)
+        reading.save()
+        self.assertEqual(self.stored_rollups()[-2:], [
+            ('1m', start, 1, 7.0, 7.0, 7.0, 7.0),
+            ('1m', start + datetime.timedelta(minutes=1), 2, 3.0, 5.0, 8.0, 3.0),
+        ])
+        self.assertEqual(self.stored_rollups(), self.rebuilt_rollups())
+
+        SensorCollectedData.objects.get(date_time_collected=self.start).delete()
+        self.assertFalse(SensorCollectedDataRollup.objects.filter(bucket=start).exists())
+        self.assertEqual(self.stored_rollups(), self.rebuilt_rollups())
+
+    def test_rollups_disabled(self):
+        """
+        Test that ensures that rollups are not maintained without ROLLUPS option
+        """
+        with self.settings(HUBS_DEVICES_SENSORS={'ROLLUPS': False}):
+            ingestion.write_readings(self.readings([(0, 7)]))
+        self.assertFalse(SensorCollectedDataRollup.objects.exists())
+
+
+class SensorValuesValidationTestCase(SimpleTestCase):
+
+    """
+    Test case checks batch range validation of sensor values
+    """
+
+    def test_validate_values(self):
+        """
+        Test that ensures that invalid rows are reported by index with error codes
+        """
+        error_indices, error_codes = sensor_validation.validate_values(
+            ['pH', 'pH', 'CO2', 'Temperature', 'Temperature', 'Bubble', 'pH', 'CO2'],
+            [7.0, 15.0, -1.0, 127.0, -41.0, 1.0, float('nan'), float('inf')]
+        )
+        self.assertEqual(list(error_indices), [1, 2, 4, 5, 6, 7])
+        self.assertEqual(
+            error_codes,
+            [
+                sensor_validation.MAX_VALUE_ERROR,
+                sensor_validation.MIN_VALUE_ERROR,
+                sensor_validation.MIN_VALUE_ERROR,
+                sensor_validation.DATA_TYPE_ERROR,
+                sensor_validation.NOT_FINITE_ERROR,
+                sensor_validation.NOT_FINITE_ERROR,
+            ]
+        )
+
+    def test_validate_value_matches_batch(self):
+        """
+        Test that ensures that single value validation agrees with batch validation
+        """
+        self.assertIsNone(sensor_validation.validate_value('CO2', 100))
+        self.assertEqual(
+            sensor_validation.validate_value('CO2', 100.5),
+            sensor_validation.MAX_VALUE_ERROR
+        )
+        self.assertEqual(
+            sensor_validation.validate_value('CO2', float('nan')),
+            sensor_validation.NOT_FINITE_ERROR
+        )
+        self.assertEqual(
+            sensor_validation.error_message('Temperature', sensor_validation.MIN_VALUE_ERROR),
+            'Temperature Value cannot be less than -40'
+        )
+
+
+class ConsistentHashRingTestCase(SimpleTestCase):
+
+    """
+    Test case checks that hubs are partitioned between workers by consistent hashing
+    """
+
+    def setUp(self):
+        """
+        Method make core actions to proceed the test case
+        """
+        self.hub_serial_numbers = ['Hub{}'.format(index) for index in range(2000)]
+
+    def test_ring_ranges_match_nodes(self):
+        """
+        Test that ensures that key hash ranges of the nodes cover the key hash space once
+        and every key belongs to the node whose ranges contain its hash
+        """
+        ring = ConsistentHashRing(range(4))
+        ranges = {node: ring.ranges(node) for node in range(4)}
+        covered = sorted(hash_range for node_ranges in ranges.values() for hash_range in node_ranges)
+        self.assertEqual(covered[0][0], 0)
+        self.assertEqual(covered[-1][1], KEY_HASH_SPACE)
+        for (_, end), (start, _) in zip(covered, covered[1:]):
+            self.assertEqual(end, start)
+
+        for hub_serial_number in self.hub_serial_numbers:
+            hash_value = key_hash(hub_serial_number)
+            node = ring.node_for(hub_serial_number)
+            self.assertTrue(any(start <= hash_value < end for start, end in ranges[node]))
+
+    def test_ring_rebalance(self):
+        """
+        Test that ensures that adding a node moves only hubs to the new node, about 1 / nodes of them
+        """
+        ring = ConsistentHashRing(range(4))
+        grown_ring = ConsistentHashRing(range(5))
+        moved = [
+            hub_serial_number for hub_serial_number in self.hub_serial_numbers
+            if ring.node_for(hub_serial_number) != grown_ring.node_for(hub_serial_number)
+        ]
+        for hub_serial_number in moved:
+            self.assertEqual(grown_ring.node_for(hub_serial_number), 4)
+        self.assertLess(len(moved), len(self.hub_serial_numbers) * 0.3)
+
+
+class HubDateTimeFieldTestCase(SimpleTestCase):
+
+    """
+    Test case checks that HubDateTimeField parses timestamps exactly like DateTimeField
+    """
+
+    def test_hub_datetime_field_parsing(self):
+        """
+        Test that ensures that fast and fallback shapes give the same datetimes
+        """
+        field = HubDateTimeField()
+        default_field = DateTimeField()
+        for value in (
+                '2019-02-07T08:10:22Z',
+                '2019-02-07T08:10:22.123456Z',
+                '2019-02-07T08:10:22.5Z',
+                '2019-02-07T08:10:22+02:00',
+                '2019-02-07T08:10:22',
+                '2019-02-07 08:10:22Z',
+        ):
+            self.assertEqual(field.to_internal_value(value), default_field.to_internal_value(value))
+
+    def test_hub_datetime_field_invalid(self):
+        """
+        Test that ensures that invalid timestamps of the fast shape are rejected
+        """
+        field = HubDateTimeField()
+        for value in ('2019-02-30T08:10:22Z', '2019-02-07T25:10:22.000000Z', '2019-02-07T08:10:22.12345xZ'):
+            with self.assertRaises(ValidationError):
+                field.to_internal_value(value)
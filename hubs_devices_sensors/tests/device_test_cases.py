@@ -648,8 +648,8 @@ class DeviceGetSensorsAPITestCase(APITestCase):
         """
         Test that ensures that system would notify that Device entity is not found
         """
-        with self.assertRaises(Device.DoesNotExist):
-            self.client.get(self.invalid_url)
+        response = self.client.get(self.invalid_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
 
 class DeviceGetCollectedDataTimeRangeAPITestCase(APITestCase):
@@ -745,12 +745,14 @@ class DeviceGetCollectedDataTimeRangeAPITestCase(APITestCase):
         response = self.client.get(self.url)
 
         serialized_collected_data = SensorCollectedDataModelSerializer(
-            SensorCollectedData.objects.filter(sensor__sensor_device=self.device),
+            SensorCollectedData.objects.filter(
+                sensor__sensor_device=self.device
+            ).order_by('date_time_collected', 'id'),
             many=True,
             context={'request': self.request}
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data, serialized_collected_data.data)
+        self.assertEqual(response.data['results'], serialized_collected_data.data)
 
     def test_device_get_sensors_collected_data_not_authorized(self):
         """
@@ -778,5 +780,5 @@ class DeviceGetCollectedDataTimeRangeAPITestCase(APITestCase):
         """
         Test that ensures that system would notify that Device entity is not found
         """
-        with self.assertRaises(Device.DoesNotExist):
-            self.client.get(self.invalid_url)
+        response = self.client.get(self.invalid_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
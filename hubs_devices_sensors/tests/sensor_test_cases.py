@@ -227,12 +227,12 @@ class SensorCanGetAPITestCase(APITestCase):
         response = self.client.get(url)
 
         serialized_sensor_data_collected = SensorCollectedDataModelSerializer(
-            SensorCollectedData.objects.filter(sensor=self.sensor),
+            SensorCollectedData.objects.filter(sensor=self.sensor).order_by('date_time_collected', 'id'),
             many=True,
             context={'request': request}
         )
 
-        self.assertEqual(response.data, serialized_sensor_data_collected.data)
+        self.assertEqual(response.data['results'], serialized_sensor_data_collected.data)
 
     def test_get_sensors_not_authorized(self):
         """
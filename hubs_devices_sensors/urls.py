@@ -5,9 +5,12 @@ Contains routing for hubs_devices_sensors app
 from django.urls import path
 from .views.sensors_collected_data_views import (
     SensorCollectedDataListCreateAPIView,
+    SensorCollectedDataStreamAPIView,
+    SensorCollectedDataBatchAPIView,
     SensorCollectedDataAdminAPIView,
     SensorAllCollectedDataUserAPIView,
-    OneSensorCollectedDataUserAPIView
+    OneSensorCollectedDataUserAPIView,
+    OneSensorCollectedDataAggregateAPIView
 )
 from .views.hub_views import (
     HubListAPIView,
@@ -26,7 +29,8 @@ from .views.device_views import (
     DeviceListAPIView,
     DeviceRetrieveUpdateDestroy,
     DeviceListSensorsAPIView,
-    DeviceSensorsCollectedDataTimeRangeAPIView
+    DeviceSensorsCollectedDataTimeRangeAPIView,
+    DeviceSensorsCollectedDataAggregateAPIView
 )
 
 
@@ -34,18 +38,51 @@ from .views.device_views import (
 #     sensors/ - GET
 #     sensors/create/ - POST
 #     sensors/<int:pk>/ - GET, PUT, PATCH, DELETE
-#     sensors/collect-data/ - POST
-#     sensors/collected-data/admin/ - GET
-#     sensors/collected-data/ - GET
-#     sensors/<int:pk>/collected-data/ - GET
+#     sensors/collect-data/ - POST (JSON readings or series, application/vnd.hubs-readings,
+#         ?on_conflict=error|skip|overwrite, ?accept=partial, ?timestamps=iso|epoch)
+#     sensors/collect-data/stream/ - POST (application/x-ndjson, ?on_conflict=error|skip|overwrite,
+#         ?timestamps=iso|epoch)
+#     sensors/collect-data/batches/<int:pk>/ - GET (status of a batch queued with INGEST_QUEUE option)
+#     sensors/collected-data/admin/ - GET (?timestamps=iso|epoch, ?cursor, ?page_size, ?format=csv|ndjson)
+#     sensors/collected-data/ - GET (?timestamps=iso|epoch, ?cursor, ?page_size, ?format=csv|ndjson)
+#     sensors/<int:pk>/collected-data/ - GET (?start_datetime, ?end_datetime, ?timestamps=iso|epoch,
+#         ?cursor, ?page_size, ?format=csv|ndjson, ?downsample=lttb&points)
+#     sensors/<int:pk>/collected-data/aggregate/ - GET (?start_datetime, ?end_datetime,
+#         ?bucket or ?max_points, ?timestamps=iso|epoch)
 #     devices/ - GET
 #     devices/create/ - POST
 #     devices/<int:pk>/ - GET, PUT, PATCH, DELETE
 #     devices/<int:pk>/sensors/ - GET
+#     devices/<int:pk>/sensors-collected-data/ - GET (?start_datetime, ?end_datetime,
+#         ?timestamps=iso|epoch, ?cursor, ?page_size, ?format=csv|ndjson, ?downsample=lttb&points)
+#     devices/<int:pk>/sensors-collected-data/aggregate/ - GET (?start_datetime, ?end_datetime,
+#         ?bucket or ?max_points, ?timestamps=iso|epoch)
 #     hubs/ - GET
 #     hubs/create/ - POST
 #     hubs/<int:pk>/ - GET, PUT, PATCH, DELETE
 #     hubs/<int:pk>/devices/ - GET
+#
+# collected-data lists are pages {next, previous, results} of readings ordered by
+# (date_time_collected, id), next and previous are links with opaque ?cursor,
+# ?format=csv|ndjson streams the whole list instead
+# collect-data options:
+#     ?on_conflict=skip - already collected readings are skipped, ?on_conflict=overwrite - they are
+#         overwritten, responses contain inserted and duplicates counts
+#     ?accept=partial - valid readings are collected even if some readings are invalid,
+#         responses contain inserted and duplicates counts and 'rejected' [index, error code] pairs
+#     ?timestamps=epoch - date_time_collected is integer epoch milliseconds, readings are validated
+#         in columns and responses always contain counts and 'rejected' pairs
+#     request body could be a list of readings, a list of {"sensor", "t0", "dt", "values"} series
+#         (see ingestion.expand_series()) or packed binary readings (see parsers.SensorReadingsBinaryParser),
+#         responses to series and binary readings always contain counts and 'rejected' pairs
+#     request body could be gzip or deflate encoded (Content-Encoding header)
+#     with WRITE_BEHIND or SPOOL option readings are written later, responses have 202 status
+#         and accepted count
+#     with INGEST_QUEUE option JSON and binary bodies are only queued for manage.py ingest_workers,
+#         responses have 202 status and 'batch' id, batches with X-Hub-Serial-Number header
+#         are ingested by the worker of the hub one after another. Status of the batch, queued,
+#         processing, failed with the error or done, is at sensors/collect-data/batches/<int:pk>/
+#     responses carry load hints headers, see backpressure.py
 
 
 urlpatterns = []
@@ -72,6 +109,14 @@ SENSORS_URLS = [
         'sensors/collect-data/',
         SensorCollectedDataListCreateAPIView.as_view(),
         name='sensors-collect-data'),
+    path(
+        'sensors/collect-data/stream/',
+        SensorCollectedDataStreamAPIView.as_view(),
+        name='sensors-collect-data-stream'),
+    path(
+        'sensors/collect-data/batches/<int:pk>/',
+        SensorCollectedDataBatchAPIView.as_view(),
+        name='sensors-collect-data-batch'),
     path(
         'sensors/collected-data/admin/',
         SensorCollectedDataAdminAPIView.as_view(),
@@ -86,6 +131,12 @@ SENSORS_URLS = [
         OneSensorCollectedDataUserAPIView.as_view(),
         name='sensor-collected-data'
     ),
+    path(
+        # e.g ?start_datetime=2018-01-02T00:00:00Z&end_datetime=2018-01-03T00:00:00Z&bucket=15m
+        'sensors/<int:pk>/collected-data/aggregate/',
+        OneSensorCollectedDataAggregateAPIView.as_view(),
+        name='sensor-collected-data-aggregate'
+    ),
     path(
         'sensors/<int:pk>/',
         SensorRetrieveUpdateDestroyAPIView.as_view(),
@@ -111,6 +162,12 @@ DEVICES_URLS = [
         'devices/<int:pk>/sensors-collected-data/',
         DeviceSensorsCollectedDataTimeRangeAPIView.as_view(),
         name='sensor-data-time-range'
+    ),
+    path(
+        # e.g ?start_datetime=2018-01-02T00:00:00Z&end_datetime=2018-01-03T00:00:00Z&bucket=1h
+        'devices/<int:pk>/sensors-collected-data/aggregate/',
+        DeviceSensorsCollectedDataAggregateAPIView.as_view(),
+        name='sensor-data-aggregate'
     )
 ]
 urlpatterns += DEVICES_URLS + HUBS_URLS + SENSORS_URLS
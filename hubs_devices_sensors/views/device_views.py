@@ -1,6 +1,7 @@
 from rest_framework import generics, exceptions
 from rest_framework.permissions import IsAuthenticated
 import hubs_devices_sensors.serializers as serializers
+from hubs_devices_sensors.views.mixins import AggregateMixin, DownsampleMixin, FastReadMixin, TimeRangeMixin
 from hubs_devices_sensors.models import Sensor, Device, SensorCollectedData
 
 
@@ -66,29 +67,53 @@ class DeviceListSensorsAPIView(generics.ListAPIView):
     serializer_class = serializers.SensorModelSerializer
 
     def get_queryset(self):
-        return Sensor.objects.filter(
-            sensor_device=Device.objects.get(pk=self.kwargs['pk'])
-        )
+        try:
+            device = Device.objects.get(pk=self.kwargs['pk'])
+        except Device.DoesNotExist:
+            raise exceptions.NotFound('Requested Device was not found at our own')
+        return Sensor.objects.filter(sensor_device=device)
 
 
-class DeviceSensorsCollectedDataTimeRangeAPIView(generics.ListAPIView):
+class DeviceSensorsCollectedDataTimeRangeAPIView(DownsampleMixin, TimeRangeMixin, FastReadMixin,
+                                                 generics.ListAPIView):
 
     """
     ClassBasedView taht lists all SensorCollectedData related to Device and filtered by time range
     e.g ?start_datetime=2018-01-02T21:25:33Z&end_datetime=2018-01-02T22:45:33Z
+    e.g ?timestamps=epoch&start_datetime=1514928333000&end_datetime=1514933133000 -
+    range and date_time_collected are integer epoch milliseconds
+    e.g ?start_datetime=2018-01-02T00:00:00Z&end_datetime=2018-01-03T00:00:00Z&downsample=lttb&points=500 -
+    at most 500 readings of every Device sensor
     """
 
     permission_classes = (IsAuthenticated, )
     serializer_class = serializers.SensorCollectedDataModelSerializer
 
-    def get_queryset(self):
-        start_datetime = self.request.query_params.get('start_datetime', None)
-        end_datetime = self.request.query_params.get('end_datetime', None)
+    def get_sensor_serial_numbers(self):
         user = self.request.user
-        device = Device.objects.get(pk=self.kwargs['pk'])
+        try:
+            device = Device.objects.get(pk=self.kwargs['pk'])
+        except Device.DoesNotExist:
+            raise exceptions.NotFound('Requested Device was not found at our own')
+        if device.device_hub.owner_id != user.pk:
+            return []
+        return list(device.sensors.values_list('sensor_serial_number', flat=True))
+
+    def get_queryset(self):
+        sensors = self.get_sensor_serial_numbers()
+        if not sensors:
+            return SensorCollectedData.objects.none()
+
+        # Filtering by sensor serial numbers lets (sensor, date_time_collected) index
+        # serve the range scan of every Device sensor
+        return SensorCollectedData.objects.filter(sensor_id__in=sensors)
+
 
-        return SensorCollectedData.objects.filter(
-            sensor__sensor_device__device_hub__owner=user,
-            sensor__sensor_device=device,
-            date_time_collected__range=(start_datetime, end_datetime)
-        )
+class DeviceSensorsCollectedDataAggregateAPIView(AggregateMixin, DeviceSensorsCollectedDataTimeRangeAPIView):
+
+    """
+    ClassBasedView that lists count, min, max, mean and last value of every Device sensor
+    in every time bucket of the range
+    e.g ?start_datetime=2018-01-02T00:00:00Z&end_datetime=2018-01-03T00:00:00Z&bucket=1h
+    e.g ?start_datetime=2018-01-01T00:00:00Z&end_datetime=2019-01-01T00:00:00Z&max_points=500
+    """
@@ -0,0 +1,402 @@
+"""
+mixins.py
+Mixins of the SensorCollectedData views
+Classes:
+    TimestampsFormatMixin,
+    TimeRangeMixin,
+    FastReadMixin,
+    DownsampleMixin,
+    AggregateMixin
+Functions:
+    get_timestamps_format
+"""
+from collections import OrderedDict
+from datetime import timedelta
+from itertools import groupby, islice
+from operator import itemgetter
+import numpy as np
+from django.http import StreamingHttpResponse
+from rest_framework import exceptions
+from rest_framework.fields import DateTimeField
+from rest_framework.response import Response
+import hubs_devices_sensors.aggregation as aggregation
+import hubs_devices_sensors.app_settings as app_settings
+import hubs_devices_sensors.downsampling as downsampling
+import hubs_devices_sensors.planner as planner
+import hubs_devices_sensors.rollups as rollups
+import hubs_devices_sensors.serializers as serializers
+import hubs_devices_sensors.ingestion as ingestion
+import hubs_devices_sensors.renderers as renderers
+from hubs_devices_sensors.models import SensorCollectedDataRollup
+from hubs_devices_sensors.pagination import ReadingsKeysetPagination
+
+
+def get_timestamps_format(query_params):
+    """
+    Returns date_time_collected representation requested by ?timestamps query parameter
+    """
+    timestamps = query_params.get('timestamps', ingestion.TIMESTAMPS_ISO)
+    if timestamps not in ingestion.TIMESTAMPS_CHOICES:
+        raise exceptions.ValidationError(
+            {'timestamps': ['Must be one of: ' + ', '.join(ingestion.TIMESTAMPS_CHOICES)]}
+        )
+    return timestamps
+
+
+class TimestampsFormatMixin:
+
+    """
+    Class TimestampsFormatMixin - mixin of SensorCollectedData list views
+    e.g ?timestamps=epoch - date_time_collected is listed as integer epoch milliseconds
+    """
+
+    def get_serializer_class(self):
+        if get_timestamps_format(self.request.query_params) == ingestion.TIMESTAMPS_EPOCH:
+            return serializers.SensorCollectedDataEpochSerializer
+        return super(TimestampsFormatMixin, self).get_serializer_class()
+
+
+class TimeRangeMixin:
+
+    """
+    Class TimeRangeMixin - mixin of SensorCollectedData list views filtered by time range,
+    bounds are inclusive and a missing bound leaves the range open
+    e.g ?start_datetime=2018-01-02T21:25:33Z&end_datetime=2018-01-02T22:45:33Z
+    e.g ?timestamps=epoch&start_datetime=1514928333000&end_datetime=1514933133000 -
+    range is given in integer epoch milliseconds
+
+    @method get_time_range() - returns tuple (start_datetime, end_datetime) of aware datetimes,
+    None of a missing bound
+    @method filter_queryset(queryset) - filters SensorCollectedData queryset by the range
+    """
+
+    time_range_params = ('start_datetime', 'end_datetime')
+
+    def get_time_range(self):
+        query_params = self.request.query_params
+        epoch = get_timestamps_format(query_params) == ingestion.TIMESTAMPS_EPOCH
+        field = serializers.EpochMillisDateTimeField() if epoch else serializers.HubDateTimeField()
+        time_range = []
+        for param in self.time_range_params:
+            value = query_params.get(param)
+            if value is None:
+                time_range.append(None)
+                continue
+            if epoch:
+                try:
+                    value = int(value)
+                except ValueError:
+                    # Rejected by the field
+                    pass
+            try:
+                time_range.append(field.run_validation(value))
+            except exceptions.ValidationError as exc:
+                raise exceptions.ValidationError({param: exc.detail})
+        return tuple(time_range)
+
+    def filter_queryset(self, queryset):
+        queryset = super(TimeRangeMixin, self).filter_queryset(queryset)
+        start_datetime, end_datetime = self.get_time_range()
+        if start_datetime is not None:
+            queryset = queryset.filter(date_time_collected__gte=start_datetime)
+        if end_datetime is not None:
+            queryset = queryset.filter(date_time_collected__lte=end_datetime)
+        return queryset
+
+
+class FastReadMixin(TimestampsFormatMixin):
+
+    """
+    Class FastReadMixin - mixin of SensorCollectedData list views that renders rows
+    fetched as values_list tuples by SensorCollectedDataRowSerializer.
+    Response is the same as of the serializer_class.
+    Lists are paginated by ReadingsKeysetPagination
+    e.g ?format=csv or ?format=ndjson - whole list is exported without pagination,
+    rows are fetched by EXPORT_CHUNK_SIZE and streamed as soon as they are rendered
+    """
+
+    pagination_class = ReadingsKeysetPagination
+    export_renderer_classes = (renderers.ReadingsCSVRenderer, renderers.ReadingsNDJSONRenderer)
+
+    def get_renderers(self):
+        return super(FastReadMixin, self).get_renderers() + [
+            renderer() for renderer in self.export_renderer_classes
+        ]
+
+    @staticmethod
+    def get_position(item):
+        """
+        Returns (date_time_collected, id) of the listed row or SensorCollectedData entity
+        """
+        if isinstance(item, tuple):
+            pk, _, date_time_collected, _ = item
+            return date_time_collected, pk
+        return item.date_time_collected, item.pk
+
+    def list(self, request, *args, **kwargs):
+        row_serializer = serializers.SensorCollectedDataRowSerializer(
+            get_timestamps_format(request.query_params)
+        )
+        if isinstance(request.accepted_renderer, renderers.ReadingsExportRenderer):
+            return self.export(request.accepted_renderer, row_serializer)
+        if not row_serializer.is_supported():
+            return super(FastReadMixin, self).list(request, *args, **kwargs)
+
+        rows = row_serializer.get_rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(row_serializer.to_representation(page))
+        return Response(row_serializer.to_representation(rows))
+
+    def export(self, renderer, row_serializer):
+        """
+        Returns StreamingHttpResponse of all listed readings rendered by the export renderer
+        """
+        chunk_size = app_settings.get('EXPORT_CHUNK_SIZE')
+        queryset = self.filter_queryset(self.get_queryset()).order_by(*self.pagination_class.ordering)
+        if row_serializer.is_supported():
+            items = row_serializer.iter_representation(
+                row_serializer.get_rows(queryset).iterator(chunk_size=chunk_size)
+            )
+        else:
+            serializer = self.get_serializer()
+            items = (serializer.to_representation(item) for item in queryset.iterator(chunk_size=chunk_size))
+
+        response = StreamingHttpResponse(
+            renderer.iter_chunks(items, chunk_size),
+            content_type='{}; charset={}'.format(renderer.media_type, renderer.charset)
+        )
+        response['Content-Disposition'] = 'attachment; filename="collected-data.{}"'.format(renderer.format)
+        return response
+
+
+class DownsampleMixin:
+
+    """
+    Class DownsampleMixin - mixin of FastReadMixin list views that lists at most given number
+    of readings of every sensor chosen by downsampling.lttb() instead of pages of readings,
+    the readings are ordered by sensor and date_time_collected and not paginated
+    e.g ?downsample=lttb&points=500
+    Readings are fetched as values_list rows by AGGREGATE_CHUNK_SIZE, converted to numpy arrays
+    chunk by chunk and downsampled sensor by sensor
+    """
+
+    downsample_query_param = 'downsample'
+    points_query_param = 'points'
+    downsample_choices = ('lttb', )
+    ordering = ('sensor_id', 'date_time_collected')
+
+    def get_points(self):
+        try:
+            points = int(self.request.query_params.get(self.points_query_param))
+        except (TypeError, ValueError):
+            points = 0
+        max_points = app_settings.get('AGGREGATE_MAX_BUCKETS')
+        if not 3 <= points <= max_points:
+            raise exceptions.ValidationError(
+                {self.points_query_param: ['Must be integer from 3 to {}'.format(max_points)]}
+            )
+        return points
+
+    @staticmethod
+    def get_arrays(rows):
+        """
+        Returns numpy arrays of ids, epoch microseconds and values of the chunk of rows
+        """
+        pks, _, times, values = zip(*rows)
+        return (
+            np.array(pks, dtype=np.int64),
+            np.array([(time - aggregation.EPOCH) // aggregation.MICROSECOND for time in times], dtype=np.int64),
+            np.array(values, dtype=np.float64)
+        )
+
+    def iter_downsampled(self, queryset, points):
+        """
+        Yields (id, sensor, date_time_collected, sensor_data_value) rows of the downsampled readings.
+        Readings of a sensor are held as numpy arrays built chunk by chunk, not as rows,
+        and only the rows chosen by downsampling.lttb() are made of them
+        """
+        chunk_size = app_settings.get('AGGREGATE_CHUNK_SIZE')
+        rows = queryset.order_by(*self.ordering).values_list(
+            *serializers.SensorCollectedDataRowSerializer.FIELDS
+        ).iterator(chunk_size=chunk_size)
+        for sensor_serial_number, sensor_rows in groupby(rows, key=itemgetter(1)):
+            chunks = [
+                self.get_arrays(chunk)
+                for chunk in iter(lambda: list(islice(sensor_rows, chunk_size)), [])
+            ]
+            pks, times, values = (np.concatenate(arrays) for arrays in zip(*chunks))
+            # Offsets from the first reading keep microseconds exact in float64
+            indices = downsampling.lttb(times - times[0], values, points)
+            for pk, time, value in zip(
+                pks[indices].tolist(),
+                times[indices].tolist(),
+                values[indices].tolist()
+            ):
+                yield pk, sensor_serial_number, aggregation.EPOCH + timedelta(microseconds=time), value
+
+    def list(self, request, *args, **kwargs):
+        downsample = request.query_params.get(self.downsample_query_param)
+        if downsample is None:
+            return super(DownsampleMixin, self).list(request, *args, **kwargs)
+        if downsample not in self.downsample_choices:
+            raise exceptions.ValidationError(
+                {self.downsample_query_param: ['Must be one of: ' + ', '.join(self.downsample_choices)]}
+            )
+        points = self.get_points()
+
+        queryset = self.filter_queryset(self.get_queryset())
+        row_serializer = serializers.SensorCollectedDataRowSerializer(
+            get_timestamps_format(request.query_params)
+        )
+        rows = self.iter_downsampled(queryset, points)
+        if row_serializer.is_supported():
+            results = row_serializer.to_representation(rows)
+        else:
+            pks = [row[0] for row in rows]
+            results = self.get_serializer(
+                queryset.filter(pk__in=pks).order_by(*self.ordering), many=True
+            ).data
+
+        if isinstance(request.accepted_renderer, renderers.ReadingsExportRenderer):
+            return Response(results)
+        return Response(OrderedDict([
+            ('next', None),
+            ('previous', None),
+            ('results', results),
+        ]))
+
+
+class AggregateMixin(TimeRangeMixin):
+
+    """
+    Class AggregateMixin - mixin of SensorCollectedData list views that lists count, min, max,
+    mean and last value of every sensor in every time bucket of the range instead of readings.
+    Both bounds of the range are required
+    e.g ?start_datetime=2018-01-02T00:00:00Z&end_datetime=2018-01-03T00:00:00Z&bucket=15m -
+    bucket width is seconds or number with unit s, m, h or d
+    e.g ?start_datetime=2018-01-01T00:00:00Z&end_datetime=2019-01-01T00:00:00Z&max_points=500 -
+    planner.plan_resolution() picks raw readings, minute, hour or day rollups, so that
+    the number of buckets fits into max_points when possible. Raw readings are listed as buckets
+    of one reading, rollup buckets are the ones that overlap the range.
+    Resolution of the buckets is given by X-Resolution header
+    View has to define get_sensor_serial_numbers() - serial numbers of the aggregated sensors
+    """
+
+    bucket_query_param = 'bucket'
+    max_points_query_param = 'max_points'
+    ordering = ('sensor_id', 'date_time_collected', 'id')
+
+    def get_bucket_width(self):
+        try:
+            return aggregation.parse_bucket_width(self.request.query_params.get(self.bucket_query_param))
+        except ValueError:
+            raise exceptions.ValidationError(
+                {self.bucket_query_param: ['Must be seconds or number with unit s, m, h or d, e.g. 15m']}
+            )
+
+    def get_max_points(self):
+        value = self.request.query_params.get(self.max_points_query_param)
+        if value is None:
+            return None
+        if self.bucket_query_param in self.request.query_params:
+            raise exceptions.ValidationError(
+                {'detail': 'Either bucket or max_points could be given'}
+            )
+        try:
+            max_points = int(value)
+        except ValueError:
+            max_points = 0
+        max_buckets = app_settings.get('AGGREGATE_MAX_BUCKETS')
+        if not 0 < max_points <= max_buckets:
+            raise exceptions.ValidationError(
+                {self.max_points_query_param: ['Must be integer from 1 to {}'.format(max_buckets)]}
+            )
+        return max_points
+
+    def get_rollups_queryset(self):
+        return SensorCollectedDataRollup.objects.filter(sensor_id__in=self.get_sensor_serial_numbers())
+
+    def aggregate_readings(self, width):
+        """
+        Returns BucketAggregator of the readings of the range in buckets of the width
+        """
+        chunk_size = app_settings.get('AGGREGATE_CHUNK_SIZE')
+        rows = self.filter_queryset(self.get_queryset()).order_by(*self.ordering).values_list(
+            'sensor_id', 'date_time_collected', 'sensor_data_value'
+        ).iterator(chunk_size=chunk_size)
+        aggregator = aggregation.BucketAggregator(width)
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            aggregator.add(chunk)
+        return aggregator
+
+    def aggregate_rollups(self, resolution, start_datetime, end_datetime):
+        """
+        Returns BucketAggregator of the rollups of the resolution that overlap the range
+        """
+        width = rollups.TIERS[resolution]
+        rows = self.get_rollups_queryset().filter(
+            resolution=resolution,
+            bucket__range=(rollups.bucket_start(start_datetime, width), end_datetime)
+        ).order_by('sensor_id', 'bucket').values_list(*rollups.ROLLUP_FIELDS)
+        aggregator = aggregation.BucketAggregator(width // aggregation.MICROSECOND)
+        aggregator.add_partials(list(rows))
+        return aggregator
+
+    def list(self, request, *args, **kwargs):
+        max_points = self.get_max_points()
+        width = self.get_bucket_width() if max_points is None else None
+        start_datetime, end_datetime = self.get_time_range()
+        if start_datetime is None or end_datetime is None:
+            raise exceptions.ValidationError(
+                {'detail': 'start_datetime and end_datetime are required'}
+            )
+
+        if max_points is None:
+            max_buckets = app_settings.get('AGGREGATE_MAX_BUCKETS')
+            if (end_datetime - start_datetime) // timedelta(microseconds=width) >= max_buckets:
+                raise exceptions.ValidationError(
+                    {self.bucket_query_param: ['Range could have at most {} buckets'.format(max_buckets)]}
+                )
+            resolution = planner.RESOLUTION_RAW
+            aggregator = self.aggregate_readings(width)
+        else:
+            resolution = planner.plan_resolution(
+                self.filter_queryset(self.get_queryset()),
+                self.get_rollups_queryset(),
+                len(self.get_sensor_serial_numbers()),
+                start_datetime,
+                end_datetime,
+                max_points
+            )
+            if resolution == planner.RESOLUTION_RAW:
+                # Readings of a sensor have distinct times, so every reading is a bucket
+                aggregator = self.aggregate_readings(1)
+            elif app_settings.get('ROLLUPS'):
+                aggregator = self.aggregate_rollups(resolution, start_datetime, end_datetime)
+            else:
+                aggregator = self.aggregate_readings(rollups.TIERS[resolution] // aggregation.MICROSECOND)
+
+        if get_timestamps_format(request.query_params) == ingestion.TIMESTAMPS_EPOCH:
+            bucket_field = serializers.EpochMillisDateTimeField()
+        else:
+            bucket_field = DateTimeField()
+        response = Response([
+            {
+                'sensor': sensor,
+                'bucket': bucket_field.to_representation(
+                    aggregation.EPOCH + timedelta(microseconds=bucket)
+                ),
+                'count': count,
+                'min': minimum,
+                'max': maximum,
+                'mean': total / count,
+                'last': last,
+            }
+            for sensor, bucket, count, minimum, maximum, total, last, _ in aggregator.iter_buckets()
+        ])
+        response['X-Resolution'] = resolution
+        return response
@@ -6,24 +6,107 @@ Classes:
     HubListAPIView,
     HubCreateAPIView,
     SensorCollectedDataListCreateAPIView,
+    SensorCollectedDataStreamAPIView,
+    SensorCollectedDataBatchAPIView,
     SensorCollectedDataAdminAPIView,
-    SensorCollectedDataUserAPIView
+    SensorCollectedDataUserAPIView,
+    OneSensorCollectedDataAggregateAPIView
 """
+import json
+from io import BytesIO
+from itertools import islice
 from rest_framework import generics, status, exceptions
+from rest_framework.parsers import JSONParser
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
+from rest_framework.settings import api_settings
 import hubs_devices_sensors.serializers as serializers
+import hubs_devices_sensors.ingestion as ingestion
+import hubs_devices_sensors.sinks as sinks
+import hubs_devices_sensors.parsers as parsers
+import hubs_devices_sensors.app_settings as app_settings
+from hubs_devices_sensors.backpressure import BackpressureMixin
+from hubs_devices_sensors.ingest_queue import ingest_queue
+from hubs_devices_sensors.sharding import get_routing_key
+from hubs_devices_sensors.views.mixins import (
+    AggregateMixin,
+    DownsampleMixin,
+    FastReadMixin,
+    TimeRangeMixin,
+    get_timestamps_format
+)
 from hubs_devices_sensors.models import Sensor, SensorCollectedData
 
 
-class SensorCollectedDataListCreateAPIView(APIView):
+# Parsers of the request bodies accepted by the ingest queue
+QUEUED_PARSER_CLASSES = (JSONParser, parsers.SensorReadingsBinaryParser)
+
+
+def ingest_response(result, rejected_rows=None):
+    """
+    Returns response of the collect-data request: counts of ingestion.IngestResult
+    with 201 status or count of sinks.QueuedResult with 202 status,
+    and 'rejected' list of [index, error code] pairs if given
+    """
+    data = result._asdict()
+    if rejected_rows is not None:
+        data['rejected'] = rejected_rows
+    if isinstance(result, sinks.QueuedResult):
+        return Response(data, status=status.HTTP_202_ACCEPTED)
+    return Response(data, status=status.HTTP_201_CREATED)
+
+
+def get_on_conflict(query_params):
+    """
+    Returns on_conflict mode of the collect-data request query parameters
+    """
+    on_conflict = query_params.get('on_conflict', ingestion.ON_CONFLICT_ERROR)
+    if on_conflict not in ingestion.ON_CONFLICT_CHOICES:
+        raise exceptions.ValidationError(
+            {'on_conflict': ['Must be one of: ' + ', '.join(ingestion.ON_CONFLICT_CHOICES)]}
+        )
+    return on_conflict
+
+
+def read_stream(stream, chunk_size=64 * 1024):
+    """
+    Returns bytes of the request body stream read in chunks, empty bytes if there is no body
+    """
+    if stream is None:
+        return b''
+    body = bytearray()
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        body += chunk
+    return bytes(body)
+
+
+def check_queued_body(parser, body):
+    """
+    Raises ParseError of the body that could never be parsed into a batch by the parser.
+    Binary readings are checked by their header and size, JSON only by its brackets,
+    the whole body is parsed by the ingest worker
+    """
+    if isinstance(parser, parsers.SensorReadingsBinaryParser):
+        parser.parse(BytesIO(body))
+        return
+    body = body.strip()
+    if body[:1] != b'[' or body[-1:] != b']':
+        raise exceptions.ParseError('JSON parse error - batch must be a list')
+
+
+class SensorCollectedDataListCreateAPIView(BackpressureMixin, APIView):
 
     """
-    Class Based View for LIST-CREATE serialized SensorCollectedData objects
+    Class Based View for LIST-CREATE serialized SensorCollectedData objects.
+    Accepts readings, columnar series and packed binary readings, see urls.py for the query options
     """
 
     permission_classes = (AllowAny, )
+    accepts_compressed_body = True
+    parser_classes = tuple(api_settings.DEFAULT_PARSER_CLASSES) + (
+        parsers.SensorReadingsBinaryParser,
+    )
 
     def post(self, request, format=None):
 
@@ -31,15 +114,195 @@ class SensorCollectedDataListCreateAPIView(APIView):
         Post method that creaetes SensorCollectedData entities by POST request
         """
 
-        serializer = serializers.SensorCollectedDataModelSerializer(data=request.data, many=True)
+        if app_settings.get('INGEST_QUEUE'):
+            return self.enqueue(request)
+        return self.ingest(request.data, request.query_params)
+
+    def enqueue(self, request):
+        """
+        Appends raw request body to the ingest queue without parsing it.
+        Body is read from the request stream, so DATA_UPLOAD_MAX_MEMORY_SIZE does not apply
+        as it does not to parsed bodies. Unsupported media types and bodies that could never
+        be a batch are rejected before the batch is acknowledged
+        """
+        get_on_conflict(request.query_params)
+        get_timestamps_format(request.query_params)
+        parser = request.negotiator.select_parser(
+            request,
+            [parser for parser in self.get_parsers() if isinstance(parser, QUEUED_PARSER_CLASSES)]
+        )
+        if parser is None:
+            raise exceptions.UnsupportedMediaType(request.content_type)
+
+        body = read_stream(request.stream)
+        check_queued_body(parser, body)
+        batch_id = ingest_queue.put(
+            request.content_type,
+            request.META.get('QUERY_STRING', ''),
+            body,
+            get_routing_key(request)
+        )
+        return Response({'batch': batch_id}, status=status.HTTP_202_ACCEPTED)
+
+    @classmethod
+    def ingest(cls, data, query_params):
+        """
+        Creates SensorCollectedData entities of the parsed request body,
+        used by the view and by the ingest workers
+        """
+        on_conflict = get_on_conflict(query_params)
+        partial_accept = query_params.get('accept') == 'partial'
+        if isinstance(data, ingestion.ReadingColumns):
+            return cls.post_columns(data, on_conflict, partial_accept)
+        if ingestion.is_series_batch(data):
+            return cls.post_columns(
+                ingestion.expand_series(data),
+                on_conflict,
+                partial_accept
+            )
+        if get_timestamps_format(query_params) == ingestion.TIMESTAMPS_EPOCH and isinstance(data, list):
+            columns, rejected = ingestion.items_to_columns(data)
+            return cls.post_columns(columns, on_conflict, partial_accept, rejected)
+
+        serializer = serializers.SensorCollectedDataModelSerializer(
+            data=data,
+            many=True,
+            context={'on_conflict': on_conflict, 'partial_accept': partial_accept}
+        )
         if serializer.is_valid():
             serializer.save()
+            if partial_accept:
+                return ingest_response(serializer.ingest_result, serializer.rejected_rows)
+            if isinstance(serializer.ingest_result, sinks.QueuedResult) \
+                    or on_conflict != ingestion.ON_CONFLICT_ERROR:
+                return ingest_response(serializer.ingest_result)
+            # Bulk inserted readings get their ids only on PostgreSQL
+            ingestion.assign_primary_keys(serializer.instance)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @staticmethod
+    def post_columns(columns, on_conflict, partial_accept, rejected=None):
+        """
+        Creates SensorCollectedData entities of the columnar readings batch
+        """
+        readings, rejected_rows = ingestion.prepare_columns(columns, on_conflict, rejected)
+        if rejected_rows and not partial_accept:
+            return Response({'rejected': rejected_rows}, status=status.HTTP_400_BAD_REQUEST)
+        return ingest_response(sinks.submit_readings(readings, on_conflict), rejected_rows)
+
+
+class SensorCollectedDataStreamAPIView(BackpressureMixin, APIView):
+
+    """
+    Class Based View for CREATE SensorCollectedData objects from newline-delimited JSON
+    (Content-Type: application/x-ndjson), one reading per line.
+    Request body is parsed incrementally and every NDJSON_BATCH_SIZE readings
+    are validated and written before the next ones are read.
+    Already written batches could not be rolled back, so invalid readings are always
+    rejected one by one as with ?accept=partial of SensorCollectedDataListCreateAPIView.
+    Response contains inserted and duplicates counts
+    and 'rejected' list of [index, error code] pairs of the invalid readings
+    e.g ?on_conflict=skip or ?on_conflict=overwrite
+    e.g ?timestamps=epoch - date_time_collected of the readings is integer epoch milliseconds
+    Request body could be gzip or deflate encoded (Content-Encoding header)
+    Responses carry load hints headers, see backpressure.py
+    """
+
+    permission_classes = (AllowAny, )
+    accepts_compressed_body = True
+    parser_classes = (parsers.NDJSONParser, )
+
+    def post(self, request, format=None):
+
+        """
+        Post method that creates SensorCollectedData entities by POST request
+        """
+
+        on_conflict = get_on_conflict(request.query_params)
+        epoch = get_timestamps_format(request.query_params) == ingestion.TIMESTAMPS_EPOCH
+        batch_size = app_settings.get('NDJSON_BATCH_SIZE')
+        result = sinks.empty_result()
+        rejected_rows = []
+
+        items = iter(request.data)
+        offset = 0
+        batch = list(islice(items, batch_size))
+        while batch:
+            if epoch:
+                batch_result = self.ingest_epoch_batch(batch, offset, on_conflict, rejected_rows)
+            else:
+                batch_result = self.ingest_batch(batch, offset, on_conflict, rejected_rows)
+            result = type(result)(*map(sum, zip(result, batch_result)))
+            offset += len(batch)
+            batch = list(islice(items, batch_size))
 
-class SensorCollectedDataAdminAPIView(generics.ListAPIView):
+        rejected_rows.sort()
+        return ingest_response(result, rejected_rows)
+
+    @staticmethod
+    def ingest_batch(batch, offset, on_conflict, rejected_rows):
+        """
+        Validates and submits one batch of parsed lines.
+        Adds its invalid readings to rejected_rows. Returns result of the batch
+        """
+        indices = []
+        for index, item in enumerate(batch, offset):
+            if item is parsers.INVALID_LINE:
+                rejected_rows.append([index, 'parse_error'])
+            else:
+                indices.append(index)
+
+        serializer = serializers.SensorCollectedDataModelSerializer(
+            data=[batch[index - offset] for index in indices],
+            many=True,
+            context={'on_conflict': on_conflict, 'partial_accept': True}
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+
+        rejected_rows.extend(
+            [indices[position], code] for position, code in serializer.rejected_rows
+        )
+        return serializer.ingest_result
+
+    @staticmethod
+    def ingest_epoch_batch(batch, offset, on_conflict, rejected_rows):
+        """
+        Validates in columns and submits one batch of parsed lines with epoch milliseconds.
+        Adds its invalid readings to rejected_rows. Returns result of the batch
+        """
+        columns, rejected = ingestion.items_to_columns(batch)
+        rejected.update(
+            (position, 'parse_error') for position, item in enumerate(batch)
+            if item is parsers.INVALID_LINE
+        )
+        readings, batch_rejected_rows = ingestion.prepare_columns(columns, on_conflict, rejected)
+        rejected_rows.extend([offset + position, code] for position, code in batch_rejected_rows)
+        return sinks.submit_readings(readings, on_conflict)
+
+
+class SensorCollectedDataBatchAPIView(APIView):
+
+    """
+    Class Based View for RETRIEVE status of a batch queued by collect-data with INGEST_QUEUE option,
+    failed batch carries the error it was rejected with
+    """
+
+    permission_classes = (AllowAny, )
+
+    def get(self, request, pk, format=None):
+        batch_status = ingest_queue.get_status(pk)
+        if batch_status is None:
+            raise exceptions.NotFound()
+        data = {'batch': pk, 'status': batch_status.status}
+        if batch_status.error is not None:
+            data['error'] = json.loads(batch_status.error)
+        return Response(data)
+
+
+class SensorCollectedDataAdminAPIView(FastReadMixin, generics.ListAPIView):
 
     """
     Class Based View for LIST all serialized SensorCollectedData objects
@@ -51,7 +314,7 @@ class SensorCollectedDataAdminAPIView(generics.ListAPIView):
     serializer_class = serializers.SensorCollectedDataModelSerializer
 
 
-class SensorAllCollectedDataUserAPIView(generics.ListAPIView):
+class SensorAllCollectedDataUserAPIView(FastReadMixin, generics.ListAPIView):
 
     """
     Class Based View for LIST serialized SensorCollectedData objects related to current user
@@ -67,28 +330,38 @@ class SensorAllCollectedDataUserAPIView(generics.ListAPIView):
         )
 
 
-class OneSensorCollectedDataUserAPIView(generics.ListAPIView):
+class OneSensorCollectedDataUserAPIView(DownsampleMixin, TimeRangeMixin, FastReadMixin, generics.ListAPIView):
 
     """
     Class Based View for RETRIEVE serialized SensorCollectedData objects for  one related Sensor by current user
+    e.g ?start_datetime=2018-01-02T21:25:33Z&end_datetime=2018-01-02T22:45:33Z
+    e.g ?start_datetime=2018-01-01T00:00:00Z&end_datetime=2019-01-01T00:00:00Z&downsample=lttb&points=500
     """
 
     permission_classes = (IsAuthenticated, )
     serializer_class = serializers.SensorCollectedDataModelSerializer
 
-    def get_queryset(self):
+    def get_sensor_serial_numbers(self):
         user = self.request.user
         try:
             current_sensor = Sensor.objects.get(pk=self.kwargs['pk'])
             if current_sensor.sensor_device.device_hub.owner == user:
-                return SensorCollectedData.objects.filter(
-                    sensor=current_sensor,
-                    sensor__sensor_device__device_hub__owner=user
-                )
+                return [current_sensor.sensor_serial_number]
             else:
                 raise exceptions.PermissionDenied('You are not allowed to perform this action')
         except Sensor.DoesNotExist:
             raise exceptions.NotFound('Requested Sensor Data was not found at our own')
 
+    def get_queryset(self):
+        # Served by (sensor, date_time_collected) index
+        return SensorCollectedData.objects.filter(sensor_id__in=self.get_sensor_serial_numbers())
+
 
+class OneSensorCollectedDataAggregateAPIView(AggregateMixin, OneSensorCollectedDataUserAPIView):
 
+    """
+    Class Based View that lists count, min, max, mean and last value of one Sensor
+    in every time bucket of the range
+    e.g ?start_datetime=2018-01-02T00:00:00Z&end_datetime=2018-01-03T00:00:00Z&bucket=15m
+    e.g ?start_datetime=2018-01-01T00:00:00Z&end_datetime=2019-01-01T00:00:00Z&max_points=500
+    """
@@ -60,6 +60,10 @@ REST_FRAMEWORK = {
     )
 }
 
+HUBS_DEVICES_SENSORS = {
+    'BULK_INGESTION': True,
+}
+
 REST_REGISTRATION = {
     'REGISTER_VERIFICATION_ENABLED': False,
 
@@ -76,6 +80,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'hubs_devices_sensors.middleware.RequestBodyDecompressionMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',